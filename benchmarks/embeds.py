@@ -0,0 +1,80 @@
+"""Compare the import time, memory and embed building time of kekmonitors' embed builder and discord.py.
+
+Usage: python3 benchmarks/embeds.py [--runs n] [--embeds n]
+
+Every import is measured in a fresh interpreter, several times, reporting the median. discord.py is measured only
+if it's installed."""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# run in a fresh interpreter: import the module, build embeds, report timings and max rss
+SCRIPT = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+from {module} import {name} as Embed
+import_time = time.perf_counter() - start
+start = time.perf_counter()
+for i in range({embeds}):
+    embed = Embed(title="Shoe", url="https://www.example.com/shoe", description="Restock")
+    embed.set_thumbnail(url="https://www.example.com/shoe.jpg")
+    for size in range(20):
+        embed.add_field(name="Size", value=str(size))
+    embed.to_dict()
+build_time = time.perf_counter() - start
+print(json.dumps({{
+    "import": import_time,
+    "build": build_time,
+    "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}}))
+"""
+
+BUILDERS = {
+    "kekmonitors": ("kekmonitors.utils.embed", "Embed"),
+    "discord.py": ("discord", "Embed"),
+}
+
+
+def measure(module: str, name: str, embeds: int) -> Dict[str, float]:
+    output = subprocess.check_output(
+        [
+            sys.executable,
+            "-c",
+            SCRIPT.format(root=ROOT, module=module, name=name, embeds=embeds),
+        ],
+        stderr=subprocess.DEVNULL,
+    )
+    return json.loads(output)
+
+
+def main(args: argparse.Namespace):
+    print(f"{args.runs} runs, {args.embeds} embeds per run\n")
+    print(f"{'builder':<14}{'import (ms)':>14}{'max rss (MB)':>15}{'embed (us)':>13}")
+    for builder, (module, name) in BUILDERS.items():
+        try:
+            results = [
+                measure(module, name, args.embeds) for _ in range(args.runs)
+            ]  # type: List[Dict[str, float]]
+        except subprocess.CalledProcessError:
+            print(f"{builder:<14}{'not installed':>14}")
+            continue
+        import_time = statistics.median(r["import"] for r in results) * 1000
+        # kilobytes on linux
+        rss = statistics.median(r["rss"] for r in results) / 1024
+        build = statistics.median(r["build"] for r in results) / args.embeds * 1e6
+        print(f"{builder:<14}{import_time:>14.1f}{rss:>15.1f}{build:>13.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--embeds", type=int, default=10000)
+    main(parser.parse_args())
@@ -0,0 +1,109 @@
+"""Compare the http backends available to NetworkUtils against a local stand-in server.
+
+Usage: python3 benchmarks/http_backends.py [--requests n] [--concurrency n] [--size bytes]
+
+The server runs in a separate process, so that the cpu time measured is only the one spent by the client."""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from aiohttp import web
+
+from kekmonitors.utils.http_backends import BACKENDS, HTTPBackend, get_backend
+
+
+def run_server(port: int, size: int):
+    body = b"a" * size
+
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response(body=body, content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    web.run_app(app, host="127.0.0.1", port=port, print=None, access_log=None)
+
+
+async def wait_for_server(url: str):
+    backend = get_backend("aiohttp")
+    for _ in range(50):
+        try:
+            await backend.fetch(url)
+            break
+        except Exception:
+            await asyncio.sleep(0.1)
+    await backend.close()
+
+
+async def benchmark(
+    backend: HTTPBackend, url: str, requests: int, concurrency: int
+) -> List[float]:
+    latencies = []  # type: List[float]
+    queue = asyncio.Queue()  # type: asyncio.Queue[int]
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            response = await backend.fetch(url, raise_error=False)
+            latencies.append(time.perf_counter() - start)
+            assert response.code == 200
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies
+
+
+async def main(args: argparse.Namespace):
+    url = f"http://127.0.0.1:{args.port}/"
+    await wait_for_server(url)
+    print(
+        f"{args.requests} requests, concurrency {args.concurrency}, {args.size} bytes per response\n"
+    )
+    print(
+        f"{'backend':<10}{'req/s':>10}{'p50 (ms)':>12}{'p99 (ms)':>12}{'cpu/req (us)':>15}"
+    )
+    for name in BACKENDS:
+        backend = get_backend(name, args.concurrency)
+        # warm up connections
+        await benchmark(backend, url, args.concurrency, args.concurrency)
+
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        latencies = await benchmark(backend, url, args.requests, args.concurrency)
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+        await backend.close()
+
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+        print(
+            f"{name:<10}{args.requests / elapsed:>10.0f}{p50:>12.2f}{p99:>12.2f}{cpu / args.requests * 1e6:>15.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--size", type=int, default=100 * 1024)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = multiprocessing.Process(
+        target=run_server, args=(args.port, args.size), daemon=True
+    )
+    server.start()
+    try:
+        asyncio.run(main(args))
+    finally:
+        server.terminate()
@@ -1,37 +1,26 @@
 import asyncio
 import json
+import time
 from datetime import datetime
-from typing import List
 
 from bs4 import BeautifulSoup
-from fake_headers import Headers
-from pyppeteer.launcher import launch
-from pyppeteer.network_manager import Response
 from pyppeteer.page import Page
 
 from kekmonitors.base_monitor import BaseMonitor
 from kekmonitors.config import Config
 from kekmonitors.shoe_stuff import Shoe
+from kekmonitors.utils.network_utils import get_host
 from kekmonitors.utils.tools import make_default_executable
 
 
 class Footdistrict(BaseMonitor):
-    def init(self):
-        # create a random headers generator, configured to generate random windows headers
-        self.headers_gen = Headers(os="win", headers=True)
-
     async def async_init(self):
-        self.browser = await launch()
-        #  self.context = await self.browser.createIncognitoBrowserContext()
-        self.context = self.browser
-
-    async def on_async_shutdown(self):
-        self.general_logger.debug("Shutting down browser...")
-        await self.browser.close()
-        self.general_logger.info("Browser has shut down...")
+        # pages are reused across loops, and the browser is closed automatically on shutdown
+        await self.start_browser_pool()
 
     async def get_fd_page(self, link: str, page: Page):
-        await page.setExtraHTTPHeaders(self.headers_gen.generate())
+        # the same headers sent by self.fetch, so that the session can be reused by plain requests
+        await page.setExtraHTTPHeaders(self.get_profile_headers(link))
         await page.setJavaScriptEnabled(True)
         self.network_logger.debug(f"{link}: getting...")
         response = await page.goto(link)
@@ -80,70 +69,78 @@ class Footdistrict(BaseMonitor):
             )
             shoes.append(shoe)
 
-        # tasks will contain asynchronous tasks to be executed at once asynchronously
-        # in this case, they will contain the requests to the links
-        tasks = []
-        pages = []  # type: List[Page]
-        for shoe in shoes:
-            page = await self.context.newPage()
-            pages.append(page)
-            tasks.append(self.get_fd_page(shoe.link, page))
-
-        # gather, execute all tasks
-        responses = await asyncio.gather(*tasks)  # type: List[Response]
+        # check all the shoes at once, asynchronously
+        # at most browser_pool_size pages will be open at the same time
+        await asyncio.gather(*[self.check_shoe(shoe) for shoe in shoes])
         self.network_logger.debug("Got all links")
 
-        for shoe, page, response in zip(shoes, pages, responses):
-            if not response.ok:
-                self.general_logger.debug(
-                    f"{shoe.link}: skipping parsing on code {response.code}"
-                )
-                continue
+    async def check_shoe(self, shoe: Shoe):
+        text = None
+        # when the page has been received, for the latency of the alert
+        fetched_at = None
+        host = get_host(shoe.link)
+        if self.session_store and self.session_store.has_valid_session(host):
+            # the browser has already solved the challenge: its cookies are sent by self.fetch too,
+            # so a plain request is enough until they expire
+            response = await self.fetch(shoe.link, use_cache=False, attempts=1)
+            if response is not None and response.code == 200:
+                text = response.body.decode()
+                fetched_at = response.fetched_at
+            else:
+                self.network_logger.debug(f"{shoe.link}: session rejected")
+                self.session_store.invalidate(host)
+
+        if text is None:
+            async with self.browser_pool.page() as page:
+                response = await self.get_fd_page(shoe.link, page)
+                if not response.ok:
+                    self.general_logger.debug(
+                        f"{shoe.link}: skipping parsing on code {response.status}"
+                    )
+                    return
 
-            text = await response.text()
+                text = await response.text()
+                fetched_at = time.time()
 
-            if len(text) < 1000:
-                self.general_logger.warning(
-                    f"Failed to get {shoe.link} (len of response: {len(text)})"
-                )
-                continue
-
-            # BeautifulSoup can be used to parse html pages in a very convenient way
-            soup = BeautifulSoup(text, "lxml")
-
-            # create a Shoe object to hold information
-            # parse all the page. for simplicity here we only get the name
-            n = soup.find("meta", {"property": "og:title"})
-            if n:
-                shoe.name = n.get("content")
-                # https://footdistrict.com/media/resize/500x333/catalog/product/p/r/producto_02_10_2063_4/adidas-rivalry-hi-x-star-wars-chewbacca-fx9290-0.webp
-                # s.img_link = soup.find("div", {"id": "productos-ficha-item"}).find(
-                # 	"img", {"class": "img-responsive lazyloaded"}).get("src")
-                shoe.img_link = "https://i.imgur.com/UKwBVpg.png"
-                for script in soup.find_all("script", {"type": "text/x-magento-init"}):
-                    script_text = script.string
-                    if script_text.find("jsonConfig") != -1:
-                        script_json = json.loads(script_text)
-                        options = script_json["[data-role=swatch-options]"][
-                            "Magento_Swatches/js/swatch-renderer"
-                        ]["jsonConfig"]["attributes"]["134"]["options"]
-                        for opt in options:
-                            sizename = opt["label"]
-                            available = bool(opt["products"])
-                            shoe.sizes[sizename] = {"available": available}
-                        break
-
-                else:
-                    self.general_logger.warning("Couldn't find script -- skipping.")
+        if len(text) < 1000:
+            self.general_logger.warning(
+                f"Failed to get {shoe.link} (len of response: {len(text)})"
+            )
+            return
+
+        # BeautifulSoup can be used to parse html pages in a very convenient way
+        soup = BeautifulSoup(text, "lxml")
+
+        # create a Shoe object to hold information
+        # parse all the page. for simplicity here we only get the name
+        n = soup.find("meta", {"property": "og:title"})
+        if n:
+            shoe.name = n.get("content")
+            # https://footdistrict.com/media/resize/500x333/catalog/product/p/r/producto_02_10_2063_4/adidas-rivalry-hi-x-star-wars-chewbacca-fx9290-0.webp
+            # s.img_link = soup.find("div", {"id": "productos-ficha-item"}).find(
+            # 	"img", {"class": "img-responsive lazyloaded"}).get("src")
+            shoe.img_link = "https://i.imgur.com/UKwBVpg.png"
+            for script in soup.find_all("script", {"type": "text/x-magento-init"}):
+                script_text = script.string
+                if script_text.find("jsonConfig") != -1:
+                    script_json = json.loads(script_text)
+                    options = script_json["[data-role=swatch-options]"][
+                        "Magento_Swatches/js/swatch-renderer"
+                    ]["jsonConfig"]["attributes"]["134"]["options"]
+                    for opt in options:
+                        sizename = opt["label"]
+                        available = bool(opt["products"])
+                        shoe.sizes[sizename] = {"available": available}
+                    break
 
             else:
-                self.general_logger.warning(
-                    "Couldn't find name meta property -- skipping."
-                )
+                self.general_logger.warning("Couldn't find script -- skipping.")
+
+        else:
+            self.general_logger.warning("Couldn't find name meta property -- skipping.")
 
-            # self.shoe_check takes the shoe, updates last_seen, checks for restocks, updates database, sends webhooks if enabled
-            self.shoe_check(shoe)
-            await page.close()
+        # self.shoe_check takes the shoe, updates last_seen, checks for restocks, updates database, sends webhooks if enabled
+        self.shoe_check(shoe, fetched_at=fetched_at)
 
 
 if __name__ == "__main__":
@@ -1,10 +1,8 @@
 import asyncio
+import time
 from typing import List
 
 from bs4 import BeautifulSoup
-from fake_headers import Headers
-from pyppeteer import launch
-from pyppeteer.network_manager import Response
 from pyppeteer.page import Page
 
 from kekmonitors.base_scraper import BaseScraper
@@ -19,25 +17,17 @@ class Footdistrict(BaseScraper):
         self.base_url = "https://footdistrict.com"
         self.endpoints = ["/zapatillas/f/b/converse/"]
 
-        # create a random headers generator, configured to generate random windows headers
-        self.headers_gen = Headers(os="win", headers=True)
-
         # max links to be monitored
         self.max_links = 5
         self.found_links = []  # type: List[str]
 
     async def async_init(self):
-        self.browser = await launch()
-        # self.context = await self.browser.createIncognitoBrowserContext()
-        self.context = self.browser
-
-    async def on_async_shutdown(self):
-        self.general_logger.debug("Shutting down browser...")
-        await self.browser.close()
-        self.general_logger.info("Browser has shut down...")
+        # pages are reused across loops, and the browser is closed automatically on shutdown
+        await self.start_browser_pool()
 
     async def get_fd_page(self, link: str, page: Page):
-        await page.setExtraHTTPHeaders(self.headers_gen.generate())
+        # the same headers sent by self.fetch, so that the session can be reused by plain requests
+        await page.setExtraHTTPHeaders(self.get_profile_headers(link))
         await page.setJavaScriptEnabled(True)
         self.network_logger.debug(f"{link}: getting...")
         response = await page.goto(link)
@@ -73,51 +63,44 @@ class Footdistrict(BaseScraper):
         return response
 
     async def loop(self):
-        # tasks will contain asynchronous tasks to be executed at once, asynchronously
-        # in this case, they will contain the requests to the endpoints
-        pages = []  # type: List[Page]
-        tasks = []  # List[Coroutine]
-        # create a task for each endpoint
-        for ep in self.endpoints:
-            page = await self.context.newPage()
-            pages.append(page)
-            tasks.append(self.get_fd_page(self.base_url + ep, page))
-
-        # gather, execute all tasks
-        responses = await asyncio.gather(*tasks)  # type: List[Response]
+        # check all the endpoints at once, asynchronously
+        await asyncio.gather(*[self.check_endpoint(ep) for ep in self.endpoints])
 
-        for link, page, response in zip(self.endpoints, pages, responses):
+    async def check_endpoint(self, ep: str):
+        async with self.browser_pool.page() as page:
+            response = await self.get_fd_page(self.base_url + ep, page)
             if not response.ok:
                 self.general_logger.debug(
-                    f"{link}: skipping parsing on code {response.status}"
+                    f"{ep}: skipping parsing on code {response.status}"
                 )
-                continue
+                return
 
             self.general_logger.debug("Getting content...")
             text = await response.text()
-            self.general_logger.debug("Parsing content...")
-            # BeautifulSoup can be used to parse html pages in a very convenient way
-            soup = BeautifulSoup(text, "lxml")
-            self.general_logger.debug("Content parsed...")
-
-            # parsing example. in this case we simply add the first self.max_links products.
-            grid = soup.find("ol", {"class": "product-items"})
-            count = 0
-            for prod in grid.find_all("li"):
-                count += 1
-                if count <= self.max_links:
-                    link = prod.a.get("href")
-                    if link not in self.found_links:
-                        shoe = Shoe()
-                        shoe.link = link
-                        self.general_logger.info(f"Found {link}")
-                        self.shoe_check(
-                            shoe
-                        )  # inserts/updates the shoe in the database, updating last_seen
-                else:
-                    break
-
-            await page.close()
+            # when the page has been received, for the latency of the alerts
+            fetched_at = time.time()
+
+        self.general_logger.debug("Parsing content...")
+        # BeautifulSoup can be used to parse html pages in a very convenient way
+        soup = BeautifulSoup(text, "lxml")
+        self.general_logger.debug("Content parsed...")
+
+        # parsing example. in this case we simply add the first self.max_links products.
+        grid = soup.find("ol", {"class": "product-items"})
+        count = 0
+        for prod in grid.find_all("li"):
+            count += 1
+            if count <= self.max_links:
+                link = prod.a.get("href")
+                if link not in self.found_links:
+                    shoe = Shoe()
+                    shoe.link = link
+                    self.general_logger.info(f"Found {link}")
+                    self.shoe_check(
+                        shoe, fetched_at=fetched_at
+                    )  # inserts/updates the shoe in the database, updating last_seen
+            else:
+                break
 
 
 if __name__ == "__main__":
@@ -7,7 +7,6 @@ from json.decoder import JSONDecodeError
 from typing import Any, Dict, List, Optional, Union
 
 import __main__
-import discord
 import pymongo
 from pymongo.collection import Collection
 from watchdog import observers
@@ -19,6 +18,7 @@ from kekmonitors.config import COMMANDS, ERRORS, Config, LogConfig
 from kekmonitors.exceptions import AlreadyRegisteredError
 from kekmonitors.shoe_manager import ShoeManager
 from kekmonitors.shoe_stuff import Shoe
+from kekmonitors.utils.embed import Embed
 from kekmonitors.utils.tools import get_file_if_exist_else_create, get_logger
 
 if sys.version_info[1] > 6:
@@ -527,8 +527,8 @@ class Common(Server, FileSystemEventHandler):
     async def on_config_change(self, changed):
         pass
 
-    def get_embed(self, shoe: Shoe) -> discord.Embed:
-        return discord.Embed()
+    def get_embed(self, shoe: Shoe) -> Embed:
+        return Embed()
 
     async def main(self):
         pass
@@ -1,18 +1,17 @@
 import asyncio
 import copy
-import json
+import time
 import traceback
 from datetime import datetime
 from typing import Optional
 
-import discord
-
 from kekmonitors import discord_embeds, shoe_stuff
 from kekmonitors.base_common import Common
 from kekmonitors.comms.msg import Cmd, Response, okResponse
 from kekmonitors.comms.server import Server
 from kekmonitors.config import COMMANDS, Config
 from kekmonitors.shoe_stuff import Shoe
+from kekmonitors.utils.embed import Embed
 from kekmonitors.utils.network_utils import NetworkUtils
 from kekmonitors.webhook_manager import WebhookManager
 
@@ -24,16 +23,33 @@ class BaseMonitor(Common, NetworkUtils):
         config["OtherConfig"]["socket_name"] = f"Monitor.{self.get_class_name()}"
 
         super().__init__(config, **kwargs)
-        super(Server, self).__init__(config["OtherConfig"]["socket_name"])
+        super(Server, self).__init__(config["OtherConfig"]["socket_name"], config)
 
         self.cmd_to_callback[COMMANDS.PING] = self._on_ping
         self.cmd_to_callback[COMMANDS.STOP] = self._stop_serving
+        self.cmd_to_callback[
+            COMMANDS.GET_CIRCUIT_BREAKERS
+        ] = self.on_get_circuit_breakers
+        self.cmd_to_callback[COMMANDS.GET_CONCURRENCY] = self.on_get_concurrency
+        self.cmd_to_callback[COMMANDS.GET_PROXIES] = self.on_get_proxies
+        self.cmd_to_callback[COMMANDS.SCHEDULE_WARMUP] = self.on_schedule_warmup
+        self.cmd_to_callback[COMMANDS.GET_WARMUPS] = self.on_get_warmups
+        self.cmd_to_callback[COMMANDS.GET_DNS_STATS] = self.on_get_dns_stats
+        self.cmd_to_callback[COMMANDS.GET_NETWORK_METRICS] = self.on_get_network_metrics
+        self.cmd_to_callback[COMMANDS.GET_RATE_LIMITS] = self.on_get_rate_limits
+        self.cmd_to_callback[COMMANDS.GET_HEADER_PROFILES] = self.on_get_header_profiles
+        self.cmd_to_callback[COMMANDS.GET_ALERT_METRICS] = self.on_get_alert_metrics
+        self.cmd_to_callback[COMMANDS.GET_WEBHOOK_STATUS] = self.on_get_webhook_status
+        self.set_proxies(self.config_json.get("proxies", []))
+        self.set_warmups(self.config_json.get("warmups", []))
+        self.set_rate_limits(self.config_json.get("rate_limits", {}))
+        self.set_header_profiles(self.config_json.get("header_profiles", []))
 
         self.crash_webhook = config["WebhookConfig"]["crash_webhook"]
 
         self.webhook_manager = WebhookManager(config)
 
-    def get_embed(self, shoe: Shoe) -> discord.Embed:
+    def get_embed(self, shoe: Shoe) -> Embed:
         return discord_embeds.get_default_embed(shoe)
 
     async def on_server_stop(self) -> Response:
@@ -42,23 +58,46 @@ class BaseMonitor(Common, NetworkUtils):
             pass
         self.general_logger.debug("Loop is completed, starting shutdown...")
         await self.on_async_shutdown()
-        self._asyncio_loop.stop()
         self.general_logger.debug("Shutting down webhook manager...")
-        self.webhook_manager.quit()
+        await self.webhook_manager.quit()
+        await self.close_network()
+        self._asyncio_loop.stop()
         self.on_shutdown()
         return okResponse()
 
     async def _on_ping(self, cmd: Cmd) -> Response:
         return okResponse()
 
+    async def on_get_alert_metrics(self, cmd: Cmd) -> Response:
+        """Return the latency of the alerts sent from here (the ones forwarded to the MonitorManager are tracked there)."""
+        r = okResponse()
+        r.payload = self.webhook_manager.get_alert_metrics()
+        return r
+
+    async def on_get_webhook_status(self, cmd: Cmd) -> Response:
+        """Return the health of the webhooks sent from here, the dead letters, the outbox and the rate limits."""
+        r = okResponse()
+        r.payload = self.webhook_manager.get_status()
+        return r
+
     async def main(self):
         """Main loop. Updates configs, runs user-defined loop and performs links/shoes updates for the user"""
+        # sends what's left in the outbox from the previous run
+        self.webhook_manager.start()
         await self.async_init()
         while True:
             async with self._loop_lock:
                 changed = self.update_config()
+                if "config" in changed:
+                    self.set_proxies(self.config_json.get("proxies", []))
+                    self.set_warmups(self.config_json.get("warmups", []))
+                    self.set_rate_limits(self.config_json.get("rate_limits", {}))
+                    self.set_header_profiles(
+                        self.config_json.get("header_profiles", [])
+                    )
                 if changed:
                     await self.on_config_change(changed)
+                loop_start = time.monotonic()
                 try:
                     await self.loop()
                 except:
@@ -67,36 +106,43 @@ class BaseMonitor(Common, NetworkUtils):
                         content = f"```{traceback.format_exc()}\n\nRestarting in {self.delay} seconds.```"
                         if len(content) > 2000:
                             content = f"```Stacktrace too long -- please view logs.\n\nRestarting in {self.delay} seconds.```"
-                        data = json.dumps(
+                        await self.webhook_manager.post(
+                            self.crash_webhook,
                             {
                                 "content": content,
                                 "username": f"Monitor {self.class_name}",
                                 "avatar_url": self.config["WebhookConfig"][
                                     "provider_icon"
                                 ],
-                            }
-                        )
-                        await self.client.fetch(
-                            self.crash_webhook,
-                            method="POST",
-                            body=data,
-                            headers={"content-type": "application/json"},
-                            raise_error=False,
+                            },
                         )
-                self.general_logger.info(f"Loop ended. Waiting {self.delay} secs.")
+                self.general_logger.info(
+                    f"Loop ended in {time.monotonic() - loop_start:.3f} secs. Waiting {self.delay} secs."
+                )
             await asyncio.sleep(self.delay)
 
     async def loop(self):
         """User-defined loop. Replace this with a function that will be run every `delay` seconds"""
         await asyncio.sleep(1)
 
-    def shoe_check(self, shoe: Shoe, update_ts=True):
+    def shoe_check(
+        self, shoe: Shoe, update_ts=True, fetched_at: Optional[float] = None
+    ):
+        """Check the shoe against the db and send the alert if it's new or restocked.\n
+        `fetched_at` is the (unix) time at which the page of the shoe has been received (`response.fetched_at` for the
+        responses of `fetch`), where the latency of the alert starts: if it's None the fetch stage is not tracked."""
+        parsed_at = time.time()
         if update_ts:
             shoe.last_seen = datetime.utcnow().timestamp()
         returned = self.set_reason_and_update_shoe(shoe)
         if returned and self.config["Options"]["enable_webhooks"] == "True":
+            timings = {"parse": parsed_at, "diff": time.time()}
+            if fetched_at is not None:
+                timings["fetch"] = fetched_at
             embed = self.get_embed(returned)
-            self.webhook_manager.add_to_queue(embed, self.webhooks_json)
+            self.webhook_manager.add_to_queue(
+                embed, self.webhooks_json, timings=timings
+            )
 
     def set_reason_and_update_shoe(self, shoe: Shoe) -> Optional[Shoe]:
         """Check shoe against db. If present in db check if there are new sizes;\n
@@ -57,6 +57,43 @@ class COMMANDS(enum.Enum):
     MM_GET_MONITOR_SHOES = enum.auto()
     MM_GET_SCRAPER_SHOES = enum.auto()
 
+    # added after the ones above, so that their values don't change
+    GET_CIRCUIT_BREAKERS = enum.auto()
+    GET_CONCURRENCY = enum.auto()
+    GET_PROXIES = enum.auto()
+    SCHEDULE_WARMUP = enum.auto()
+    GET_WARMUPS = enum.auto()
+    GET_DNS_STATS = enum.auto()
+    GET_NETWORK_METRICS = enum.auto()
+    GET_RATE_LIMITS = enum.auto()
+    GET_HEADER_PROFILES = enum.auto()
+    GET_ALERT_METRICS = enum.auto()
+    GET_WEBHOOK_STATUS = enum.auto()
+
+    MM_GET_MONITOR_CIRCUIT_BREAKERS = enum.auto()
+    MM_GET_SCRAPER_CIRCUIT_BREAKERS = enum.auto()
+    MM_GET_MONITOR_CONCURRENCY = enum.auto()
+    MM_GET_SCRAPER_CONCURRENCY = enum.auto()
+    MM_GET_MONITOR_PROXIES = enum.auto()
+    MM_GET_SCRAPER_PROXIES = enum.auto()
+    MM_SCHEDULE_MONITOR_WARMUP = enum.auto()
+    MM_SCHEDULE_SCRAPER_WARMUP = enum.auto()
+    MM_GET_MONITOR_WARMUPS = enum.auto()
+    MM_GET_SCRAPER_WARMUPS = enum.auto()
+    MM_GET_MONITOR_DNS_STATS = enum.auto()
+    MM_GET_SCRAPER_DNS_STATS = enum.auto()
+    MM_GET_MONITOR_NETWORK_METRICS = enum.auto()
+    MM_GET_SCRAPER_NETWORK_METRICS = enum.auto()
+    MM_GET_NETWORK_METRICS = enum.auto()
+    MM_GET_MONITOR_RATE_LIMITS = enum.auto()
+    MM_GET_SCRAPER_RATE_LIMITS = enum.auto()
+    MM_ACQUIRE_TOKENS = enum.auto()
+    MM_GET_MONITOR_HEADER_PROFILES = enum.auto()
+    MM_GET_SCRAPER_HEADER_PROFILES = enum.auto()
+    MM_NOTIFY = enum.auto()
+    MM_GET_ALERT_METRICS = enum.auto()
+    MM_GET_WEBHOOK_STATUS = enum.auto()
+
 
 @enum.unique
 class ERRORS(enum.Enum):
@@ -117,6 +154,17 @@ provider = KekMonitors\n\
 provider_icon = https://avatars0.githubusercontent.com/u/11823129?s=400&u=3e617374871087e64b5fde0df668260f2671b076&v=4\n\
 timestamp_format = %d %b %Y, %H:%M:%S.%f\n\
 embed_color = 255\n\
+max_connections = 50\n\
+global_rate_limit = 50\n\
+use_notifier = False\n\
+outbox = False\n\
+outbox_path = \n\
+shutdown_timeout = 10\n\
+batch_window = 0.1\n\
+max_retries = 5\n\
+retry_delay = 1\n\
+retry_max_delay = 60\n\
+dead_letters_path = \n\
 \n\
 [OtherConfig]\n\
 class_name =\n\
@@ -128,10 +176,50 @@ enable_config_watcher = True\n\
 enable_webhooks = True\n\
 loop_delay = 5\n\
 max_last_seen = 2592000\n\
+\n\
+[NetworkConfig]\n\
+http_backend = curl\n\
+retry_max_delay = 30\n\
+retry_multiplier = 2\n\
+retry_jitter = 0.5\n\
+retry_budget_ratio = 0.2\n\
+retry_budget_max = 10\n\
+circuit_breaker_threshold = 5\n\
+circuit_breaker_timeout = 30\n\
+max_clients = 10\n\
+adaptive_concurrency = True\n\
+concurrency_initial = 10\n\
+concurrency_min = 1\n\
+concurrency_max = 50\n\
+concurrency_latency_factor = 3\n\
+sticky_proxies = False\n\
+proxy_eject_after = 3\n\
+proxy_eject_time = 60\n\
+hedging = False\n\
+hedging_max_ratio = 0.05\n\
+hedging_min_samples = 20\n\
+dns_cache = True\n\
+dns_min_ttl = 5\n\
+dns_max_ttl = 300\n\
+record_path = \n\
+replay_path = \n\
+replay_timing = False\n\
+browser_pool_size = 5\n\
+browser_max_page_uses = 50\n\
+browser_blocked_resources = image,media,font,stylesheet\n\
+sessions = False\n\
+session_ttl = 1800\n\
+sessions_path = \n\
+shared_rate_limits = True\n\
+rate_limit_lease = 10\n\
+header_profiles = False\n\
+header_rotation = sticky\n\
 "
         get_file_if_exist_else_create(config_path, self.default_config_str)
         parser = configparser.RawConfigParser()
         self.parser = parser
+        # read the defaults first, so that options missing from older config files are still available
+        parser.read_string(self.default_config_str)
         parser.read(config_path)
         self["GlobalConfig"]["config_path"] = path
         self["OtherConfig"]["class_name"] = ""
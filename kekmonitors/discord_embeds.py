@@ -1,10 +1,11 @@
+import functools
 from datetime import datetime
-
-from discord import Embed
+from typing import Any, Dict, List, Optional, Tuple
 
 from kekmonitors import shoe_stuff
 from kekmonitors.config import Config
 from kekmonitors.shoe_stuff import Shoe
+from kekmonitors.utils.embed import Embed
 
 
 def get_empty_embed() -> Embed:
@@ -44,7 +45,7 @@ def get_mm_crash_embed(what: str, code: int, pid: int) -> Embed:
     embed.add_field(name="What: ", value=what, inline=True)
     embed.add_field(name="PID: ", value=pid, inline=True)
     embed.add_field(name="Exit code:  ", value=str(code), inline=True)
-    embed.timestamp = Embed.Empty
+    embed.timestamp = None
     return embed
 
 
@@ -79,45 +80,12 @@ def get_default_embed(shoe: Shoe, allow_unavailable_sizes=False, show_website=Fa
             embed.add_field(name="Release date", value=shoe.release_date)
 
     # Add sizes to the embed
-    sizes = []
-    total_chars = 0
-    for size in shoe.sizes:
-        available = shoe.sizes[size]["available"]
+    sizes = [
+        get_size_line(size, size_info)
+        for size, size_info in shoe.sizes.items()
         # Only add sizes under these conditions
-        if available or (not available and allow_unavailable_sizes):
-            size_str = size
-            # Add the stock number if available
-            if "stock" in shoe.sizes[size]:
-                size_str += " (" + str(shoe.sizes[size]["stock"]) + ")"
-            # Add atc if available
-            if "atc" in shoe.sizes[size] and shoe.sizes[size]["atc"] != "":
-                atc = shoe.sizes[size]["atc"]
-                atc_str = add_link("[ATC]", atc)
-                size_str += " - " + atc_str
-            # Add quick tasks if available
-            if "quick_tasks" in shoe.sizes[size]:
-                qts = []
-                for key, value in zip(
-                    shoe.sizes[size]["quick_tasks"].keys(),
-                    shoe.sizes[size]["quick_tasks"].values(),
-                ):
-                    qts.append(add_link(key, value))
-                qts_str = " - ".join(qts)
-                size_str += " - " + qts_str
-            # Add anything else
-            if "other" in shoe.sizes[size]:
-                others_list = []
-                for other in shoe.sizes[size]["other"]:
-                    other_str = ""
-                    if "link" in other:
-                        other_str = add_link(other["name"], other["link"])
-                    else:
-                        other_str = other["name"]
-                    others_list.append(other_str)
-                others_str = " - ".join(others_list)
-                size_str += " - " + others_str
-            sizes.append(size_str)
-            total_chars += len(size_str)
+        if size_info["available"] or allow_unavailable_sizes
+    ]
 
     # get well formatted sizes.
     values = get_valid_values(sizes, 6)
@@ -132,33 +100,69 @@ def get_default_embed(shoe: Shoe, allow_unavailable_sizes=False, show_website=Fa
     return embed
 
 
-def get_valid_values(values_list, max_elements):
-    """This function tries to format a list splitting it in max_elements and keeping count of discord's max chars limit.\n
-    See comments for more insight."""
-    if len(values_list) == 0:
-        return []
-    # not perfect. if many small values and very close to 1023 chars it might truncate the lasts of them.
-    # also, this requires too much fucking math.
-    tmp = ""
-    done = False
+def get_size_line(size: str, size_info: Dict[str, Any]) -> str:
+    """Return the line of `size` in the embed: the size, its stock and its links (atc, quick tasks and anything else).\n
+    Lines are cached by their content, since most sizes don't change between notifications."""
+    quick_tasks = size_info.get("quick_tasks", {})
+    args = (
+        size,
+        str(size_info["stock"]) if "stock" in size_info else None,
+        size_info.get("atc", ""),
+        tuple(quick_tasks.items()),
+        tuple(
+            (other["name"], other.get("link")) for other in size_info.get("other", [])
+        ),
+    )
+    try:
+        hash(args)
+    except TypeError:
+        # e.g. links which are not plain strings: not cached, but rendered all the same
+        return _render_size_line.__wrapped__(*args)
+    return _render_size_line(*args)
+
+
+@functools.lru_cache(maxsize=4096)
+def _render_size_line(
+    size: str,
+    stock: Optional[str],
+    atc: str,
+    quick_tasks: Tuple[Tuple[str, str], ...],
+    others: Tuple[Tuple[str, Optional[str]], ...],
+) -> str:
+    parts = [size if stock is None else f"{size} ({stock})"]
+    # Add atc if available
+    if atc != "":
+        parts.append(add_link("[ATC]", atc))
+    # Add quick tasks if available
+    if quick_tasks:
+        parts.append(" - ".join(add_link(name, link) for name, link in quick_tasks))
+    # Add anything else
+    if others:
+        parts.append(
+            " - ".join(
+                add_link(name, link) if link is not None else name
+                for name, link in others
+            )
+        )
+    return " - ".join(parts)
+
+
+def get_valid_values(values_list: List[str], max_elements: int) -> List[str]:
+    """Pack the values in as few fields as possible, one per line: at most `max_elements` per field and
+    within discord's 1024 chars limit. A single value over the limit gets its own field."""
     valid_values = []
-    count = 0
+    # values of the current field and its length, with a newline after every value
+    field = []  # type: List[str]
+    length = 0
     for value in values_list:
-        done = False
-        if len(tmp) + len("\n") + len(value) > 1023 or (
-            count != 0 and count % max_elements == 0
-        ):
-            if tmp == "":
-                # first cycle / 1 item
-                tmp = value
-            done = True
-            valid_values.append(tmp)
-            tmp = ""
-            count = 0
-        tmp += value + "\n"
-        count += 1
-    if not done:
-        valid_values.append(tmp)
+        if field and (length + len(value) + 1 > 1023 or len(field) == max_elements):
+            valid_values.append("\n".join(field) + "\n")
+            field = []
+            length = 0
+        field.append(value)
+        length += len(value) + 1
+    if field:
+        valid_values.append("\n".join(field) + "\n")
     return valid_values
 
 
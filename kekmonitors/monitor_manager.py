@@ -19,6 +19,9 @@ from kekmonitors.comms.msg import Cmd, Response, badResponse, okResponse
 from kekmonitors.comms.server import Server
 from kekmonitors.config import COMMANDS, ERRORS, Config, LogConfig
 from kekmonitors.discord_embeds import get_mm_crash_embed
+from kekmonitors.utils.metrics import merge_alert_metrics, merge_metrics
+from kekmonitors.utils.rate_limit import TokenBucket
+from kekmonitors.webhook_manager import RenderedEmbed, WebhookManager
 
 if sys.version_info[1] > 6:
     import uvloop
@@ -143,12 +146,79 @@ class MonitorManager(Server, FileSystemEventHandler):
         ] = self.on_set_monitor_scraper_configs
         self.cmd_to_callback[COMMANDS.MM_GET_SCRAPER_SHOES] = self.on_get_scraper_shoes
         self.cmd_to_callback[COMMANDS.MM_GET_MONITOR_SHOES] = self.on_get_monitor_shoes
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_MONITOR_CIRCUIT_BREAKERS
+        ] = self.on_get_monitor_circuit_breakers
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_SCRAPER_CIRCUIT_BREAKERS
+        ] = self.on_get_scraper_circuit_breakers
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_MONITOR_CONCURRENCY
+        ] = self.on_get_monitor_concurrency
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_SCRAPER_CONCURRENCY
+        ] = self.on_get_scraper_concurrency
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_MONITOR_PROXIES
+        ] = self.on_get_monitor_proxies
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_SCRAPER_PROXIES
+        ] = self.on_get_scraper_proxies
+        self.cmd_to_callback[
+            COMMANDS.MM_SCHEDULE_MONITOR_WARMUP
+        ] = self.on_schedule_monitor_warmup
+        self.cmd_to_callback[
+            COMMANDS.MM_SCHEDULE_SCRAPER_WARMUP
+        ] = self.on_schedule_scraper_warmup
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_MONITOR_WARMUPS
+        ] = self.on_get_monitor_warmups
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_SCRAPER_WARMUPS
+        ] = self.on_get_scraper_warmups
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_MONITOR_DNS_STATS
+        ] = self.on_get_monitor_dns_stats
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_SCRAPER_DNS_STATS
+        ] = self.on_get_scraper_dns_stats
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_MONITOR_NETWORK_METRICS
+        ] = self.on_get_monitor_network_metrics
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_SCRAPER_NETWORK_METRICS
+        ] = self.on_get_scraper_network_metrics
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_NETWORK_METRICS
+        ] = self.on_get_network_metrics
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_MONITOR_RATE_LIMITS
+        ] = self.on_get_monitor_rate_limits
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_SCRAPER_RATE_LIMITS
+        ] = self.on_get_scraper_rate_limits
+        self.cmd_to_callback[COMMANDS.MM_ACQUIRE_TOKENS] = self.on_acquire_tokens
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_MONITOR_HEADER_PROFILES
+        ] = self.on_get_monitor_header_profiles
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_SCRAPER_HEADER_PROFILES
+        ] = self.on_get_scraper_header_profiles
+        self.cmd_to_callback[COMMANDS.MM_NOTIFY] = self.on_notify
+        self.cmd_to_callback[COMMANDS.MM_GET_ALERT_METRICS] = self.on_get_alert_metrics
+        self.cmd_to_callback[
+            COMMANDS.MM_GET_WEBHOOK_STATUS
+        ] = self.on_get_webhook_status
 
         # initialize variables
         self.monitor_processes = {}  # type: Dict[str, Dict[str, Any]]
         self.scraper_processes = {}  # type: Dict[str, Dict[str, Any]]
         self.monitor_sockets = {}  # type: Dict[str, str]
         self.scraper_sockets = {}  # type: Dict[str, str]
+        # token buckets shared by all the monitors and scrapers, by host
+        self.rate_limiters = {}  # type: Dict[str, TokenBucket]
+        # sends the embeds of all the monitors and scrapers (see MM_NOTIFY)
+        self.webhook_manager = WebhookManager(config, use_notifier=False)
         self.register_db = pymongo.MongoClient(
             self.config["GlobalConfig"]["db_path"]
         )[  # database where to find class_name -> filename relation
@@ -190,6 +260,7 @@ class MonitorManager(Server, FileSystemEventHandler):
     def start(self):
         """Start the Monitor Manager."""
         self.watcher.start()
+        self._asyncio_loop.call_soon(self.webhook_manager.start)
         self._asyncio_loop.run_forever()
 
     def on_modified(self, event: FileSystemEvent):
@@ -482,6 +553,9 @@ class MonitorManager(Server, FileSystemEventHandler):
                     else:
                         self.general_logger.info(f"{sockname} was successfully stopped")
 
+            self.general_logger.debug("Shutting down webhook manager...")
+            await self.webhook_manager.quit()
+
         self._asyncio_loop.stop()
         self.general_logger.info("Shutting down...")
         return okResponse()
@@ -892,6 +966,239 @@ class MonitorManager(Server, FileSystemEventHandler):
     async def on_set_scraper_webhooks(self, cmd: Cmd) -> Response:
         return await self.specific_config_setter(cmd, "webhooks.json", False)
 
+    async def on_get_monitor_circuit_breakers(self, cmd: Cmd) -> Response:
+        return await self.specific_config_getter(
+            cmd, COMMANDS.GET_CIRCUIT_BREAKERS, True
+        )
+
+    async def on_get_scraper_circuit_breakers(self, cmd: Cmd) -> Response:
+        return await self.specific_config_getter(
+            cmd, COMMANDS.GET_CIRCUIT_BREAKERS, False
+        )
+
+    async def on_get_monitor_concurrency(self, cmd: Cmd) -> Response:
+        return await self.specific_config_getter(cmd, COMMANDS.GET_CONCURRENCY, True)
+
+    async def on_get_scraper_concurrency(self, cmd: Cmd) -> Response:
+        return await self.specific_config_getter(cmd, COMMANDS.GET_CONCURRENCY, False)
+
+    async def on_get_monitor_proxies(self, cmd: Cmd) -> Response:
+        return await self.specific_config_getter(cmd, COMMANDS.GET_PROXIES, True)
+
+    async def on_get_scraper_proxies(self, cmd: Cmd) -> Response:
+        return await self.specific_config_getter(cmd, COMMANDS.GET_PROXIES, False)
+
+    async def on_schedule_monitor_warmup(self, cmd: Cmd) -> Response:
+        return await self.specific_command_forwarder(
+            cmd, COMMANDS.SCHEDULE_WARMUP, True
+        )
+
+    async def on_schedule_scraper_warmup(self, cmd: Cmd) -> Response:
+        return await self.specific_command_forwarder(
+            cmd, COMMANDS.SCHEDULE_WARMUP, False
+        )
+
+    async def on_get_monitor_warmups(self, cmd: Cmd) -> Response:
+        return await self.specific_config_getter(cmd, COMMANDS.GET_WARMUPS, True)
+
+    async def on_get_scraper_warmups(self, cmd: Cmd) -> Response:
+        return await self.specific_config_getter(cmd, COMMANDS.GET_WARMUPS, False)
+
+    async def on_get_monitor_dns_stats(self, cmd: Cmd) -> Response:
+        return await self.specific_config_getter(cmd, COMMANDS.GET_DNS_STATS, True)
+
+    async def on_get_scraper_dns_stats(self, cmd: Cmd) -> Response:
+        return await self.specific_config_getter(cmd, COMMANDS.GET_DNS_STATS, False)
+
+    async def on_get_monitor_network_metrics(self, cmd: Cmd) -> Response:
+        return await self.specific_config_getter(
+            cmd, COMMANDS.GET_NETWORK_METRICS, True
+        )
+
+    async def on_get_scraper_network_metrics(self, cmd: Cmd) -> Response:
+        return await self.specific_config_getter(
+            cmd, COMMANDS.GET_NETWORK_METRICS, False
+        )
+
+    async def on_get_network_metrics(self, cmd: Cmd) -> Response:
+        """Return the network metrics of every host, summed across all the monitors and scrapers,
+        together with the ones of every single monitor and scraper."""
+        c = Cmd()
+        c.cmd = COMMANDS.GET_NETWORK_METRICS
+        names = [f"Monitor.{name}" for name in self.monitor_sockets] + [
+            f"Scraper.{name}" for name in self.scraper_sockets
+        ]
+        sockets = list(self.monitor_sockets.values()) + list(
+            self.scraper_sockets.values()
+        )
+        responses = await asyncio.gather(
+            *[self.make_request(socket, c) for socket in sockets]
+        )
+        processes = {}  # type: Dict[str, Dict[str, Any]]
+        for name, r in zip(names, responses):
+            if r.error.value or not isinstance(r.payload, dict):
+                self.general_logger.warning(
+                    f"Couldn't get network metrics of {name}: {r.error.name}"
+                )
+                continue
+            processes[name] = r.payload
+        response = okResponse()
+        response.payload = {
+            "hosts": merge_metrics(list(processes.values())),
+            "processes": processes,
+        }
+        return response
+
+    async def on_get_monitor_rate_limits(self, cmd: Cmd) -> Response:
+        return await self.specific_config_getter(cmd, COMMANDS.GET_RATE_LIMITS, True)
+
+    async def on_get_scraper_rate_limits(self, cmd: Cmd) -> Response:
+        return await self.specific_config_getter(cmd, COMMANDS.GET_RATE_LIMITS, False)
+
+    async def on_acquire_tokens(self, cmd: Cmd) -> Response:
+        """Lease tokens of the shared token bucket of a host to a monitor or scraper, without waiting.\n
+        The payload contains `host`, `tokens` (how many are wanted), `rate` and `burst` (the bucket is created or
+        updated with them, so the processes using the same host should be configured with the same rate);
+        the response payload contains `granted` and `wait`, the seconds to wait for the next token if none has been granted."""
+        payload = cmd.payload
+        try:
+            host = payload["host"]
+            rate = float(payload["rate"])
+            burst = float(payload["burst"])
+            if host not in self.rate_limiters:
+                self.rate_limiters[host] = TokenBucket(rate, burst)
+            bucket = self.rate_limiters[host]
+            if bucket.rate != rate or bucket.burst != max(burst, 1):
+                bucket.set_rate(rate, burst)
+            granted, wait = bucket.grant(int(payload["tokens"]))
+        except (KeyError, TypeError, ValueError) as e:
+            r = badResponse()
+            r.error = ERRORS.BAD_PAYLOAD
+            r.info = f"Invalid token request: {e}"
+            return r
+        bucket.acquired += granted
+        r = okResponse()
+        r.payload = {"granted": granted, "wait": wait}
+        return r
+
+    async def on_get_monitor_header_profiles(self, cmd: Cmd) -> Response:
+        return await self.specific_config_getter(
+            cmd, COMMANDS.GET_HEADER_PROFILES, True
+        )
+
+    async def on_get_scraper_header_profiles(self, cmd: Cmd) -> Response:
+        return await self.specific_config_getter(
+            cmd, COMMANDS.GET_HEADER_PROFILES, False
+        )
+
+    async def on_notify(self, cmd: Cmd) -> Response:
+        """Send embeds on behalf of a monitor or scraper. The payload is a list of objects with `embed` (as returned by
+        `Embed.to_dict`, without footer and color), `webhooks` (like the ones in webhooks.json) and optionally `key`
+        (embeds with a key which has already been received are ignored), `time` (the timestamp at which they were found),
+        `source` and `timings` (the monitor/scraper which found them and the time at which they reached every stage,
+        to track their latency)."""
+        notifications = []
+        try:
+            for notification in cmd.payload:
+                webhooks = notification["webhooks"]
+                if not isinstance(webhooks, dict):
+                    raise TypeError("webhooks must be a dict")
+                key = notification.get("key")
+                if key is not None and not isinstance(key, str):
+                    raise TypeError("key must be a string")
+                now = None
+                if "time" in notification:
+                    now = datetime.fromtimestamp(float(notification["time"]))
+                timings = None
+                if "timings" in notification:
+                    timings = {
+                        stage: float(t) for stage, t in notification["timings"].items()
+                    }
+                source = notification.get("source")
+                if source is not None and not isinstance(source, str):
+                    raise TypeError("source must be a string")
+                notifications.append(
+                    (
+                        RenderedEmbed(notification["embed"]),
+                        webhooks,
+                        key,
+                        now,
+                        timings,
+                        source,
+                    )
+                )
+        except (KeyError, TypeError, AttributeError, ValueError) as e:
+            r = badResponse()
+            r.error = ERRORS.BAD_PAYLOAD
+            r.info = f"Invalid notification: {e}"
+            return r
+        for embed, webhooks, key, now, timings, source in notifications:
+            # written to the outbox before answering, so nothing is lost if the MonitorManager stops
+            self.webhook_manager.add_to_queue(
+                embed, webhooks, key, now, timings, source
+            )
+        return okResponse()
+
+    async def on_get_alert_metrics(self, cmd: Cmd) -> Response:
+        """Return the latency of the alerts of every monitor and scraper, merging the stages recorded by them
+        with the ones recorded by the notifier for the alerts they forwarded."""
+        c = Cmd()
+        c.cmd = COMMANDS.GET_ALERT_METRICS
+        names = [f"Monitor.{name}" for name in self.monitor_sockets] + [
+            f"Scraper.{name}" for name in self.scraper_sockets
+        ]
+        sockets = list(self.monitor_sockets.values()) + list(
+            self.scraper_sockets.values()
+        )
+        responses = await asyncio.gather(
+            *[self.make_request(socket, c) for socket in sockets]
+        )
+        by_source = {}  # type: Dict[str, List[Dict[str, Any]]]
+        for source, status in self.webhook_manager.get_alert_metrics().items():
+            by_source.setdefault(source, []).append(status)
+        for name, r in zip(names, responses):
+            if r.error.value or not isinstance(r.payload, dict):
+                self.general_logger.warning(
+                    f"Couldn't get alert metrics of {name}: {r.error.name}"
+                )
+                continue
+            for source, status in r.payload.items():
+                by_source.setdefault(source, []).append(status)
+        response = okResponse()
+        response.payload = {
+            source: merge_alert_metrics(statuses)
+            for source, statuses in by_source.items()
+        }
+        return response
+
+    async def on_get_webhook_status(self, cmd: Cmd) -> Response:
+        """Return the health of the webhooks sent by the notifier and by every monitor and scraper."""
+        c = Cmd()
+        c.cmd = COMMANDS.GET_WEBHOOK_STATUS
+        names = [f"Monitor.{name}" for name in self.monitor_sockets] + [
+            f"Scraper.{name}" for name in self.scraper_sockets
+        ]
+        sockets = list(self.monitor_sockets.values()) + list(
+            self.scraper_sockets.values()
+        )
+        responses = await asyncio.gather(
+            *[self.make_request(socket, c) for socket in sockets]
+        )
+        processes = {}  # type: Dict[str, Dict[str, Any]]
+        for name, r in zip(names, responses):
+            if r.error.value or not isinstance(r.payload, dict):
+                self.general_logger.warning(
+                    f"Couldn't get webhook status of {name}: {r.error.name}"
+                )
+                continue
+            processes[name] = r.payload
+        response = okResponse()
+        response.payload = {
+            "notifier": self.webhook_manager.get_status(),
+            "processes": processes,
+        }
+        return response
+
     async def on_set_monitor_scraper_blacklist(self, cmd: Cmd) -> Response:
         return await self.common_config_setter(cmd, "blacklists.json")
 
@@ -923,6 +1230,27 @@ class MonitorManager(Server, FileSystemEventHandler):
             r.info = f"{missing}"
             return r
 
+    async def specific_command_forwarder(
+        self, cmd: Cmd, command: COMMANDS, is_monitor: bool
+    ):
+        """Send `command` to the monitor/scraper called `name` in the payload, with `payload` in the payload as its payload."""
+        success, missing = cmd.has_valid_args(self.setter_args)
+        if success:
+            payload = cast(Dict[str, Any], cmd.payload)
+            c = Cmd()
+            c.cmd = command
+            c.payload = payload["payload"]
+            r = await self.make_request(
+                f"{self.config['GlobalConfig']['socket_path']}/{'Monitor' if is_monitor else 'Scraper'}.{payload['name']}",
+                c,
+            )
+            return r
+        else:
+            r = badResponse()
+            r.error = ERRORS.MISSING_PAYLOAD_ARGS
+            r.info = f"{missing}"
+            return r
+
     async def specific_config_setter(self, cmd: Cmd, filename: str, is_monitor: bool):
         success, missing = cmd.has_valid_args(self.setter_args)
         if success:
@@ -0,0 +1,251 @@
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from kekmonitors.utils.session_store import SessionStore
+
+try:
+    import pyppeteer
+    from pyppeteer.errors import PyppeteerError
+except ImportError:
+    pyppeteer = None
+    PyppeteerError = Exception
+
+# resources which are usually not needed to parse a page
+DEFAULT_BLOCKED_RESOURCES = ("image", "media", "font", "stylesheet")
+
+
+class BrowserPool(object):
+    """Pool of pages of a single headless browser (pyppeteer, which must be installed separately), to be reused across loops:\n
+    `async with self.browser_pool.page() as page:`\n
+    `    response = await page.goto(link)`\n
+    At most `size` pages are open at the same time, `page()` waits for one to be free. When they're released pages are reset
+    (navigated to about:blank, with no extra headers) and reused, unless they have been used `max_page_uses` times or
+    an exception was raised while using them, in which case they're closed. Requests for `blocked_resources` (see puppeteer's
+    `request.resourceType`) are aborted.\n
+    The browser is checked every `health_check_interval` seconds and restarted if it crashed or stopped responding.\n
+    If a `session_store` is given, its cookies are set on every new page and the cookies of every released page are saved in it,
+    so that challenges solved by the browser are not solved again (neither by the browser nor by plain requests) until they expire."""
+
+    def __init__(
+        self,
+        size: int = 5,
+        launch_options: Optional[Dict[str, Any]] = None,
+        blocked_resources: Iterable[str] = DEFAULT_BLOCKED_RESOURCES,
+        max_page_uses: int = 50,
+        health_check_interval: float = 30,
+        logger: Optional[logging.Logger] = None,
+        session_store: Optional[SessionStore] = None,
+    ):
+        if pyppeteer is None:
+            raise ImportError("pyppeteer is needed to use BrowserPool")
+        self.size = size
+        self.launch_options = launch_options or {}
+        self.blocked_resources = set(blocked_resources)
+        self.max_page_uses = max_page_uses
+        self.health_check_interval = health_check_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.session_store = session_store
+        self.browser = None  # type: Any
+        # incremented every time the browser is (re)started
+        self._generation = 0
+        self._idle = []  # type: List[Any]
+        # number of uses of every page of the current browser
+        self._uses = {}  # type: Dict[Any, int]
+        self._in_use = 0
+        self._semaphore = asyncio.Semaphore(size)
+        self._restart_lock = asyncio.Lock()
+        self._health_task = None  # type: Optional[asyncio.Task]
+        self.restarts = 0
+        # called with every new page, e.g. to set cookies
+        self.page_callbacks = []  # type: List[Any]
+
+    async def start(self):
+        await self._launch()
+        self._health_task = asyncio.ensure_future(self._health_check_loop())
+
+    async def _launch(self):
+        self.browser = await pyppeteer.launch(
+            # pyppeteer's signal handlers would close the browser before the monitor is done with it
+            **{
+                "handleSIGINT": False,
+                "handleSIGTERM": False,
+                "handleSIGHUP": False,
+                **self.launch_options,
+            }
+        )
+        self._generation += 1
+        self._idle = []
+        self._uses = {}
+        self.logger.info("Browser started")
+
+    async def restart(self):
+        """Close the browser (if it's still alive) and start a new one."""
+        generation = self._generation
+        async with self._restart_lock:
+            if generation != self._generation:
+                # somebody else restarted it while we were waiting
+                return
+            self.logger.warning("Restarting browser...")
+            await self._close_browser()
+            await self._launch()
+            self.restarts += 1
+
+    async def _close_browser(self):
+        if self.browser is None:
+            return
+        try:
+            await asyncio.wait_for(self.browser.close(), 10)
+        except (PyppeteerError, asyncio.TimeoutError, OSError):
+            self.logger.exception("Couldn't close the browser gracefully:")
+            process = self.browser.process
+            if process is not None and process.poll() is None:
+                process.kill()
+        self.browser = None
+
+    async def is_healthy(self) -> bool:
+        if self.browser is None:
+            return False
+        process = self.browser.process
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            await asyncio.wait_for(self.browser.version(), 10)
+            return True
+        except (PyppeteerError, asyncio.TimeoutError, OSError):
+            return False
+
+    async def _health_check_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                if not await self.is_healthy():
+                    self.logger.warning("Browser is not responding")
+                    await self.restart()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.exception("Failed to check the browser:")
+
+    async def _new_page(self) -> Any:
+        page = await self.browser.newPage()
+        if self.blocked_resources:
+            await page.setRequestInterception(True)
+            page.on(
+                "request",
+                lambda request: asyncio.ensure_future(self._intercept(request)),
+            )
+        if self.session_store is not None:
+            cookies = self.session_store.get_browser_cookies()
+            if cookies:
+                await page.setCookie(*cookies)
+        for callback in self.page_callbacks:
+            await callback(page)
+        self._uses[page] = 0
+        return page
+
+    async def _intercept(self, request: Any):
+        try:
+            if request.resourceType in self.blocked_resources:
+                await request.abort()
+            else:
+                await request.continue_()
+        except PyppeteerError:
+            # the page was closed or navigated away
+            pass
+
+    async def acquire(self) -> Any:
+        """Return a free page, waiting for one if all of them are in use. It must be released with `release`."""
+        await self._semaphore.acquire()
+        try:
+            page = None
+            while self._idle and page is None:
+                page = self._idle.pop()
+                if page.isClosed():
+                    self._uses.pop(page, None)
+                    page = None
+            if page is None:
+                try:
+                    page = await self._new_page()
+                except (PyppeteerError, OSError):
+                    self.logger.exception("Couldn't open a new page:")
+                    await self.restart()
+                    page = await self._new_page()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        self._in_use += 1
+        return page
+
+    async def release(self, page: Any, reuse: bool = True):
+        """Give back a page taken with `acquire`, resetting it if it can be reused."""
+        try:
+            # pages of a browser which has been restarted are not there anymore
+            uses = self._uses.pop(page, self.max_page_uses) + 1
+            await self._save_cookies(page)
+            if reuse and uses < self.max_page_uses and not page.isClosed():
+                try:
+                    await asyncio.wait_for(self._reset_page(page), 10)
+                    self._uses[page] = uses
+                    self._idle.append(page)
+                    return
+                except (PyppeteerError, asyncio.TimeoutError, OSError):
+                    self.logger.debug("Couldn't reset page, closing it")
+            await self._close_page(page)
+        finally:
+            self._in_use -= 1
+            self._semaphore.release()
+
+    async def _save_cookies(self, page: Any):
+        if self.session_store is None or page.isClosed() or page.url == "about:blank":
+            return
+        try:
+            cookies = await asyncio.wait_for(page.cookies(), 10)
+        except (PyppeteerError, asyncio.TimeoutError, OSError):
+            self.logger.debug("Couldn't get the cookies of the page")
+            return
+        self.session_store.set_browser_cookies(cookies)
+        self.session_store.save()
+
+    async def _reset_page(self, page: Any):
+        await page.goto("about:blank")
+        await page.setExtraHTTPHeaders({})
+        await page.setJavaScriptEnabled(True)
+
+    async def _close_page(self, page: Any):
+        try:
+            if not page.isClosed():
+                await asyncio.wait_for(page.close(), 10)
+        except (PyppeteerError, asyncio.TimeoutError, OSError):
+            pass
+
+    def page(self) -> "_PageContext":
+        """Return an async context manager acquiring and releasing a page."""
+        return _PageContext(self)
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+        await self._close_browser()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "in_use": self._in_use,
+            "restarts": self.restarts,
+        }
+
+
+class _PageContext(object):
+    def __init__(self, pool: BrowserPool):
+        self.pool = pool
+        self._page = None  # type: Any
+
+    async def __aenter__(self) -> Any:
+        self._page = await self.pool.acquire()
+        return self._page
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # pages which raised may be in any state, better not to reuse them
+        await self.pool.release(self._page, reuse=exc_type is None)
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+# codes which mean that we are going too fast for the host
+BACKOFF_CODES = (403, 429, 599)
+
+
+class AIMDLimiter(object):
+    """Limits the number of concurrent requests to a single host, adapting the limit at runtime:
+    every healthy and fast response increases it additively (by `increase` every `limit` responses),
+    while 403/429/599 and latency spikes (more than `latency_factor` times the average) cut it multiplicatively by `decrease`.\n
+    The limit is decreased at most once per average latency, so that a burst of bad responses counts as one."""
+
+    def __init__(
+        self,
+        initial: float = 10,
+        min_limit: float = 1,
+        max_limit: float = 50,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_factor: float = 3.0,
+        history_size: int = 50,
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.in_flight = 0
+        # exponentially weighted moving average of the latency of healthy responses
+        self.latency = None  # type: Optional[float]
+        self.history = deque(maxlen=history_size)  # type: Deque[Dict[str, Any]]
+        self._last_decrease = 0.0
+        self._waiters = deque()  # type: Deque[asyncio.Future]
+
+    async def acquire(self):
+        """Wait until a request can be made to the host."""
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_event_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # woken up but cancelled before taking the slot: give it to someone else
+                    self._wake_up()
+                raise
+        self.in_flight += 1
+
+    def release(self, code: Optional[int], latency: float):
+        """Release the slot taken with `acquire`, updating the limit with the outcome of the request
+        (unless `code` is None, e.g. if the request was cancelled)."""
+        self.in_flight -= 1
+        if code is not None:
+            self.update(code, latency)
+        self._wake_up()
+
+    def update(self, code: int, latency: float):
+        now = time.monotonic()
+        if code in BACKOFF_CODES:
+            self._decrease(now, str(code))
+        elif self.latency is not None and latency > self.latency * self.latency_factor:
+            self._decrease(now, "latency")
+        elif code < 400:
+            self.latency = (
+                latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            )
+            old_limit = int(self.limit)
+            self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            if int(self.limit) != old_limit:
+                self._add_to_history("increase")
+
+    def _decrease(self, now: float, reason: str):
+        if self.latency is not None and now - self._last_decrease < self.latency:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.decrease)
+        self._add_to_history(reason)
+
+    def _add_to_history(self, reason: str):
+        self.history.append(
+            {"time": time.time(), "limit": int(self.limit), "reason": reason}
+        )
+
+    def _wake_up(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "latency": self.latency,
+            "history": list(self.history),
+        }
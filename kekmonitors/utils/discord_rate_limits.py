@@ -0,0 +1,137 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, Mapping, Optional
+
+from kekmonitors.utils.rate_limit import TokenBucket
+
+# used if a 429 doesn't say how long to wait
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class RateLimitBucket(object):
+    """State of a discord rate limit bucket, as reported by the `X-RateLimit-*` headers."""
+
+    def __init__(self):
+        self.limit = None  # type: Optional[int]
+        self.remaining = 1
+        # monotonic time at which the bucket is reset
+        self.reset_at = 0.0
+
+    def get_delay(self) -> float:
+        """Seconds to wait before a request can be made."""
+        now = time.monotonic()
+        if self.reset_at <= now:
+            return 0.0
+        return 0.0 if self.remaining > 0 else self.reset_at - now
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "reset_after": max(0.0, self.reset_at - time.monotonic()),
+        }
+
+
+class DiscordRateLimiter(object):
+    """Schedules the requests to discord webhooks so that they respect the rate limits, instead of reacting to 429s.\n
+    Webhooks are mapped to the bucket in `X-RateLimit-Bucket` (webhooks sharing a bucket share its limit), every request
+    takes one of the remaining requests of its bucket before it's made and waits for the reset if there are none left.
+    All the requests are also paced at `global_rate` per second. A 429 blocks the bucket of the webhook (or every webhook,
+    if the limit is global) for as long as discord asks, from `Retry-After` or from the body if the other headers are missing.\n
+    Header names must be lowercase, unless `headers` is case insensitive (like aiohttp's)."""
+
+    def __init__(self, global_rate: float = 50):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        # monotonic time until which no request can be made, after a global 429
+        self.global_until = 0.0
+        self._webhook_buckets = {}  # type: Dict[str, str]
+        self.buckets = {}  # type: Dict[str, RateLimitBucket]
+        self.rate_limited = 0
+
+    def _get_bucket(self, webhook: str) -> RateLimitBucket:
+        # until discord tells us the bucket, every webhook has its own
+        key = self._webhook_buckets.get(webhook, webhook)
+        if key not in self.buckets:
+            self.buckets[key] = RateLimitBucket()
+        return self.buckets[key]
+
+    async def acquire(self, webhook: str):
+        """Wait until a request can be made to `webhook`."""
+        while True:
+            delay = max(
+                self.global_until - time.monotonic(),
+                self._get_bucket(webhook).get_delay(),
+            )
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        bucket = self._get_bucket(webhook)
+        if bucket.reset_at > time.monotonic():
+            # reserved now, so that concurrent requests of the same bucket don't overshoot it
+            bucket.remaining -= 1
+        await self.global_bucket.acquire()
+
+    def update(
+        self,
+        webhook: str,
+        status: int,
+        headers: Mapping[str, str],
+        body: bytes = b"",
+    ) -> bool:
+        """Update the limits with the response to a request to `webhook`. Return False if no rate limit info has been found."""
+        now = time.monotonic()
+        found = False
+        if "x-ratelimit-bucket" in headers:
+            self._webhook_buckets[webhook] = headers["x-ratelimit-bucket"]
+        bucket = self._get_bucket(webhook)
+        try:
+            if "x-ratelimit-remaining" in headers:
+                found = True
+                bucket.remaining = int(headers["x-ratelimit-remaining"])
+                if "x-ratelimit-limit" in headers:
+                    bucket.limit = int(headers["x-ratelimit-limit"])
+                bucket.reset_at = now + float(
+                    headers.get("x-ratelimit-reset-after", DEFAULT_RETRY_AFTER)
+                )
+        except ValueError:
+            pass
+        if status == 429:
+            self.rate_limited += 1
+            retry_after = None  # type: Optional[float]
+            is_global = headers.get("x-ratelimit-global", "").lower() == "true"
+            is_global = is_global or headers.get("x-ratelimit-scope") == "global"
+            try:
+                retry_after = float(headers["retry-after"])
+            except (KeyError, ValueError):
+                pass
+            try:
+                data = json.loads(body)
+                if retry_after is None:
+                    retry_after = float(data["retry_after"])
+                is_global = is_global or bool(data.get("global"))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                pass
+            if retry_after is None:
+                retry_after = (
+                    bucket.reset_at - now
+                    if bucket.reset_at > now
+                    else DEFAULT_RETRY_AFTER
+                )
+            found = True
+            if is_global:
+                self.global_until = max(self.global_until, now + retry_after)
+            else:
+                bucket.remaining = 0
+                bucket.reset_at = max(bucket.reset_at, now + retry_after)
+        return found
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "global_blocked_for": max(0.0, self.global_until - time.monotonic()),
+            "rate_limited": self.rate_limited,
+            "buckets": {
+                key: bucket.get_status() for key, bucket in self.buckets.items()
+            },
+            "webhooks": dict(self._webhook_buckets),
+        }
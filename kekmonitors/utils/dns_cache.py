@@ -0,0 +1,171 @@
+import asyncio
+import ipaddress
+import socket
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+try:
+    import aiodns
+except ImportError:
+    aiodns = None
+
+
+class DNSCache(object):
+    """Asynchronous DNS cache used by the http backends.\n
+    Addresses are kept for the TTL of the records (clamped between `min_ttl` and `max_ttl`);
+    when an entry is used after `refresh_ratio` of its TTL has passed it's refreshed in the background,
+    so that hot hosts never wait for the resolver. If the resolver fails, the expired addresses are still used.\n
+    Uses aiodns if installed (it comes with aiohttp[speedups]), otherwise the resolver of the event loop,
+    which doesn't report TTLs: `default_ttl` is used instead."""
+
+    def __init__(
+        self,
+        min_ttl: float = 5,
+        max_ttl: float = 300,
+        default_ttl: float = 60,
+        refresh_ratio: float = 0.8,
+        history_size: int = 100,
+    ):
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.default_ttl = default_ttl
+        self.refresh_ratio = refresh_ratio
+        # host -> (addresses, time of the resolution, ttl)
+        self._entries = {}  # type: Dict[str, Tuple[List[str], float, float]]
+        self._pending = {}  # type: Dict[str, asyncio.Future]
+        self._refresh_tasks = set()  # type: Set[asyncio.Task]
+        self._resolver = None  # type: Any
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.failures = 0
+        self._latencies = deque(maxlen=history_size)  # type: Deque[float]
+
+    def _get_resolver(self):
+        # created lazily, it needs the event loop
+        if self._resolver is None and aiodns is not None:
+            self._resolver = aiodns.DNSResolver()
+        return self._resolver
+
+    async def resolve(self, host: str) -> List[str]:
+        """Return the IPv4 addresses of `host` (or the host itself if it's already an IP address).
+        Raises `socket.gaierror` if the host can't be resolved and it's not in the cache."""
+        if is_ip_address(host):
+            return [host]
+        now = time.monotonic()
+        entry = self._entries.get(host)
+        if entry is not None:
+            addresses, resolved_at, ttl = entry
+            age = now - resolved_at
+            if age < ttl:
+                self.hits += 1
+                if age > ttl * self.refresh_ratio and host not in self._pending:
+                    task = asyncio.ensure_future(self._refresh(host))
+                    self._refresh_tasks.add(task)
+                    task.add_done_callback(self._refresh_tasks.discard)
+                return addresses
+        self.misses += 1
+        try:
+            return await self._resolve(host)
+        except (socket.gaierror, OSError):
+            if entry is not None:
+                # better stale addresses than no addresses
+                return entry[0]
+            raise
+
+    async def prefetch(self, hosts: List[str]):
+        """Resolve `hosts` in advance, ignoring errors."""
+        await asyncio.gather(
+            *[self.resolve(host) for host in hosts], return_exceptions=True
+        )
+
+    async def _refresh(self, host: str):
+        self.refreshes += 1
+        try:
+            await self._resolve(host)
+        except (socket.gaierror, OSError):
+            pass
+
+    async def _resolve(self, host: str) -> List[str]:
+        # concurrent lookups of the same host share the same query
+        if host in self._pending:
+            return await asyncio.shield(self._pending[host])
+        future = asyncio.ensure_future(self._query(host))
+        self._pending[host] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._pending.pop(host, None)
+            else:
+                future.add_done_callback(lambda _: self._pending.pop(host, None))
+
+    async def _query(self, host: str) -> List[str]:
+        start = time.monotonic()
+        try:
+            resolver = self._get_resolver()
+            if resolver is not None:
+                try:
+                    result = await resolver.getaddrinfo(host, family=socket.AF_INET)
+                except aiodns.error.DNSError as e:
+                    raise socket.gaierror(str(e)) from e
+                addresses = [_to_str(node.addr[0]) for node in result.nodes]
+                ttl = min(node.ttl for node in result.nodes) if result.nodes else 0
+            else:
+                infos = await asyncio.get_event_loop().getaddrinfo(
+                    host, None, family=socket.AF_INET, type=socket.SOCK_STREAM
+                )
+                addresses = [info[4][0] for info in infos]
+                ttl = self.default_ttl
+            if not addresses:
+                raise socket.gaierror(f"No addresses found for {host}")
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self._latencies.append(time.monotonic() - start)
+        # remove duplicates, keeping the order
+        addresses = list(dict.fromkeys(addresses))
+        ttl = min(self.max_ttl, max(self.min_ttl, ttl))
+        self._entries[host] = (addresses, time.monotonic(), ttl)
+        return addresses
+
+    def close(self):
+        for task in list(self._refresh_tasks):
+            task.cancel()
+        if self._resolver is not None:
+            self._resolver.cancel()
+
+    def get_status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        latencies = sorted(self._latencies)
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "resolve_latency": {
+                "average": sum(latencies) / len(latencies) if latencies else None,
+                "p50": latencies[len(latencies) // 2] if latencies else None,
+                "max": latencies[-1] if latencies else None,
+            },
+            "hosts": {
+                host: {"addresses": addresses, "expires_in": resolved_at + ttl - now}
+                for host, (addresses, resolved_at, ttl) in self._entries.items()
+            },
+        }
+
+
+def is_ip_address(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        return False
+
+
+def _to_str(address: Any) -> str:
+    return address.decode() if isinstance(address, bytes) else address
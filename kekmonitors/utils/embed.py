@@ -0,0 +1,116 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+
+class Embed(object):
+    """Minimal discord embed, producing the same dicts as discord.py's `Embed.to_dict` without depending on it.\n
+    Only what webhooks need is supported: title, description, url, color, timestamp, fields, footer, image,
+    thumbnail and author. Unset values are None and are left out of the dict."""
+
+    def __init__(
+        self,
+        title: Optional[str] = None,
+        description: Optional[str] = None,
+        url: Optional[str] = None,
+        color: Optional[int] = None,
+        timestamp: Optional[datetime] = None,
+        colour: Optional[int] = None,
+    ):
+        self.title = title
+        self.description = description
+        self.url = url
+        self.color = color if color is not None else colour
+        self.timestamp = timestamp
+        self.fields = []  # type: List[Dict[str, Any]]
+        self.footer = None  # type: Optional[Dict[str, str]]
+        self.image = None  # type: Optional[Dict[str, str]]
+        self.thumbnail = None  # type: Optional[Dict[str, str]]
+        self.author = None  # type: Optional[Dict[str, str]]
+
+    @property
+    def colour(self) -> Optional[int]:
+        return self.color
+
+    @colour.setter
+    def colour(self, colour: Optional[int]):
+        self.color = colour
+
+    def add_field(self, name: Any, value: Any, inline: bool = True) -> "Embed":
+        self.fields.append({"name": str(name), "value": str(value), "inline": inline})
+        return self
+
+    def clear_fields(self) -> "Embed":
+        self.fields = []
+        return self
+
+    def set_footer(
+        self, text: Optional[str] = None, icon_url: Optional[str] = None
+    ) -> "Embed":
+        self.footer = _without_none(text=text, icon_url=icon_url)
+        return self
+
+    def set_image(self, url: Optional[str]) -> "Embed":
+        self.image = _without_none(url=url) or None
+        return self
+
+    def set_thumbnail(self, url: Optional[str]) -> "Embed":
+        self.thumbnail = _without_none(url=url) or None
+        return self
+
+    def set_author(
+        self, name: str, url: Optional[str] = None, icon_url: Optional[str] = None
+    ) -> "Embed":
+        self.author = _without_none(name=str(name), url=url, icon_url=icon_url)
+        return self
+
+    def __len__(self) -> int:
+        """Number of characters counted by discord for its limits."""
+        length = len(self.title or "") + len(self.description or "")
+        for field in self.fields:
+            length += len(field["name"]) + len(field["value"])
+        if self.footer:
+            length += len(self.footer.get("text", ""))
+        if self.author:
+            length += len(self.author["name"])
+        return length
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"type": "rich"}  # type: Dict[str, Any]
+        for key in ("title", "description", "url", "color"):
+            value = getattr(self, key)
+            if value is not None:
+                data[key] = value
+        if self.timestamp is not None:
+            timestamp = self.timestamp
+            if timestamp.tzinfo is None:
+                # naive datetimes are local time, like in discord.py
+                timestamp = timestamp.astimezone()
+            data["timestamp"] = timestamp.astimezone(timezone.utc).isoformat()
+        if self.fields:
+            data["fields"] = [dict(field) for field in self.fields]
+        for key in ("footer", "image", "thumbnail", "author"):
+            value = getattr(self, key)
+            if value:
+                data[key] = dict(value)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Embed":
+        embed = cls(
+            title=data.get("title"),
+            description=data.get("description"),
+            url=data.get("url"),
+            color=data.get("color"),
+        )
+        if "timestamp" in data:
+            embed.timestamp = datetime.fromisoformat(data["timestamp"])
+        for field in data.get("fields", []):
+            embed.add_field(field["name"], field["value"], field.get("inline", True))
+        for key in ("footer", "image", "thumbnail", "author"):
+            if key in data:
+                setattr(embed, key, dict(data[key]))
+        return embed
+
+
+def _without_none(**kwargs: Any) -> Dict[str, Any]:
+    return {key: value for key, value in kwargs.items() if value is not None}
@@ -0,0 +1,160 @@
+import itertools
+import random
+from typing import Any, Dict, Iterable, List, Optional
+
+# headers which must not be part of a profile: they're set by the client, per request or by the session store
+EXCLUDED_HEADERS = ("host", "content-length", "cookie", "pragma", "connection")
+# codes which usually mean that the fingerprint has been flagged
+PROFILE_FAILURE_CODES = (403, 429)
+# rotation policies
+STICKY = "sticky"
+ROUND_ROBIN = "round_robin"
+RANDOM = "random"
+
+DEFAULT_PROFILES = [
+    {
+        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+        "accept-language": "en-US,en;q=0.9",
+        "sec-ch-ua": '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
+        "sec-ch-ua-mobile": "?0",
+        "sec-ch-ua-platform": '"Windows"',
+        "sec-fetch-dest": "document",
+        "sec-fetch-mode": "navigate",
+        "sec-fetch-site": "none",
+        "sec-fetch-user": "?1",
+        "upgrade-insecure-requests": "1",
+    },
+    {
+        "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+        "accept-language": "en-GB,en;q=0.9",
+        "sec-ch-ua": '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
+        "sec-ch-ua-mobile": "?0",
+        "sec-ch-ua-platform": '"macOS"',
+        "sec-fetch-dest": "document",
+        "sec-fetch-mode": "navigate",
+        "sec-fetch-site": "none",
+        "sec-fetch-user": "?1",
+        "upgrade-insecure-requests": "1",
+    },
+    {
+        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0",
+        "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+        "accept-language": "en-US,en;q=0.5",
+        "sec-fetch-dest": "document",
+        "sec-fetch-mode": "navigate",
+        "sec-fetch-site": "none",
+        "sec-fetch-user": "?1",
+        "upgrade-insecure-requests": "1",
+    },
+    {
+        "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15",
+        "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "accept-language": "en-US,en;q=0.9",
+    },
+]  # type: List[Dict[str, str]]
+
+
+class HeaderProfile(object):
+    """A coherent set of browser headers, validated once when it's created instead of at every request."""
+
+    def __init__(self, headers: Dict[str, str], has_brotli: bool = False):
+        headers = {key.lower(): str(value) for key, value in headers.items()}
+        if not headers.get("user-agent"):
+            raise ValueError("A header profile needs a user-agent")
+        for key in EXCLUDED_HEADERS:
+            headers.pop(key, None)
+        # only what the client can decode
+        headers["accept-encoding"] = (
+            "gzip, deflate, br" if has_brotli else "gzip, deflate"
+        )
+        self.headers = headers
+        self.uses = 0
+        self.failures = 0
+
+    def get_headers(self) -> Dict[str, str]:
+        """Return a copy of the headers, which can be modified freely."""
+        return dict(self.headers)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "user-agent": self.headers["user-agent"],
+            "uses": self.uses,
+            "failures": self.failures,
+        }
+
+
+class HeaderProfilePool(object):
+    """Pool of header profiles, chosen according to `rotation`:\n
+    `sticky`: the same profile is used for every request with the same key (a proxy or a host), until it gets a 403/429;\n
+    `round_robin`: profiles are used in turn;\n
+    `random`: a random profile is used for every request."""
+
+    def __init__(
+        self,
+        profiles: Iterable[Dict[str, str]] = DEFAULT_PROFILES,
+        rotation: str = STICKY,
+        has_brotli: bool = False,
+    ):
+        if rotation not in (STICKY, ROUND_ROBIN, RANDOM):
+            raise ValueError(f"Unknown rotation policy: {rotation}")
+        self.rotation = rotation
+        self.has_brotli = has_brotli
+        self.profiles = []  # type: List[HeaderProfile]
+        # key -> profile, used if sticky
+        self._bindings = {}  # type: Dict[str, HeaderProfile]
+        self._cycle = itertools.cycle(())  # type: Any
+        self.update(profiles)
+
+    def update(self, profiles: Iterable[Dict[str, str]]):
+        """Replace the profiles in the pool. Raises ValueError if any of them is invalid, leaving the pool untouched.
+        If the profiles are the same as the current ones nothing changes, so that keys stay bound to their profile."""
+        new_profiles = [HeaderProfile(profile, self.has_brotli) for profile in profiles]
+        if not new_profiles:
+            raise ValueError("No header profiles")
+        if [p.headers for p in new_profiles] == [p.headers for p in self.profiles]:
+            return
+        self.profiles = new_profiles
+        self._bindings = {}
+        self._cycle = itertools.cycle(self.profiles)
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def get_profile(self, key: Optional[str] = None, use: bool = True) -> HeaderProfile:
+        """Return the profile to be used for `key` (the proxy or the host of the request).
+        If `use` is False it's not counted as used, e.g. if only its headers are needed."""
+        if self.rotation == STICKY and key is not None:
+            profile = self._bindings.get(key)
+            if profile is None:
+                # the profiles with fewer failures first
+                profile = random.choices(
+                    self.profiles,
+                    weights=[1 / (1 + p.failures) for p in self.profiles],
+                )[0]
+                self._bindings[key] = profile
+        elif self.rotation == ROUND_ROBIN:
+            profile = next(self._cycle)
+        else:
+            profile = random.choice(self.profiles)
+        if use:
+            profile.uses += 1
+        return profile
+
+    def record(self, profile: HeaderProfile, code: int, key: Optional[str] = None):
+        """Update `profile` with the outcome of a request; if it has been flagged, `key` gets a new profile next time."""
+        if code in PROFILE_FAILURE_CODES:
+            profile.failures += 1
+            if key is not None and self._bindings.get(key) is profile:
+                self._bindings.pop(key)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "rotation": self.rotation,
+            "profiles": [profile.get_status() for profile in self.profiles],
+            "bindings": {
+                key: self.profiles.index(profile)
+                for key, profile in self._bindings.items()
+            },
+        }
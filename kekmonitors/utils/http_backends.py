@@ -0,0 +1,352 @@
+import asyncio
+import re
+import socket
+import time
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urljoin, urlparse
+
+import aiohttp
+import aiohttp.abc
+import pycurl
+import tornado.httpclient
+from tornado.httputil import HTTPHeaders
+
+from kekmonitors.utils.dns_cache import DNSCache, is_ip_address
+
+# same defaults used by tornado
+DEFAULTS = {
+    "connect_timeout": 20.0,
+    "request_timeout": 20.0,
+    "follow_redirects": True,
+    "max_redirects": 5,
+}
+
+# status line of any http version (e.g. `HTTP/1.1 200 OK`, `HTTP/2 200`)
+STATUS_LINE = re.compile(r"HTTP/\S+ (\d{3})")
+
+
+class HTTPBackend(object):
+    """Interface of the http clients used by NetworkUtils.\n
+    `fetch` must accept the same arguments as tornado's `AsyncHTTPClient.fetch` and behave the same way:
+    it returns a `tornado.httpclient.HTTPResponse` and raises a `tornado.httpclient.HTTPClientError` with code 599
+    if the request couldn't be completed (e.g. timeouts, connection errors).\n
+    If `dns_cache` is provided, hosts are resolved through it instead of the resolver of the client."""
+
+    name = ""
+
+    def __init__(self, max_clients: int = 10, dns_cache: Optional[DNSCache] = None):
+        self.max_clients = max_clients
+        self.dns_cache = dns_cache
+        # wether the backend can decode brotli-compressed responses
+        self.has_brotli = False
+
+    async def fetch(
+        self, url: str, raise_error: bool = True, **kwargs
+    ) -> tornado.httpclient.HTTPResponse:
+        raise NotImplementedError
+
+    async def stream(
+        self, url: str, callback: Callable[[bytes], bool], **kwargs
+    ) -> tornado.httpclient.HTTPResponse:
+        """Like `fetch` (with `raise_error=False`), but the body is passed to `callback` chunk by chunk instead of being buffered,
+        so the returned response has an empty body.\n
+        If `callback` returns True the transfer is aborted and the response is returned anyway, with its `aborted` attribute set to True.
+        The bodies of error responses (code >= 400) are not passed to `callback` and their transfer is aborted as well."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class CurlBackend(HTTPBackend):
+    """Backend using tornado's `CurlAsyncHTTPClient`. Needs a working libcurl, possibly with brotli and async DNS support."""
+
+    name = "curl"
+
+    def __init__(self, max_clients: int = 10, dns_cache: Optional[DNSCache] = None):
+        super().__init__(max_clients, dns_cache)
+        tornado.httpclient.AsyncHTTPClient.configure(
+            "tornado.curl_httpclient.CurlAsyncHTTPClient", max_clients=max_clients
+        )
+        self.client = tornado.httpclient.AsyncHTTPClient()
+        for feature in pycurl.version.split(" "):
+            if feature.find("brotli") != -1:
+                self.has_brotli = True
+                break
+
+    async def fetch(
+        self, url: str, raise_error: bool = True, **kwargs
+    ) -> tornado.httpclient.HTTPResponse:
+        if self.dns_cache is not None:
+            await self._add_resolve(url, kwargs)
+        return await self.client.fetch(url, raise_error=raise_error, **kwargs)
+
+    async def _add_resolve(self, url: str, kwargs: Dict[str, Any]):
+        """Resolve the host curl is going to connect to (the proxy, if any) with the dns cache
+        and pass its addresses to curl with CURLOPT_RESOLVE."""
+        if kwargs.get("proxy_host"):
+            host, port = kwargs["proxy_host"], kwargs["proxy_port"]
+        else:
+            parsed = urlparse(url)
+            host = parsed.hostname or ""
+            port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        resolve = []  # type: List[str]
+        if host and not is_ip_address(host):
+            try:
+                addresses = await self.dns_cache.resolve(host)
+                resolve = [f"{host}:{port}:{','.join(addresses)}"]
+            except OSError:
+                # let curl try by itself
+                pass
+        prepare_curl_callback = kwargs.get("prepare_curl_callback")
+
+        def prepare(curl: pycurl.Curl):
+            # curl handles are reused: always overwrite the entries set by the previous request
+            curl.setopt(pycurl.RESOLVE, resolve)
+            if prepare_curl_callback:
+                prepare_curl_callback(curl)
+
+        kwargs["prepare_curl_callback"] = prepare
+
+    async def stream(
+        self, url: str, callback: Callable[[bytes], bool], **kwargs
+    ) -> tornado.httpclient.HTTPResponse:
+        state = {
+            "code": None,
+            "effective_url": url,
+            "aborted": False,
+        }  # type: Dict[str, Any]
+        headers = HTTPHeaders()
+        prepare_curl_callback = kwargs.pop("prepare_curl_callback", None)
+
+        def header(header_line: bytes):
+            # like tornado's, which can't be kept since there's no way to chain it
+            # (and curl.getinfo can't be used while the transfer is running)
+            line = header_line.decode("latin1").rstrip()
+            status = STATUS_LINE.match(line)
+            if status:
+                if state["code"] in (301, 302, 303, 307, 308) and "Location" in headers:
+                    state["effective_url"] = urljoin(
+                        state["effective_url"], headers["Location"]
+                    )
+                headers.clear()
+                state["code"] = int(status.group(1))
+            elif line:
+                headers.parse_line(line)
+
+        def write(chunk: bytes) -> Optional[int]:
+            # without a status line the code is unknown: let the callback decide
+            if (state["code"] or 0) >= 400 or callback(chunk):
+                state["aborted"] = True
+                # writing less than we were given makes curl abort the transfer
+                return 0
+            return None
+
+        def prepare(curl: pycurl.Curl):
+            # replace the functions set by tornado to fill the response
+            curl.setopt(pycurl.HEADERFUNCTION, header)
+            curl.setopt(pycurl.WRITEFUNCTION, write)
+            if prepare_curl_callback:
+                prepare_curl_callback(curl)
+
+        kwargs.pop("raise_error", None)
+        start_time = time.time()
+        start = time.monotonic()
+        try:
+            response = await self.fetch(
+                url, raise_error=False, prepare_curl_callback=prepare, **kwargs
+            )
+        except tornado.httpclient.HTTPClientError:
+            # aborting the transfer makes it fail
+            if not state["aborted"]:
+                raise
+            response = tornado.httpclient.HTTPResponse(
+                tornado.httpclient.HTTPRequest(url, **kwargs),
+                state["code"],
+                buffer=BytesIO(),
+                effective_url=state["effective_url"],
+                request_time=time.monotonic() - start,
+                start_time=start_time,
+            )
+        response.headers = headers
+        response.aborted = state["aborted"]
+        return response
+
+
+class AiohttpBackend(HTTPBackend):
+    """Backend using an `aiohttp.ClientSession`, which doesn't need libcurl.
+    Cookies are not kept between requests, like with curl."""
+
+    name = "aiohttp"
+
+    def __init__(self, max_clients: int = 10, dns_cache: Optional[DNSCache] = None):
+        super().__init__(max_clients, dns_cache)
+        # the session must be created inside the event loop
+        self._session = None  # type: Optional[aiohttp.ClientSession]
+        try:
+            import brotli  # noqa: F401
+
+            self.has_brotli = True
+        except ImportError:
+            self.has_brotli = False
+
+    def get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            if self.dns_cache is not None:
+                connector = aiohttp.TCPConnector(
+                    limit=self.max_clients,
+                    resolver=CachedResolver(self.dns_cache),
+                    use_dns_cache=False,
+                )
+            else:
+                connector = aiohttp.TCPConnector(limit=self.max_clients)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                cookie_jar=aiohttp.DummyCookieJar(),
+                auto_decompress=True,
+            )
+        return self._session
+
+    async def fetch(
+        self, url: str, raise_error: bool = True, **kwargs
+    ) -> tornado.httpclient.HTTPResponse:
+        response = await self._request(url, None, **kwargs)
+        if raise_error and response.error:
+            raise response.error
+        return response
+
+    async def stream(
+        self, url: str, callback: Callable[[bytes], bool], **kwargs
+    ) -> tornado.httpclient.HTTPResponse:
+        kwargs.pop("raise_error", None)
+        return await self._request(url, callback, **kwargs)
+
+    async def _request(
+        self, url: str, callback: Optional[Callable[[bytes], bool]], **kwargs
+    ) -> tornado.httpclient.HTTPResponse:
+        """Make the request, reading the whole body or, if `callback` is set, streaming it to `callback`."""
+        # let tornado validate the arguments and fill the headers (if_modified_since, user_agent...)
+        request = tornado.httpclient.HTTPRequest(url, **kwargs)
+        request.headers = HTTPHeaders(request.headers)
+        if request.streaming_callback or request.header_callback:
+            raise ValueError(
+                "streaming_callback and header_callback are not supported by the aiohttp backend"
+            )
+        proxy = None
+        proxy_auth = None
+        if request.proxy_host:
+            proxy = f"http://{request.proxy_host}:{request.proxy_port}"
+            if request.proxy_username:
+                proxy_auth = aiohttp.BasicAuth(
+                    request.proxy_username, request.proxy_password or ""
+                )
+        auth = None
+        if request.auth_username:
+            auth = aiohttp.BasicAuth(request.auth_username, request.auth_password or "")
+        if request.user_agent:
+            request.headers["User-Agent"] = request.user_agent
+        follow_redirects = (
+            request.follow_redirects
+            if request.follow_redirects is not None
+            else DEFAULTS["follow_redirects"]
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=request.request_timeout or DEFAULTS["request_timeout"],
+            connect=request.connect_timeout or DEFAULTS["connect_timeout"],
+        )
+
+        start_time = time.time()
+        start = time.monotonic()
+        try:
+            async with self.get_session().request(
+                request.method,
+                url,
+                headers=list(request.headers.get_all()),
+                data=request.body,
+                allow_redirects=follow_redirects,
+                max_redirects=request.max_redirects or DEFAULTS["max_redirects"],
+                proxy=proxy,
+                proxy_auth=proxy_auth,
+                auth=auth,
+                ssl=request.validate_cert is not False,
+                timeout=timeout,
+            ) as resp:
+                aborted = False
+                if callback is None:
+                    body = await resp.read()
+                else:
+                    body = b""
+                    if resp.status >= 400:
+                        aborted = True
+                    else:
+                        async for chunk in resp.content.iter_chunked(65536):
+                            if callback(chunk):
+                                # leaving the context manager closes the connection
+                                aborted = True
+                                break
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise tornado.httpclient.HTTPClientError(
+                599, f"{type(e).__name__}: {e}"
+            ) from e
+
+        headers = HTTPHeaders()
+        for key, value in resp.headers.items():
+            headers.add(key, value)
+        response = tornado.httpclient.HTTPResponse(
+            request,
+            resp.status,
+            reason=resp.reason,
+            headers=headers,
+            buffer=BytesIO(body),
+            effective_url=str(resp.url),
+            request_time=time.monotonic() - start,
+            start_time=start_time,
+        )
+        if callback is not None:
+            response.aborted = aborted
+        return response
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+class CachedResolver(aiohttp.abc.AbstractResolver):
+    """aiohttp resolver using a `DNSCache`."""
+
+    def __init__(self, dns_cache: DNSCache):
+        self.dns_cache = dns_cache
+
+    async def resolve(
+        self, host: str, port: int = 0, family: int = socket.AF_INET
+    ) -> List[Dict[str, Any]]:
+        addresses = await self.dns_cache.resolve(host)
+        return [
+            {
+                "hostname": host,
+                "host": address,
+                "port": port,
+                "family": socket.AF_INET,
+                "proto": 0,
+                "flags": socket.AI_NUMERICHOST,
+            }
+            for address in addresses
+        ]
+
+    async def close(self):
+        pass
+
+
+BACKENDS = {backend.name: backend for backend in (CurlBackend, AiohttpBackend)}
+
+
+def get_backend(
+    name: str, max_clients: int = 10, dns_cache: Optional[DNSCache] = None
+) -> HTTPBackend:
+    """Return a new instance of the backend called `name` (`curl` or `aiohttp`), resolving hosts with `dns_cache` if provided."""
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown http backend: {name} (available: {', '.join(BACKENDS)})"
+        )
+    return BACKENDS[name](max_clients, dns_cache)
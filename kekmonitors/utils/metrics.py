@@ -0,0 +1,241 @@
+import bisect
+from typing import Any, Dict, Iterable, List, Optional
+
+# upper bounds (in seconds) of the buckets of the latency histograms
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)  # type: tuple
+
+
+class Histogram(object):
+    """Histogram with fixed buckets, cheap to update and easy to merge across processes.
+    Percentiles are estimated with the upper bound of the bucket they fall in."""
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.buckets = list(buckets)
+        # the last one is for values over the last bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def get_percentile(self, percentile: float) -> Optional[float]:
+        return get_histogram_percentile(self.get_status(), percentile)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "buckets": self.buckets,
+            "counts": self.counts,
+            "count": self.count,
+            "sum": self.sum,
+        }
+
+
+def get_histogram_percentile(
+    histogram: Dict[str, Any], percentile: float
+) -> Optional[float]:
+    """Estimate the given percentile (0-1) of a histogram returned by `Histogram.get_status` (or `merge_histograms`).
+    Returns None if the histogram is empty and the last bound if the percentile is over it."""
+    if not histogram["count"]:
+        return None
+    target = percentile * histogram["count"]
+    seen = 0
+    for bound, count in zip(histogram["buckets"], histogram["counts"]):
+        seen += count
+        if seen >= target:
+            return bound
+    return histogram["buckets"][-1]
+
+
+def merge_histograms(histograms: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sum histograms with the same buckets."""
+    merged = {
+        "buckets": histograms[0]["buckets"],
+        "counts": [0] * len(histograms[0]["counts"]),
+        "count": 0,
+        "sum": 0.0,
+    }  # type: Dict[str, Any]
+    for histogram in histograms:
+        merged["counts"] = [
+            a + b for a, b in zip(merged["counts"], histogram["counts"])
+        ]
+        merged["count"] += histogram["count"]
+        merged["sum"] += histogram["sum"]
+    return merged
+
+
+class HostMetrics(object):
+    """Counters and latency histograms of the requests made to a single host.\n
+    The latency of every request is split in the time spent waiting in queue (for the concurrency limit and
+    for a free connection of the http client) and the time spent on the wire."""
+
+    COUNTERS = (
+        "requests",
+        "bytes_in",
+        "not_modified",
+        "unchanged",
+        "retries",
+        "timeouts",
+        "hedges",
+        "aborted",
+    )
+    HISTOGRAMS = ("latency", "queue_time", "wire_time")
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes_in = 0
+        # 304 responses
+        self.not_modified = 0
+        # 200 responses with the same body as the last one
+        self.unchanged = 0
+        self.retries = 0
+        # 599, which also counts connection errors
+        self.timeouts = 0
+        self.hedges = 0
+        # streamed transfers aborted on purpose
+        self.aborted = 0
+        self.codes = {}  # type: Dict[str, int]
+        self.latency = Histogram()
+        self.queue_time = Histogram()
+        self.wire_time = Histogram()
+
+    def record_response(
+        self, code: int, bytes_in: int, queue_time: float, wire_time: float
+    ):
+        self.requests += 1
+        self.codes[str(code)] = self.codes.get(str(code), 0) + 1
+        self.bytes_in += bytes_in
+        if code == 304:
+            self.not_modified += 1
+        elif code == 599:
+            self.timeouts += 1
+        self.latency.observe(queue_time + wire_time)
+        self.queue_time.observe(queue_time)
+        self.wire_time.observe(wire_time)
+
+    def get_status(self) -> Dict[str, Any]:
+        status = {
+            counter: getattr(self, counter) for counter in self.COUNTERS
+        }  # type: Dict[str, Any]
+        status["codes"] = dict(self.codes)
+        for histogram in self.HISTOGRAMS:
+            status[histogram] = getattr(self, histogram).get_status()
+        add_summary(status)
+        return status
+
+
+def add_summary(status: Dict[str, Any]):
+    """Add ratios and percentiles to the status of a `HostMetrics` (or of merged ones), to make it easier to read."""
+    requests = status["requests"]
+    status["not_modified_ratio"] = (
+        status["not_modified"] / requests if requests else None
+    )
+    status["timeout_ratio"] = status["timeouts"] / requests if requests else None
+    for histogram in HostMetrics.HISTOGRAMS:
+        for percentile in (50, 95, 99):
+            status[f"{histogram}_p{percentile}"] = get_histogram_percentile(
+                status[histogram], percentile / 100
+            )
+
+
+def merge_metrics(
+    metrics: List[Dict[str, Dict[str, Any]]]
+) -> Dict[str, Dict[str, Any]]:
+    """Merge the metrics of different processes (dicts of host -> `HostMetrics.get_status()`), host by host."""
+    by_host = {}  # type: Dict[str, List[Dict[str, Any]]]
+    for process_metrics in metrics:
+        for host, status in process_metrics.items():
+            by_host.setdefault(host, []).append(status)
+    merged = {}  # type: Dict[str, Dict[str, Any]]
+    for host, statuses in by_host.items():
+        host_merged = {
+            counter: sum(status[counter] for status in statuses)
+            for counter in HostMetrics.COUNTERS
+        }  # type: Dict[str, Any]
+        codes = {}  # type: Dict[str, int]
+        for status in statuses:
+            for code, count in status["codes"].items():
+                codes[code] = codes.get(code, 0) + count
+        host_merged["codes"] = codes
+        for histogram in HostMetrics.HISTOGRAMS:
+            host_merged[histogram] = merge_histograms(
+                [status[histogram] for status in statuses]
+            )
+        add_summary(host_merged)
+        merged[host] = host_merged
+    return merged
+
+
+# stages of an alert, in order: response received, shoe parsed (shoe_check called), checked against the db,
+# queued in the webhook manager, posted to discord, acknowledged by discord
+ALERT_STAGES = ("fetch", "parse", "diff", "queue", "send", "ack")
+
+
+class AlertMetrics(object):
+    """Latency histograms of the alerts of a monitor/scraper: one for the time spent to reach every stage from
+    the previous one and `total`, from the first stage known (the response, if possible) to discord's ack."""
+
+    HISTOGRAMS = ALERT_STAGES[1:] + ("total",)
+
+    def __init__(self):
+        self.alerts = 0
+        for histogram in self.HISTOGRAMS:
+            setattr(self, histogram, Histogram())
+
+    def record(self, timings: Dict[str, float]):
+        """Record an alert, given the (unix) time at which it reached every stage. Missing stages are skipped."""
+        self.alerts += 1
+        previous = None  # type: Optional[float]
+        for stage in ALERT_STAGES:
+            if stage not in timings:
+                continue
+            if previous is not None:
+                getattr(self, stage).observe(max(0.0, timings[stage] - previous))
+            previous = timings[stage]
+        first = next(
+            (timings[stage] for stage in ALERT_STAGES if stage in timings), None
+        )
+        if first is not None and "ack" in timings:
+            self.total.observe(max(0.0, timings["ack"] - first))
+
+    def get_status(self) -> Dict[str, Any]:
+        status = {"alerts": self.alerts}  # type: Dict[str, Any]
+        for histogram in self.HISTOGRAMS:
+            status[histogram] = getattr(self, histogram).get_status()
+        add_alert_summary(status)
+        return status
+
+
+def add_alert_summary(status: Dict[str, Any]):
+    """Add percentiles to the status of an `AlertMetrics` (or of merged ones)."""
+    for histogram in AlertMetrics.HISTOGRAMS:
+        for percentile in (50, 95, 99):
+            status[f"{histogram}_p{percentile}"] = get_histogram_percentile(
+                status[histogram], percentile / 100
+            )
+
+
+def merge_alert_metrics(metrics: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge statuses of `AlertMetrics` (e.g. the ones recorded by a monitor and by the MonitorManager for it)."""
+    merged = {
+        "alerts": sum(status["alerts"] for status in metrics)
+    }  # type: Dict[str, Any]
+    for histogram in AlertMetrics.HISTOGRAMS:
+        merged[histogram] = merge_histograms([status[histogram] for status in metrics])
+    add_alert_summary(merged)
+    return merged
@@ -1,22 +1,70 @@
 import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import deque
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlparse
 
-import pycurl
 import tornado.httpclient
-from tornado.curl_httpclient import CurlError
 
-from kekmonitors.config import LogConfig
-from kekmonitors.utils.tools import get_logger
+from kekmonitors.comms.msg import Cmd, Response, badResponse, okResponse
+from kekmonitors.config import COMMANDS, ERRORS, Config, LogConfig
+from kekmonitors.utils.browser_pool import BrowserPool
+from kekmonitors.utils.concurrency import AIMDLimiter
+from kekmonitors.utils.dns_cache import DNSCache
+from kekmonitors.utils.header_profiles import DEFAULT_PROFILES, HeaderProfilePool
+from kekmonitors.utils.http_backends import HTTPBackend, get_backend
+from kekmonitors.utils.metrics import HostMetrics
+from kekmonitors.utils.proxy_pool import Proxy, ProxyPool
+from kekmonitors.utils.rate_limit import SharedTokenBucket, TokenBucket
+from kekmonitors.utils.replay import RecordingBackend, ReplayBackend
+from kekmonitors.utils.retry import CircuitBreaker, RetryPolicy
+from kekmonitors.utils.session_store import SessionStore
+from kekmonitors.utils.stream_parser import StreamParser
+from kekmonitors.utils.tools import get_logger, make_request
+from kekmonitors.utils.warmup import CANCELLED, DONE, WARMING, Warmup
+
+
+# returned by `NetworkUtils.fetch` instead of unchanged responses if `skip_unchanged` is True
+UNCHANGED = object()
+
+
+def get_host(url: str) -> str:
+    """Return the host of `url` (e.g. `www.example.com` for `https://www.example.com/path`)"""
+    return urlparse(url).netloc
 
 
 class NetworkUtils(object):
-    def __init__(self, logger_name: str):
+    def __init__(self, logger_name: str, config: Config = None):
+        if not config:
+            config = Config()
+        network_config = config["NetworkConfig"]
         self.asyncio_loop = asyncio.get_event_loop()
-        tornado.httpclient.AsyncHTTPClient.configure(
-            "tornado.curl_httpclient.CurlAsyncHTTPClient"
-        )
-        self.client = tornado.httpclient.AsyncHTTPClient()
+        self.dns_cache = None  # type: Optional[DNSCache]
+        if network_config["dns_cache"] == "True":
+            self.dns_cache = DNSCache(
+                float(network_config["dns_min_ttl"]),
+                float(network_config["dns_max_ttl"]),
+            )
+        # the http client, with the same interface of tornado's AsyncHTTPClient
+        if network_config["replay_path"]:
+            self.client = ReplayBackend(
+                network_config["replay_path"],
+                network_config["replay_timing"] == "True",
+            )  # type: HTTPBackend
+        else:
+            self.client = get_backend(
+                network_config["http_backend"],
+                int(network_config["max_clients"]),
+                self.dns_cache,
+            )
+            if network_config["record_path"]:
+                self.client = RecordingBackend(
+                    self.client, network_config["record_path"]
+                )
         self._last_modified_datetimes = {}  # type: Dict[str, datetime]
         # force a cache refresh after self.cache_timeout
         self.cache_timeout = 10 * 60
@@ -24,18 +72,510 @@ class NetworkUtils(object):
         self._cached_pages = {}  # type: Dict[str, str]
         # remember etags, sometimes some websites use them
         self._etags = {}  # type: Dict[str, str]
+        # digest of the last body received for every url, to detect unchanged pages
+        self._digests = {}  # type: Dict[str, bytes]
 
-        for feature in pycurl.version.split(" "):
-            if feature.find("brotli") != -1:
-                self._has_brotli = True
-                break
-        else:
-            self._has_brotli = False
+        self.retry_policy = RetryPolicy(
+            float(network_config["retry_max_delay"]),
+            float(network_config["retry_multiplier"]),
+            float(network_config["retry_jitter"]),
+            float(network_config["retry_budget_ratio"]),
+            float(network_config["retry_budget_max"]),
+        )
+        self._circuit_breaker_threshold = int(
+            network_config["circuit_breaker_threshold"]
+        )
+        self._circuit_breaker_timeout = float(network_config["circuit_breaker_timeout"])
+        self._circuit_breakers = {}  # type: Dict[str, CircuitBreaker]
+
+        self.adaptive_concurrency = network_config["adaptive_concurrency"] == "True"
+        self._concurrency_initial = float(network_config["concurrency_initial"])
+        self._concurrency_min = float(network_config["concurrency_min"])
+        self._concurrency_max = float(network_config["concurrency_max"])
+        self._concurrency_latency_factor = float(
+            network_config["concurrency_latency_factor"]
+        )
+        self._concurrency_limiters = {}  # type: Dict[str, AIMDLimiter]
+        self._host_metrics = {}  # type: Dict[str, HostMetrics]
+        # latencies of the last successful requests to every host
+        self._latencies = {}  # type: Dict[str, Deque[float]]
+        self.hedging = network_config["hedging"] == "True"
+        self.hedging_max_ratio = float(network_config["hedging_max_ratio"])
+        self.hedging_min_samples = int(network_config["hedging_min_samples"])
+        self._hedgeable_requests = 0
+        self._hedges = 0
+        self.proxy_pool = ProxyPool(
+            sticky=network_config["sticky_proxies"] == "True",
+            eject_after=int(network_config["proxy_eject_after"]),
+            eject_time=float(network_config["proxy_eject_time"]),
+        )
+
+        self._browser_pool_size = int(network_config["browser_pool_size"])
+        self._browser_max_page_uses = int(network_config["browser_max_page_uses"])
+        self._browser_blocked_resources = [
+            resource.strip()
+            for resource in network_config["browser_blocked_resources"].split(",")
+            if resource.strip()
+        ]
+        # created by start_browser_pool
+        self.browser_pool = None  # type: Optional[BrowserPool]
+
+        # cookies shared by fetch and the browser pool, saved in {config_path}/sessions by default
+        self.session_store = None  # type: Optional[SessionStore]
+        if network_config["sessions"] == "True":
+            sessions_path = network_config["sessions_path"] or os.path.sep.join(
+                (config["GlobalConfig"]["config_path"], "sessions")
+            )
+            self.session_store = SessionStore(
+                os.path.sep.join((sessions_path, f"{logger_name}.json")),
+                float(network_config["session_ttl"]),
+            )
+
+        # token buckets of the hosts (or domains) in `rate_limits` in configs.json
+        self._rate_limits = {}  # type: Dict[str, TokenBucket]
+        # if the MonitorManager is running, tokens are leased from it so that all the processes share the same buckets
+        self.shared_rate_limits = network_config["shared_rate_limits"] == "True"
+        self._rate_limit_lease = int(network_config["rate_limit_lease"])
+        self._monitor_manager_socket = (
+            f"{config['GlobalConfig']['socket_path']}/MonitorManager"
+        )
+
+        # warm-ups scheduled from the config and through ipc
+        self._configured_warmups = []  # type: List[Warmup]
+        self._warmups = []  # type: List[Warmup]
+        self._warmup_tasks = {}  # type: Dict[Warmup, asyncio.Task]
+
+        self._has_brotli = self.client.has_brotli
+
+        # pre-generated browser headers, used by fetch unless a user-agent is passed
+        self.header_profiles = None  # type: Optional[HeaderProfilePool]
+        if network_config["header_profiles"] == "True":
+            self.header_profiles = HeaderProfilePool(
+                rotation=network_config["header_rotation"],
+                has_brotli=self._has_brotli,
+            )
+
+        logconfig = LogConfig(config)
+        logconfig["OtherConfig"]["socket_name"] = f"{logger_name}.NetworkUtils"
+        self.network_logger = get_logger(logconfig)
+        self.network_logger.debug(
+            f"Using {self.client.name} backend, has brotli: {self._has_brotli}"
+        )
+
+    def get_circuit_breaker(self, host: str) -> CircuitBreaker:
+        """Return the circuit breaker for `host`, creating it if needed."""
+        if host not in self._circuit_breakers:
+            self._circuit_breakers[host] = CircuitBreaker(
+                self._circuit_breaker_threshold, self._circuit_breaker_timeout
+            )
+        return self._circuit_breakers[host]
+
+    def get_concurrency_limiter(self, host: str) -> AIMDLimiter:
+        """Return the concurrency limiter for `host`, creating it if needed."""
+        if host not in self._concurrency_limiters:
+            self._concurrency_limiters[host] = AIMDLimiter(
+                self._concurrency_initial,
+                self._concurrency_min,
+                self._concurrency_max,
+                latency_factor=self._concurrency_latency_factor,
+            )
+        return self._concurrency_limiters[host]
+
+    def get_host_metrics(self, host: str) -> HostMetrics:
+        """Return the network metrics of `host`, creating them if needed."""
+        if host not in self._host_metrics:
+            self._host_metrics[host] = HostMetrics()
+        return self._host_metrics[host]
+
+    def set_proxies(self, proxies: List[Union[str, Dict[str, Any]]]):
+        """Replace the proxies used by `fetch`. Every proxy can be a string (`host:port`, `user:password@host:port`)
+        or a dict with `host`, `port` and optionally `username` and `password`."""
+        try:
+            self.proxy_pool.update(proxies)
+            self.network_logger.info(f"Using {len(self.proxy_pool)} proxies")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.network_logger.exception("Invalid proxies, keeping the old ones:")
+
+    def set_header_profiles(self, profiles: List[Dict[str, str]]):
+        """Replace the header profiles used by `fetch` (dicts of headers, each with at least a user-agent);
+        if `profiles` is empty the default ones are used."""
+        if self.header_profiles is None:
+            return
+        try:
+            self.header_profiles.update(profiles or DEFAULT_PROFILES)
+        except (ValueError, TypeError, AttributeError):
+            self.network_logger.exception(
+                "Invalid header profiles, keeping the old ones:"
+            )
+
+    def get_profile_headers(self, url: str) -> Dict[str, str]:
+        """Return the headers of the profile bound to the host of `url` (the same sent by `fetch` without proxies),
+        e.g. to be used in the browser pool with `page.setExtraHTTPHeaders`. Empty if header profiles are disabled."""
+        if self.header_profiles is None:
+            return {}
+        return self.header_profiles.get_profile(get_host(url), use=False).get_headers()
+
+    def set_rate_limits(self, rate_limits: Dict[str, Union[float, Dict[str, float]]]):
+        """Replace the rate limits used by `fetch`: a dict of host (which also covers its subdomains) to requests per second,
+        or to a dict with `rate` and optionally `burst` (how many requests can be made at once, default 1)."""
+        try:
+            new_limits = {}  # type: Dict[str, Tuple[float, float]]
+            for host, limit in rate_limits.items():
+                if isinstance(limit, dict):
+                    new_limits[host.lower()] = (
+                        float(limit["rate"]),
+                        float(limit.get("burst", 1)),
+                    )
+                else:
+                    new_limits[host.lower()] = (float(limit), 1.0)
+                if new_limits[host.lower()][0] <= 0:
+                    raise ValueError(f"The rate of {host} must be positive")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.network_logger.exception("Invalid rate limits, keeping the old ones:")
+            return
+        for host in list(self._rate_limits):
+            if host not in new_limits:
+                self._rate_limits.pop(host)
+        for host, (rate, burst) in new_limits.items():
+            if host in self._rate_limits:
+                self._rate_limits[host].set_rate(rate, burst)
+            elif self.shared_rate_limits:
+                self._rate_limits[host] = SharedTokenBucket(
+                    rate, burst, self._get_token_lease(host), self._rate_limit_lease
+                )
+            else:
+                self._rate_limits[host] = TokenBucket(rate, burst)
+        if new_limits:
+            self.network_logger.info(f"Using rate limits: {new_limits}")
+
+    def _get_token_lease(self, host: str):
+        async def lease(tokens: int) -> Optional[Tuple[int, float]]:
+            bucket = self._rate_limits.get(host)
+            if bucket is None:
+                return None
+            cmd = Cmd()
+            cmd.cmd = COMMANDS.MM_ACQUIRE_TOKENS
+            cmd.payload = {
+                "host": host,
+                "tokens": tokens,
+                "rate": bucket.rate,
+                "burst": bucket.burst,
+            }
+            try:
+                response = await make_request(self._monitor_manager_socket, cmd)
+            except OSError:
+                return None
+            if response.error.value or not isinstance(response.payload, dict):
+                return None
+            return response.payload["granted"], response.payload["wait"]
+
+        return lease
+
+    def get_rate_limiter(self, host: str) -> Optional[TokenBucket]:
+        """Return the token bucket of `host` (or of the nearest of its parent domains), None if it's not rate limited."""
+        host = host.split(":")[0].lower()
+        while host:
+            if host in self._rate_limits:
+                return self._rate_limits[host]
+            host = host.partition(".")[2]
+        return None
+
+    def set_warmups(self, warmups: List[Dict[str, Any]]):
+        """Replace the warm-ups scheduled from the config (see `Warmup.from_config`), leaving the ones scheduled through ipc alone."""
+        try:
+            new_warmups = [Warmup.from_config(warmup) for warmup in warmups]
+        except (ValueError, KeyError, TypeError):
+            self.network_logger.exception("Invalid warm-ups, keeping the old ones:")
+            return
+        for warmup in self._configured_warmups:
+            self.cancel_warmup(warmup)
+        self._configured_warmups = [
+            warmup for warmup in new_warmups if self.schedule_warmup(warmup)
+        ]
+
+    def schedule_warmup(self, warmup: Warmup) -> bool:
+        """Schedule `warmup`, returning False if its window is already over."""
+        if warmup.is_expired():
+            self.network_logger.warning(
+                f"Not scheduling warm-up of {warmup.urls}, its window is already over."
+            )
+            return False
+        self._warmups = [w for w in self._warmups if not w.is_expired()]
+        self._warmups.append(warmup)
+        self._warmup_tasks[warmup] = self.asyncio_loop.create_task(
+            self._run_warmup(warmup)
+        )
+        self.network_logger.info(
+            f"Scheduled warm-up of {warmup.urls} at {warmup.get_status()['at']}"
+        )
+        return True
+
+    def cancel_warmup(self, warmup: Warmup):
+        task = self._warmup_tasks.pop(warmup, None)
+        if task and not task.done():
+            task.cancel()
+        if warmup in self._warmups:
+            self._warmups.remove(warmup)
+
+    async def _run_warmup(self, warmup: Warmup):
+        try:
+            await asyncio.sleep(max(0, warmup.get_start() - time.time()))
+            warmup.state = WARMING
+            self.network_logger.info(f"Warming up connections to {warmup.urls}")
+            if self.dns_cache is not None:
+                await self.dns_cache.prefetch(
+                    [urlparse(url).hostname or "" for url in warmup.urls]
+                )
+            while time.time() < warmup.get_end():
+                await self.warm_up(warmup.urls, warmup.connections)
+                await asyncio.sleep(
+                    max(0, min(warmup.interval, warmup.get_end() - time.time()))
+                )
+            warmup.state = DONE
+            self.network_logger.info(f"Warm-up of {warmup.urls} is over")
+        except asyncio.CancelledError:
+            warmup.state = CANCELLED
+            raise
+        finally:
+            self._warmup_tasks.pop(warmup, None)
+
+    async def warm_up(self, urls: List[str], connections: int = 1):
+        """Open (or keep alive) `connections` keep-alive connections to every url, resolving its host,
+        by sending HEAD requests through the proxy `fetch` would use (if sticky proxies are enabled).\n
+        Errors are ignored and the requests don't count for circuit breakers, concurrency limits and latencies."""
+        requests = []
+        targets = []  # type: List[str]
+        for url in urls:
+            kwargs = {
+                "method": "HEAD",
+                "raise_error": False,
+                "request_timeout": 10,
+            }  # type: Dict[str, Any]
+            if self.proxy_pool:
+                proxy = self.proxy_pool.get_proxy(get_host(url))
+                if proxy:
+                    kwargs.update(proxy.get_fetch_kwargs())
+            for _ in range(connections):
+                requests.append(self.client.fetch(url, **kwargs))
+                targets.append(url)
+        responses = await asyncio.gather(*requests, return_exceptions=True)
+        for url, response in zip(targets, responses):
+            if isinstance(response, Exception) or response.code == 599:
+                self.network_logger.debug(f"Couldn't warm up connection to {url}")
+
+    async def start_browser_pool(self, **launch_options) -> BrowserPool:
+        """Launch a headless browser (pyppeteer must be installed) and return a pool of its pages, configured in `[NetworkConfig]`.
+        `launch_options` are passed to `pyppeteer.launch`. The browser is closed when the monitor/scraper shuts down."""
+        self.browser_pool = BrowserPool(
+            self._browser_pool_size,
+            launch_options,
+            self._browser_blocked_resources,
+            self._browser_max_page_uses,
+            logger=self.network_logger,
+            session_store=self.session_store,
+        )
+        await self.browser_pool.start()
+        return self.browser_pool
+
+    async def close_network(self):
+        """Cancel the warm-ups, close the http client and the browser pool and save the session cookies."""
+        for warmup in list(self._warmup_tasks):
+            self.cancel_warmup(warmup)
+        if self.browser_pool is not None:
+            await self.browser_pool.close()
+        if self.session_store is not None:
+            self.session_store.save()
+        await self.client.close()
+        if self.dns_cache is not None:
+            self.dns_cache.close()
+
+    def get_latency_percentile(self, host: str, percentile: float) -> Optional[float]:
+        """Return the given percentile (0-1) of the latency of the last successful requests to `host`,
+        or None if there aren't enough of them."""
+        latencies = self._latencies.get(host)
+        if not latencies or len(latencies) < self.hedging_min_samples:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+    async def _fetch_once(
+        self,
+        url: str,
+        *args,
+        proxy: Optional[Proxy] = None,
+        callback: Optional[Callable[[bytes], bool]] = None,
+        use_session: bool = True,
+        started: Optional[asyncio.Event] = None,
+        **kwargs,
+    ) -> tornado.httpclient.HTTPResponse:
+        """Make a single request with the tornado client, through `proxy` if provided, respecting the rate limit and the concurrency limit of the host.
+        If `callback` is provided the body is streamed to it (see `HTTPBackend.stream`).
+        If `use_session` is True the cookies of the host in `self.session_store` are sent, and the ones received are saved there.
+        If `started` is provided it's set once the limiters have been acquired and the request is being sent."""
+        host = get_host(url)
+        metrics = self.get_host_metrics(host)
+        if proxy:
+            kwargs.update(proxy.get_fetch_kwargs())
+        profile = None
+        profile_key = str(proxy) if proxy else host
+        headers = kwargs.get("headers") or {}
+        if self.header_profiles is not None and not any(
+            key.lower() == "user-agent" for key in headers
+        ):
+            # bound to the proxy (or the host), so that the fingerprint stays the same
+            profile = self.header_profiles.get_profile(profile_key)
+            kwargs["headers"] = {**profile.headers, **headers}
+        use_session = use_session and self.session_store is not None
+        if use_session:
+            self._add_session_cookies(url, kwargs)
+        queued = time.monotonic()
+        rate_limiter = self.get_rate_limiter(host)
+        if rate_limiter:
+            await rate_limiter.acquire()
+        limiter = None
+        if self.adaptive_concurrency:
+            limiter = self.get_concurrency_limiter(host)
+            await limiter.acquire()
+        code = 599  # type: Optional[int]
+        bytes_in = 0
+        # time spent waiting for a free connection of the client
+        client_queue_time = 0.0
+        if callback is not None:
+            stream_callback = callback
+
+            def callback(chunk: bytes) -> bool:
+                nonlocal bytes_in
+                bytes_in += len(chunk)
+                return stream_callback(chunk)
+
+        start = time.monotonic()
+        if started is not None:
+            started.set()
+        try:
+            if callback is not None:
+                response = await self.client.stream(url, callback, *args, **kwargs)
+                if response.aborted:
+                    metrics.aborted += 1
+            else:
+                response = await self.client.fetch(url, *args, **kwargs)
+                bytes_in = len(response.body or b"")
+            code = response.code
+            # unix time at which the response has been received, where the latency of the alerts starts
+            response.fetched_at = time.time()
+            if response.time_info:
+                client_queue_time = response.time_info.get("queue", 0.0)
+            if use_session:
+                self.session_store.update_from_headers(
+                    host, response.headers.get_list("Set-Cookie")
+                )
+            return response
+        except asyncio.CancelledError:
+            # not the host's nor the proxy's fault
+            code = None
+            raise
+        finally:
+            latency = time.monotonic() - start
+            if limiter:
+                limiter.release(code, latency)
+            if code is not None:
+                metrics.record_response(
+                    code,
+                    bytes_in,
+                    start - queued + client_queue_time,
+                    latency - client_queue_time,
+                )
+                if proxy:
+                    self.proxy_pool.record(proxy, code, latency)
+                if profile:
+                    self.header_profiles.record(profile, code, profile_key)
+                if code < 500:
+                    if host not in self._latencies:
+                        self._latencies[host] = deque(maxlen=100)
+                    self._latencies[host].append(latency)
+
+    def _fix_headers(self, headers: Dict[str, str]):
+        """Fix some headers possibly set by the caller (e.g. from fake-headers)."""
+        headers["accept-encoding"] = "gzip, deflate"
+        if self._has_brotli:
+            headers["accept-encoding"] += ", br"
+        headers.pop("pragma", None)
+        headers.pop("Pragma", None)
+
+    def _add_session_cookies(self, url: str, kwargs: Dict[str, Any]):
+        """Add the cookies of the session of the host to the headers in `kwargs`, unless a cookie header has been passed explicitly."""
+        headers = kwargs.get("headers") or {}
+        if any(key.lower() == "cookie" for key in headers):
+            return
+        cookie = self.session_store.get_cookie_header(
+            get_host(url), url.startswith("https")
+        )
+        if cookie:
+            # copied, so that the caller's headers don't keep stale cookies
+            kwargs["headers"] = {**headers, "Cookie": cookie}
 
-        config = LogConfig()
-        config["OtherConfig"]["socket_name"] = f"{logger_name}.NetworkUtils"
-        self.network_logger = get_logger(config)
-        self.network_logger.debug(f"Has brotli: {self._has_brotli}")
+    async def _fetch_hedged(
+        self, url: str, *args, proxy: Optional[Proxy] = None, **kwargs
+    ) -> tornado.httpclient.HTTPResponse:
+        """Like `_fetch_once`, but if the request, once sent, takes longer than the 95th percentile of the latency of the host
+        a duplicate request is made (through another proxy, if possible): the first successful response is returned
+        and the other request is cancelled. Hedges are limited to `self.hedging_max_ratio` of the requests."""
+        host = get_host(url)
+        self._hedgeable_requests += 1
+        hedge_after = self.get_latency_percentile(host, 0.95)
+        started = asyncio.Event()
+        tasks = [
+            asyncio.ensure_future(
+                self._fetch_once(url, *args, proxy=proxy, started=started, **kwargs)
+            )
+        ]
+        try:
+            if hedge_after is None:
+                return await tasks[0]
+            # the latencies are measured on the wire: don't count the time spent waiting for the limiters,
+            # a request still queued there would only be queued again by the hedge
+            started_task = asyncio.ensure_future(started.wait())
+            try:
+                await asyncio.wait(
+                    [tasks[0], started_task], return_when=asyncio.FIRST_COMPLETED
+                )
+            finally:
+                started_task.cancel()
+            if tasks[0].done():
+                return tasks[0].result()
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if (
+                done
+                or self._hedges + 1 > self.hedging_max_ratio * self._hedgeable_requests
+            ):
+                return await tasks[0]
+
+            self._hedges += 1
+            self.get_host_metrics(host).hedges += 1
+            hedge_proxy = proxy
+            if proxy:
+                hedge_proxy = self.proxy_pool.get_proxy(host, exclude=[proxy])
+            self.network_logger.debug(
+                f"{url} is taking more than {hedge_after:.3f}s, hedging the request"
+            )
+            tasks.append(
+                asyncio.ensure_future(
+                    self._fetch_once(url, *args, proxy=hedge_proxy, **kwargs)
+                )
+            )
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if not task.exception() and task.result().code != 599:
+                        return task.result()
+            # both failed, return the outcome of the first one
+            return tasks[0].result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
 
     async def fetch(
         self,
@@ -45,16 +585,39 @@ class NetworkUtils(object):
         delay=2,
         retry_on_404=True,
         *args,
+        skip_unchanged=False,
+        use_proxy=True,
+        hedge=None,
+        use_session=True,
         **kwargs,
-    ) -> Optional[tornado.httpclient.HTTPResponse]:
+    ) -> Union[tornado.httpclient.HTTPResponse, None, object]:
         """Asynchronously fetch the url using a tornado client. If you want to fetch more urls at once use asyncio.gather(*tasks).\n
         You can pass arguments to client.fetch() using *args and **kwargs (e.g. if you need proxies you can call self.fetch like this:\n
-        `self.fetch(url, headers=headers, proxy_host={your-proxy-host}, proxy_port={your-proxy-port})`"""
+        `self.fetch(url, headers=headers, proxy_host={your-proxy-host}, proxy_port={your-proxy-port})`\n
+        If no proxy is passed this way and `use_proxy` is True, a proxy is taken from `self.proxy_pool` (see `set_proxies`).\n
+        If `hedge` is True (default: the `hedging` option in `[NetworkConfig]`), slow requests are duplicated, see `_fetch_hedged`.\n
+        If `use_session` is True the cookies in `self.session_store` (e.g. the ones of a challenge solved in the browser pool) are sent
+        and the ones received are saved, unless a `Cookie` header is passed.\n
+        Failed requests are retried up to `attempts` times, waiting an exponentially increasing time starting from `delay` (see `self.retry_policy`);
+        if the host keeps failing its circuit breaker opens and the url is not fetched at all for a while.\n
+        Every returned response has an `unchanged` attribute, True if the body is the same as the last one received for the url (or the code is 304),
+        and a `fetched_at` attribute, the unix time at which it has been received (pass it to `shoe_check`).
+        If `skip_unchanged` is True, `UNCHANGED` is returned instead of unchanged responses, so that you can skip parsing them
+        (None is returned only if the url couldn't be fetched)."""
         total_attempts = attempts
-        headers = kwargs.get("headers", {})
+        headers = kwargs.setdefault("headers", {})
+        self._fix_headers(headers)
         response = None
+        circuit_breaker = self.get_circuit_breaker(get_host(url))
+        retry = 0
+        self.retry_policy.on_request()
         # keep retrying the connection until we run out of attempts
         while attempts > 0:
+            if not circuit_breaker.allow_request():
+                self.network_logger.warning(
+                    f"Circuit breaker for {get_host(url)} is open, not fetching {url}."
+                )
+                break
             try:
                 if_mod_since = None
                 # if using cache and it has expired/timed out
@@ -82,18 +645,21 @@ class NetworkUtils(object):
                         self._cached_pages.pop(url)
                         self._last_modified_datetimes.pop(url)
 
-                # fix some possibly set headers from fake-headers
-                headers["accept-encoding"] = "gzip, deflate"
-                if self._has_brotli:
-                    headers["accept-encoding"] += ", br"
-                headers.pop("pragma", None)
-                headers.pop("Pragma", None)
-
-                self.network_logger.debug(f"Getting {url}...")
-                response = await self.client.fetch(
+                proxy = None
+                if use_proxy and self.proxy_pool and "proxy_host" not in kwargs:
+                    proxy = self.proxy_pool.get_proxy(get_host(url))
+                    self.network_logger.debug(f"Getting {url} through {proxy}...")
+                else:
+                    self.network_logger.debug(f"Getting {url}...")
+                if hedge is None:
+                    hedge = self.hedging
+                fetch_function = self._fetch_hedged if hedge else self._fetch_once
+                response = await fetch_function(
                     url,
                     if_modified_since=if_mod_since,
                     raise_error=False,
+                    proxy=proxy,
+                    use_session=use_session,
                     *args,
                     **kwargs,
                 )
@@ -102,54 +668,243 @@ class NetworkUtils(object):
                     self.network_logger.warning(
                         f"Something happened while fetching {url}: {response.reason}"
                     )
+                    circuit_breaker.record_failure()
                     attempts -= 1
-                    if attempts:
-                        # sleep delay before retrying
-                        await asyncio.sleep(delay)
+                    if attempts and await self._wait_before_retry(url, delay, retry):
+                        retry += 1
                         continue
-                elif response.code == 404:
+                    break
+
+                if response.code >= 500:
+                    circuit_breaker.record_failure()
+                else:
+                    circuit_breaker.record_success()
+
+                if response.code == 404:
                     if retry_on_404:
-                        await asyncio.sleep(delay)
-                        continue
+                        attempts -= 1
+                        if attempts and await self._wait_before_retry(
+                            url, delay, retry
+                        ):
+                            retry += 1
+                            continue
+                        break
                     # usually this is what we want to do
                     self.network_logger.debug("Not retrying on 404.")
+                    response.unchanged = False
                     return response
                 else:
-                    if use_cache:
-                        # if page was cached update it or just return it
-                        if response.code < 400 and response.code != 304:
-                            try:
-                                self._cached_pages[url] = response.body.decode()
-                                self._last_modified_datetimes[url] = datetime.utcnow()
-                                if "etag" in response.headers:
-                                    self._etags[url] = response.headers["etag"]
-                            except UnicodeDecodeError:
-                                self.network_logger.exception(
-                                    "Got UnicodeDecodeError while trying to decode body, be careful:"
-                                )
-                            except:
-                                self.network_logger.exception(
-                                    "Got unhandled exception while trying to decode body:"
-                                )
-                        return response
-                    else:
-                        return response
+                    # if page was cached update it
+                    if use_cache and response.code < 400 and response.code != 304:
+                        try:
+                            self._cached_pages[url] = response.body.decode()
+                            self._last_modified_datetimes[url] = datetime.utcnow()
+                            if "etag" in response.headers:
+                                self._etags[url] = response.headers["etag"]
+                        except UnicodeDecodeError:
+                            self.network_logger.exception(
+                                "Got UnicodeDecodeError while trying to decode body, be careful:"
+                            )
+                        except:
+                            self.network_logger.exception(
+                                "Got unhandled exception while trying to decode body:"
+                            )
+                    response.unchanged = self.is_unchanged(url, response)
+                    if response.unchanged and response.code != 304:
+                        self.get_host_metrics(get_host(url)).unchanged += 1
+                    if skip_unchanged and response.unchanged:
+                        self.network_logger.debug(f"{url} has not changed, skipping.")
+                        return UNCHANGED
+                    return response
+
+            except asyncio.CancelledError:
+                circuit_breaker.record_cancel()
+                raise
 
-            except CurlError:
+            except tornado.httpclient.HTTPClientError:
                 self.network_logger.exception(f"Timed out while fetching {url}.")
+                circuit_breaker.record_failure()
                 attempts -= 1
-                if attempts:
-                    await asyncio.sleep(delay)
+                if attempts and await self._wait_before_retry(url, delay, retry):
+                    retry += 1
                     continue
+                break
 
             except:
                 self.network_logger.exception("Got exception:")
-                await asyncio.sleep(delay)
+                circuit_breaker.record_failure()
                 attempts -= 1
-                if attempts:
-                    await asyncio.sleep(delay)
+                if attempts and await self._wait_before_retry(url, delay, retry):
+                    retry += 1
                     continue
+                break
+
+        self.network_logger.warning(
+            f"Tried {total_attempts - attempts} times out of {total_attempts} but couldn't fetch {url}."
+        )
+        if response is not None:
+            response.unchanged = False
 
-        self.network_logger.warning(f"Tried {total_attempts} but couldn't fetch {url}.")
+        return response
 
+    async def fetch_stream(
+        self,
+        url: str,
+        parser: StreamParser,
+        attempts=3,
+        delay=2,
+        *args,
+        use_proxy=True,
+        use_session=True,
+        **kwargs,
+    ) -> Optional[tornado.httpclient.HTTPResponse]:
+        """Fetch the url like `fetch`, but pass the body to `parser` chunk by chunk as it's received instead of buffering it
+        (see `StreamParser` and `TagExtractor`): as soon as the parser has found what it needs the transfer is aborted,
+        saving bandwidth and time. The returned response has an empty body and the `aborted` attribute set to True if the transfer
+        has been aborted; error responses are not passed to the parser.\n
+        Requests are retried like in `fetch`, but only if the parser hasn't received anything yet;
+        responses are not cached and requests are never hedged."""
+        total_attempts = attempts
+        self._fix_headers(kwargs.setdefault("headers", {}))
+        circuit_breaker = self.get_circuit_breaker(get_host(url))
+        retry = 0
+        response = None
+        self.retry_policy.on_request()
+        while attempts > 0:
+            if not circuit_breaker.allow_request():
+                self.network_logger.warning(
+                    f"Circuit breaker for {get_host(url)} is open, not fetching {url}."
+                )
+                return None
+            proxy = None
+            if use_proxy and self.proxy_pool and "proxy_host" not in kwargs:
+                proxy = self.proxy_pool.get_proxy(get_host(url))
+            self.network_logger.debug(f"Streaming {url}...")
+            try:
+                response = await self._fetch_once(
+                    url,
+                    *args,
+                    proxy=proxy,
+                    callback=parser.feed,
+                    use_session=use_session,
+                    **kwargs,
+                )
+            except asyncio.CancelledError:
+                circuit_breaker.record_cancel()
+                raise
+            except:
+                self.network_logger.exception(f"Got exception while streaming {url}:")
+                response = None
+            if response is not None and response.code < 500:
+                circuit_breaker.record_success()
+                self.network_logger.info(
+                    f"Got {url} with code {response.code} ({parser.bytes_received} bytes{', aborted' if response.aborted else ''})"
+                )
+                if not response.aborted:
+                    parser.close()
+                return response
+            circuit_breaker.record_failure()
+            if parser.bytes_received:
+                # the parser can't start over
+                break
+            attempts -= 1
+            if not attempts or not await self._wait_before_retry(url, delay, retry):
+                break
+            retry += 1
+        self.network_logger.warning(
+            f"Tried {total_attempts - attempts} times out of {total_attempts} but couldn't stream {url}."
+        )
         return response
+
+    async def _wait_before_retry(self, url: str, delay: float, retry: int) -> bool:
+        """Wait before retrying to fetch `url` according to the retry policy. Return False if the retry budget is exhausted."""
+        if not self.retry_policy.can_retry():
+            self.network_logger.warning(f"Retry budget exhausted, not retrying {url}.")
+            return False
+        self.get_host_metrics(get_host(url)).retries += 1
+        await asyncio.sleep(self.retry_policy.get_delay(delay, retry))
+        return True
+
+    async def on_get_circuit_breakers(self, cmd: Cmd) -> Response:
+        r = okResponse()
+        r.payload = {
+            "circuit_breakers": {
+                host: breaker.get_status()
+                for host, breaker in self._circuit_breakers.items()
+            },
+            "retry_policy": self.retry_policy.get_status(),
+        }
+        return r
+
+    async def on_get_concurrency(self, cmd: Cmd) -> Response:
+        r = okResponse()
+        r.payload = {
+            host: limiter.get_status()
+            for host, limiter in self._concurrency_limiters.items()
+        }
+        return r
+
+    async def on_get_proxies(self, cmd: Cmd) -> Response:
+        r = okResponse()
+        r.payload = self.proxy_pool.get_status()
+        return r
+
+    async def on_get_network_metrics(self, cmd: Cmd) -> Response:
+        r = okResponse()
+        r.payload = {
+            host: metrics.get_status() for host, metrics in self._host_metrics.items()
+        }
+        return r
+
+    async def on_get_dns_stats(self, cmd: Cmd) -> Response:
+        r = okResponse()
+        r.payload = self.dns_cache.get_status() if self.dns_cache is not None else {}
+        return r
+
+    async def on_schedule_warmup(self, cmd: Cmd) -> Response:
+        """Schedule the warm-up in the payload, a dict (or its json) like the ones in `warmups` in configs.json."""
+        payload = cmd.payload
+        try:
+            if isinstance(payload, str):
+                payload = json.loads(payload)
+            warmup = Warmup.from_config(payload)
+        except (ValueError, KeyError, TypeError) as e:
+            r = badResponse()
+            r.error = ERRORS.BAD_PAYLOAD
+            r.info = f"Invalid warm-up: {e}"
+            return r
+        if not self.schedule_warmup(warmup):
+            r = badResponse()
+            r.error = ERRORS.BAD_PAYLOAD
+            r.info = "The warm-up window is already over"
+            return r
+        return okResponse()
+
+    async def on_get_header_profiles(self, cmd: Cmd) -> Response:
+        r = okResponse()
+        r.payload = self.header_profiles.get_status() if self.header_profiles else None
+        return r
+
+    async def on_get_rate_limits(self, cmd: Cmd) -> Response:
+        r = okResponse()
+        r.payload = {
+            host: bucket.get_status() for host, bucket in self._rate_limits.items()
+        }
+        return r
+
+    async def on_get_warmups(self, cmd: Cmd) -> Response:
+        r = okResponse()
+        r.payload = [warmup.get_status() for warmup in self._warmups]
+        return r
+
+    def is_unchanged(self, url: str, response: tornado.httpclient.HTTPResponse) -> bool:
+        """Check if the body of `response` is the same as the last one received for `url`, remembering its digest.\n
+        304 responses are always unchanged, errors never are."""
+        if response.code == 304:
+            return True
+        if response.code >= 400:
+            return False
+        digest = hashlib.blake2b(response.body or b"", digest_size=16).digest()
+        unchanged = self._digests.get(url) == digest
+        self._digests[url] = digest
+        return unchanged
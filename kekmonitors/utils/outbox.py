@@ -0,0 +1,178 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+ADD = "add"
+DONE = "done"
+SEEN = "seen"
+
+
+class Outbox(object):
+    """Append-only journal of the embeds waiting to be sent, so that they survive restarts and crashes.\n
+    Every notification (an embed and the webhooks it has to be sent to) has an idempotency key: a line is written when
+    it's added and one for every webhook it has been sent to, so that after a restart only the missing webhooks get it
+    (delivery is at-least-once: a crash between sending and writing means it's sent again). Notifications with a key
+    which has already been seen (the last `max_seen` ones) are ignored. If `path` is None nothing is written to disk.\n
+    The journal is rewritten with only the pending notifications when it's loaded and every `compact_every` lines."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_seen: int = 1000,
+        compact_every: int = 1000,
+    ):
+        self.path = path
+        self.max_seen = max_seen
+        self.compact_every = compact_every
+        # key -> {"embed": embed dict, "webhooks": {webhook: values}, "time": timestamp}
+        self.pending = OrderedDict()  # type: OrderedDict[str, Dict[str, Any]]
+        # keys of the notifications already sent, to ignore duplicates
+        self._seen = OrderedDict()  # type: OrderedDict[str, None]
+        self._file = None  # type: Any
+        self._lines = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __contains__(self, key: str):
+        return key in self.pending or key in self._seen
+
+    def load(self):
+        """Read the journal, if present, and compact it. Corrupted lines (like a partial last line after a crash) are skipped."""
+        if self.path and os.path.isfile(self.path):
+            with open(self.path, "r") as f:
+                for line in f:
+                    try:
+                        self._apply(json.loads(line))
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        pass
+        self.compact()
+
+    def _apply(self, record: Dict[str, Any]):
+        op = record["op"]
+        key = record["key"]
+        if op == ADD:
+            if key not in self:
+                self.pending[key] = {
+                    "embed": record["embed"],
+                    "webhooks": dict(record["webhooks"]),
+                    "time": float(record["time"]),
+                }
+        elif op == DONE:
+            notification = self.pending.get(key)
+            if notification is not None:
+                notification["webhooks"].pop(record["webhook"], None)
+                if not notification["webhooks"]:
+                    self.pending.pop(key)
+                    self._add_seen(key)
+        elif op == SEEN:
+            self._add_seen(key)
+
+    def _add_seen(self, key: str):
+        self._seen[key] = None
+        while len(self._seen) > self.max_seen:
+            self._seen.popitem(last=False)
+
+    def _write(self, record: Dict[str, Any]):
+        if not self.path:
+            return
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a")
+        self._file.write(json.dumps(record) + "\n")
+        # flushed to the os, so that it survives a crash of the process
+        self._file.flush()
+        self._lines += 1
+        if self._lines >= self.compact_every:
+            self.compact()
+
+    def add(
+        self,
+        key: str,
+        embed: Dict[str, Any],
+        webhooks: Dict[str, Dict[str, Any]],
+        timestamp: float,
+    ) -> bool:
+        """Add a notification. Return False if `key` has already been seen."""
+        if key in self:
+            return False
+        record = {
+            "op": ADD,
+            "key": key,
+            "embed": embed,
+            "webhooks": webhooks,
+            "time": timestamp,
+        }
+        self._apply(record)
+        self._write(record)
+        return True
+
+    def done(self, key: str, webhook: str):
+        """Mark the notification `key` as sent to `webhook`."""
+        notification = self.pending.get(key)
+        if notification is None or webhook not in notification["webhooks"]:
+            return
+        record = {"op": DONE, "key": key, "webhook": webhook}
+        self._apply(record)
+        self._write(record)
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        return iter(list(self.pending.items()))
+
+    def compact(self):
+        """Rewrite the journal with only the pending notifications and the keys already seen."""
+        if not self.path:
+            return
+        self.close()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for key in self._seen:
+                f.write(json.dumps({"op": SEEN, "key": key}) + "\n")
+            for key, notification in self.pending.items():
+                f.write(json.dumps({"op": ADD, "key": key, **notification}) + "\n")
+        os.replace(tmp_path, self.path)
+        self._lines = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self.pending),
+            "pending_webhooks": sum(
+                len(notification["webhooks"]) for notification in self.pending.values()
+            ),
+        }
+
+
+class DeadLetters(object):
+    """Messages which couldn't be delivered even after retrying, appended to `path` (one json per line) so that
+    they can be inspected or sent again by hand. If `path` is None they're only counted."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.count = 0
+
+    def add(self, webhook: str, data: str, error: str):
+        """Add the message `data` (the json posted to `webhook`), given up on because of `error`."""
+        self.count += 1
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(
+                json.dumps(
+                    {
+                        "webhook": webhook,
+                        "message": json.loads(data),
+                        "error": error,
+                        "time": time.time(),
+                    }
+                )
+                + "\n"
+            )
@@ -0,0 +1,167 @@
+import random
+import time
+from typing import Any, Dict, Iterable, List, Optional, Union
+from urllib.parse import urlparse
+
+# codes which usually mean that the proxy has been banned or is not working
+PROXY_FAILURE_CODES = (403, 407, 429, 599)
+
+
+class Proxy(object):
+    """A single proxy, with its health statistics."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        # exponentially weighted moving averages
+        self.latency = None  # type: Optional[float]
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    @classmethod
+    def from_config(cls, proxy: Union[str, Dict[str, Any]]) -> "Proxy":
+        """Create a proxy from a string (`host:port`, `user:password@host:port`, optionally with a scheme)
+        or a dict with `host`, `port` and optionally `username` and `password`."""
+        if isinstance(proxy, dict):
+            return cls(
+                proxy["host"],
+                int(proxy["port"]),
+                proxy.get("username"),
+                proxy.get("password"),
+            )
+        if proxy.find("://") == -1:
+            proxy = "http://" + proxy
+        parsed = urlparse(proxy)
+        if not parsed.hostname or not parsed.port:
+            raise ValueError(f"Invalid proxy: {proxy}")
+        return cls(parsed.hostname, parsed.port, parsed.username, parsed.password)
+
+    def get_fetch_kwargs(self) -> Dict[str, Any]:
+        """Return the arguments needed by the tornado client to use this proxy."""
+        kwargs = {
+            "proxy_host": self.host,
+            "proxy_port": self.port,
+        }  # type: Dict[str, Any]
+        if self.username:
+            kwargs["proxy_username"] = self.username
+            kwargs["proxy_password"] = self.password
+        return kwargs
+
+    def is_ejected(self) -> bool:
+        return time.monotonic() < self.ejected_until
+
+    def get_score(self) -> float:
+        """Higher is better: fast proxies with few errors. Proxies never used get an average latency, to give them a chance."""
+        latency = self.latency if self.latency is not None else 1.0
+        return max(0.01, 1 - self.error_rate) / max(latency, 0.05)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "latency": self.latency,
+            "error_rate": self.error_rate,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected": self.is_ejected(),
+            "score": self.get_score(),
+        }
+
+    def __str__(self):
+        return f"{self.host}:{self.port}"
+
+
+class ProxyPool(object):
+    """Selects proxies with a probability proportional to their score, optionally keeping the same proxy for every host (`sticky`).\n
+    Proxies failing `eject_after` times in a row are not used for `eject_time` seconds."""
+
+    def __init__(
+        self,
+        proxies: Iterable[Union[str, Dict[str, Any]]] = (),
+        sticky: bool = False,
+        eject_after: int = 3,
+        eject_time: float = 60.0,
+    ):
+        self.sticky = sticky
+        self.eject_after = eject_after
+        self.eject_time = eject_time
+        self.proxies = []  # type: List[Proxy]
+        # host -> proxy, used if sticky
+        self._sessions = {}  # type: Dict[str, Proxy]
+        self.update(proxies)
+
+    def update(self, proxies: Iterable[Union[str, Dict[str, Any]]]):
+        """Replace the proxies in the pool, keeping the statistics of the ones which were already there."""
+        old_proxies = {str(proxy): proxy for proxy in self.proxies}
+        new_proxies = []
+        for p in proxies:
+            proxy = Proxy.from_config(p)
+            new_proxies.append(old_proxies.get(str(proxy), proxy))
+        self.proxies = new_proxies
+        self._sessions = {
+            host: proxy
+            for host, proxy in self._sessions.items()
+            if proxy in self.proxies
+        }
+
+    def __len__(self):
+        return len(self.proxies)
+
+    def get_proxy(
+        self, host: Optional[str] = None, exclude: Iterable[Proxy] = ()
+    ) -> Optional[Proxy]:
+        """Return a proxy to be used for `host`, different from the ones in `exclude` if possible."""
+        if not self.proxies:
+            return None
+        if self.sticky and host in self._sessions:
+            proxy = self._sessions[host]
+            if not proxy.is_ejected() and proxy not in exclude:
+                return proxy
+        candidates = [
+            proxy
+            for proxy in self.proxies
+            if not proxy.is_ejected() and proxy not in exclude
+        ]
+        if not candidates:
+            # better a bad proxy than no proxy at all
+            candidates = [proxy for proxy in self.proxies if proxy not in exclude]
+            if not candidates:
+                candidates = self.proxies
+        proxy = random.choices(
+            candidates, weights=[proxy.get_score() for proxy in candidates]
+        )[0]
+        if self.sticky and host is not None:
+            self._sessions[host] = proxy
+        return proxy
+
+    def record(self, proxy: Proxy, code: int, latency: float):
+        """Update the statistics of `proxy` with the outcome of a request."""
+        if code in PROXY_FAILURE_CODES:
+            proxy.error_rate = 0.8 * proxy.error_rate + 0.2
+            proxy.consecutive_failures += 1
+            if proxy.consecutive_failures >= self.eject_after:
+                proxy.ejected_until = time.monotonic() + self.eject_time
+                proxy.consecutive_failures = 0
+                self._sessions = {
+                    host: p for host, p in self._sessions.items() if p is not proxy
+                }
+        else:
+            proxy.error_rate = 0.8 * proxy.error_rate
+            proxy.consecutive_failures = 0
+            proxy.latency = (
+                latency
+                if proxy.latency is None
+                else 0.8 * proxy.latency + 0.2 * latency
+            )
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "proxies": {str(proxy): proxy.get_status() for proxy in self.proxies},
+            "sessions": {host: str(proxy) for host, proxy in self._sessions.items()},
+        }
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class TokenBucket(object):
+    """Spreads the requests to a host at `rate` requests per second, allowing bursts of up to `burst` requests:
+    every request takes a token, tokens are added at `rate` per second up to `burst`, and requests wait
+    (in order) when there are none left."""
+
+    def __init__(self, rate: float, burst: float = 1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self._last = time.monotonic()
+        # keeps waiters in order
+        self._lock = asyncio.Lock()
+        self.acquired = 0
+        # total seconds spent waiting for tokens
+        self.waited = 0.0
+
+    def set_rate(self, rate: float, burst: float = 1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self._refill()
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = min(self.tokens, self.burst)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def grant(self, tokens: int = 1) -> Tuple[int, float]:
+        """Take up to `tokens` tokens without waiting. Return how many have been taken and,
+        if none, how many seconds to wait for the next one."""
+        self._refill()
+        granted = min(tokens, int(self.tokens))
+        if granted:
+            self.tokens -= granted
+            return granted, 0.0
+        return 0, (1 - self.tokens) / self.rate
+
+    async def _take(self):
+        while True:
+            granted, wait = self.grant()
+            if granted:
+                return
+            await asyncio.sleep(wait)
+
+    async def acquire(self):
+        """Wait for a token."""
+        start = time.monotonic()
+        async with self._lock:
+            await self._take()
+        self.acquired += 1
+        self.waited += time.monotonic() - start
+
+    def get_status(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "tokens": self.tokens,
+            "acquired": self.acquired,
+            "waited": self.waited,
+        }
+
+
+class SharedTokenBucket(TokenBucket):
+    """Token bucket shared by different processes: tokens are leased from a bucket owned by someone else
+    (the MonitorManager) through `lease`, an async function taking the number of tokens wanted and returning
+    how many have been granted and how long to wait if none, or None if the owner can't be reached.\n
+    Up to `lease_size` tokens are leased at once, so that most requests don't need to reach the owner.
+    If it can't be reached the local bucket is used for `fallback_time` seconds before trying again,
+    so that requests are still paced (but only within this process)."""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        lease: Callable[[int], Awaitable[Optional[Tuple[int, float]]]],
+        lease_size: int = 10,
+        fallback_time: float = 10,
+    ):
+        super().__init__(rate, burst)
+        self.lease = lease
+        self.lease_size = max(lease_size, 1)
+        self.fallback_time = fallback_time
+        # tokens leased and not used yet
+        self.leased = 0
+        self.shared = True
+        # monotonic time until which the local bucket is used, after a failed lease
+        self._fallback_until = 0.0
+
+    async def _take(self):
+        while True:
+            if self.leased:
+                self.leased -= 1
+                return
+            if time.monotonic() < self._fallback_until:
+                await super()._take()
+                return
+            result = await self.lease(self.lease_size)
+            self.shared = result is not None
+            if result is None:
+                # don't try to reach the owner on every request while it's down
+                self._fallback_until = time.monotonic() + self.fallback_time
+                await super()._take()
+                return
+            granted, wait = result
+            if granted:
+                self.leased += granted
+            else:
+                await asyncio.sleep(wait)
+
+    def get_status(self) -> Dict[str, Any]:
+        status = super().get_status()
+        status["shared"] = self.shared
+        status["leased"] = self.leased
+        return status
@@ -0,0 +1,197 @@
+import asyncio
+import base64
+import gzip
+import json
+import time
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import tornado.httpclient
+from tornado.httputil import HTTPHeaders
+
+from kekmonitors.utils.http_backends import HTTPBackend
+
+# size of the chunks passed to the streaming callbacks when replaying
+REPLAY_CHUNK_SIZE = 65536
+
+
+class RecordingBackend(HTTPBackend):
+    """Wraps another backend, appending every request/response pair to a gzipped json-lines archive at `path`,
+    which can then be served by `ReplayBackend`. Errors (code 599) are recorded as well."""
+
+    name = "recording"
+
+    def __init__(self, backend: HTTPBackend, path: str):
+        super().__init__(backend.max_clients, backend.dns_cache)
+        self.backend = backend
+        self.path = path
+        self.has_brotli = backend.has_brotli
+        self._file = None  # type: Any
+
+    def _write(
+        self,
+        method: str,
+        url: str,
+        response: Optional[tornado.httpclient.HTTPResponse],
+        body: bytes,
+        latency: float,
+        error: Optional[str] = None,
+    ):
+        if self._file is None:
+            # appending a new gzip member keeps the archive readable as a whole
+            self._file = gzip.open(self.path, "at", encoding="utf-8")
+        record = {
+            "method": method,
+            "url": url,
+            "latency": latency,
+        }  # type: Dict[str, Any]
+        if response is not None:
+            record.update(
+                {
+                    "code": response.code,
+                    "reason": response.reason,
+                    "headers": list(response.headers.get_all()),
+                    "effective_url": response.effective_url,
+                    "body": base64.b64encode(body).decode(),
+                }
+            )
+        else:
+            record.update({"code": 599, "error": error})
+        self._file.write(json.dumps(record) + "\n")
+        # flushed to the os, so that a crash of the process loses nothing that has been recorded
+        self._file.flush()
+
+    async def fetch(
+        self, url: str, raise_error: bool = True, **kwargs
+    ) -> tornado.httpclient.HTTPResponse:
+        method = kwargs.get("method", "GET")
+        start = time.monotonic()
+        try:
+            response = await self.backend.fetch(url, raise_error=False, **kwargs)
+        except tornado.httpclient.HTTPClientError as e:
+            self._write(method, url, None, b"", time.monotonic() - start, str(e))
+            raise
+        self._write(method, url, response, response.body or b"", response.request_time)
+        if raise_error and response.error:
+            raise response.error
+        return response
+
+    async def stream(
+        self, url: str, callback: Callable[[bytes], bool], **kwargs
+    ) -> tornado.httpclient.HTTPResponse:
+        method = kwargs.get("method", "GET")
+        chunks = []  # type: List[bytes]
+
+        def record_chunk(chunk: bytes) -> bool:
+            chunks.append(chunk)
+            return callback(chunk)
+
+        start = time.monotonic()
+        try:
+            response = await self.backend.stream(url, record_chunk, **kwargs)
+        except tornado.httpclient.HTTPClientError as e:
+            self._write(method, url, None, b"", time.monotonic() - start, str(e))
+            raise
+        # if the transfer has been aborted only the beginning of the body is recorded, which is all the parser needed
+        self._write(method, url, response, b"".join(chunks), response.request_time)
+        return response
+
+    async def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        await self.backend.close()
+
+
+class ReplayBackend(HTTPBackend):
+    """Serves the responses recorded by `RecordingBackend`, without touching the network.\n
+    The responses recorded for the same method and url are served in order, starting over when they run out;
+    requests which have never been recorded fail with code 599. If `timing` is True every response
+    is delayed by the latency it was recorded with."""
+
+    name = "replay"
+
+    def __init__(self, path: str, timing: bool = False, max_clients: int = 10):
+        super().__init__(max_clients)
+        self.path = path
+        self.timing = timing
+        self.has_brotli = True
+        self._records = {}  # type: Dict[Tuple[str, str], List[Dict[str, Any]]]
+        self._next = {}  # type: Dict[Tuple[str, str], int]
+        self.load()
+
+    def load(self):
+        self._records = {}
+        self._next = {}
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    key = (record["method"], record["url"])
+                    self._records.setdefault(key, []).append(record)
+            except (EOFError, json.JSONDecodeError):
+                # the recording process was killed while writing, keep what's readable
+                pass
+
+    def __len__(self):
+        return sum(len(records) for records in self._records.values())
+
+    async def _get_record(self, method: str, url: str) -> Dict[str, Any]:
+        key = (method, url)
+        if key not in self._records:
+            raise tornado.httpclient.HTTPClientError(
+                599, f"No recorded response for {method} {url}"
+            )
+        index = self._next.get(key, 0)
+        self._next[key] = (index + 1) % len(self._records[key])
+        record = self._records[key][index]
+        if self.timing:
+            await asyncio.sleep(record["latency"])
+        if "error" in record:
+            raise tornado.httpclient.HTTPClientError(599, record["error"])
+        return record
+
+    def _get_response(
+        self, url: str, record: Dict[str, Any], body: bytes, **kwargs
+    ) -> tornado.httpclient.HTTPResponse:
+        headers = HTTPHeaders()
+        for key, value in record["headers"]:
+            headers.add(key, value)
+        return tornado.httpclient.HTTPResponse(
+            tornado.httpclient.HTTPRequest(url, **kwargs),
+            record["code"],
+            reason=record["reason"],
+            headers=headers,
+            buffer=BytesIO(body),
+            effective_url=record["effective_url"],
+            request_time=record["latency"] if self.timing else 0.0,
+            start_time=time.time(),
+        )
+
+    async def fetch(
+        self, url: str, raise_error: bool = True, **kwargs
+    ) -> tornado.httpclient.HTTPResponse:
+        record = await self._get_record(kwargs.get("method", "GET"), url)
+        response = self._get_response(
+            url, record, base64.b64decode(record["body"]), **kwargs
+        )
+        if raise_error and response.error:
+            raise response.error
+        return response
+
+    async def stream(
+        self, url: str, callback: Callable[[bytes], bool], **kwargs
+    ) -> tornado.httpclient.HTTPResponse:
+        kwargs.pop("raise_error", None)
+        record = await self._get_record(kwargs.get("method", "GET"), url)
+        response = self._get_response(url, record, b"", **kwargs)
+        response.aborted = record["code"] >= 400
+        if not response.aborted:
+            body = base64.b64decode(record["body"])
+            for i in range(0, len(body), REPLAY_CHUNK_SIZE):
+                if callback(body[i : i + REPLAY_CHUNK_SIZE]):
+                    response.aborted = True
+                    break
+        return response
@@ -0,0 +1,98 @@
+import random
+import time
+from typing import Any, Dict
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class RetryPolicy(object):
+    """Decides how long to wait before retrying a failed request (exponential backoff with jitter)
+    and whether a retry is allowed at all: every request deposits `budget_ratio` tokens in the retry budget
+    (up to `budget_max`), every retry withdraws one, so that retries can't exceed a fraction of the traffic."""
+
+    def __init__(
+        self,
+        max_delay: float = 30.0,
+        multiplier: float = 2.0,
+        jitter: float = 0.5,
+        budget_ratio: float = 0.2,
+        budget_max: float = 10.0,
+    ):
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        # fraction of the delay that can be randomly removed
+        self.jitter = jitter
+        self.budget_ratio = budget_ratio
+        self.budget_max = budget_max
+        self._budget = budget_max
+
+    def on_request(self):
+        """Call this once for every new (non-retried) request."""
+        self._budget = min(self.budget_max, self._budget + self.budget_ratio)
+
+    def can_retry(self) -> bool:
+        """Withdraw a retry from the budget, returning False if it is exhausted."""
+        if self._budget >= 1:
+            self._budget -= 1
+            return True
+        return False
+
+    def get_delay(self, delay: float, retry: int) -> float:
+        """Return the time to wait before the `retry`-th retry (starting from 0), given the base `delay`."""
+        backoff = min(self.max_delay, delay * self.multiplier ** retry)
+        return backoff * (1 - self.jitter * random.random())
+
+    def get_status(self) -> Dict[str, Any]:
+        return {"budget": self._budget, "budget_max": self.budget_max}
+
+
+class CircuitBreaker(object):
+    """Per-host circuit breaker. It opens after `threshold` consecutive failures, refusing every request;
+    after `timeout` seconds it becomes half open and lets a single probe through: if it succeeds the circuit closes again,
+    otherwise it reopens."""
+
+    def __init__(self, threshold: int = 5, timeout: float = 30.0):
+        self.threshold = threshold
+        self.timeout = timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow_request(self) -> bool:
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.timeout:
+                return False
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def record_cancel(self):
+        """Call this if an allowed request was cancelled before completing, so that another probe can be made."""
+        self._probing = False
+
+    def get_status(self) -> Dict[str, Any]:
+        status = {
+            "state": self.state,
+            "failures": self.failures,
+        }  # type: Dict[str, Any]
+        if self.state != CLOSED:
+            status["open_for"] = time.monotonic() - self.opened_at
+        return status
@@ -0,0 +1,187 @@
+import json
+import os
+import time
+from email.utils import parsedate_to_datetime
+from http.cookies import CookieError, SimpleCookie
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class SessionStore(object):
+    """Cookies of every host, shared by `NetworkUtils.fetch` and the browser pool, so that anti-bot challenges solved once
+    (usually with the browser) are not solved again until their cookies expire.\n
+    Cookies without an expiration date are kept for `session_ttl` seconds. If `path` is set, cookies are saved there
+    and loaded back on restart. Cookies are matched by domain only, ignoring their path."""
+
+    def __init__(self, path: Optional[str] = None, session_ttl: float = 30 * 60):
+        self.path = path
+        self.session_ttl = session_ttl
+        # domain -> cookie name -> cookie
+        self._cookies = {}  # type: Dict[str, Dict[str, Dict[str, Any]]]
+        self._dirty = False
+        if path and os.path.isfile(path):
+            self.load()
+
+    def _add(
+        self,
+        name: str,
+        value: str,
+        domain: str,
+        expires: Optional[float] = None,
+        secure: bool = False,
+        path: str = "/",
+    ):
+        domain = domain.lstrip(".").lower()
+        cookies = self._cookies.setdefault(domain, {})
+        old = cookies.get(name)
+        if expires is None:
+            # session cookies seen again keep their first expiration
+            if old is not None and old["value"] == value:
+                return
+            expires = time.time() + self.session_ttl
+        if old is not None and old["value"] == value and old["expires"] == expires:
+            return
+        if expires <= time.time():
+            # expiring a cookie is how websites delete it
+            if cookies.pop(name, None) is None:
+                return
+        else:
+            cookies[name] = {
+                "name": name,
+                "value": value,
+                "domain": domain,
+                "path": path,
+                "expires": expires,
+                "secure": secure,
+            }
+        self._dirty = True
+
+    def set_browser_cookies(self, cookies: Iterable[Dict[str, Any]]):
+        """Store cookies in the format returned by pyppeteer's `page.cookies()`."""
+        for cookie in cookies:
+            expires = cookie.get("expires", -1)
+            self._add(
+                cookie["name"],
+                cookie["value"],
+                cookie["domain"],
+                None
+                if cookie.get("session") or expires is None or expires < 0
+                else expires,
+                cookie.get("secure", False),
+                cookie.get("path", "/"),
+            )
+
+    def get_browser_cookies(self) -> List[Dict[str, Any]]:
+        """Return all the valid cookies, in the format accepted by pyppeteer's `page.setCookie()`."""
+        return [
+            {
+                "name": cookie["name"],
+                "value": cookie["value"],
+                "domain": cookie["domain"],
+                "path": cookie["path"],
+                "expires": cookie["expires"],
+                "secure": cookie["secure"],
+            }
+            for domain in list(self._cookies)
+            for cookie in self._get_valid(domain)
+        ]
+
+    def update_from_headers(self, host: str, set_cookie_headers: List[str]):
+        """Store the cookies set by a response received from `host`."""
+        host = host.split(":")[0]
+        for header in set_cookie_headers:
+            parsed = SimpleCookie()
+            try:
+                parsed.load(header)
+            except CookieError:
+                continue
+            for name, morsel in parsed.items():
+                expires = None  # type: Optional[float]
+                if morsel["max-age"]:
+                    try:
+                        expires = time.time() + int(morsel["max-age"])
+                    except ValueError:
+                        pass
+                elif morsel["expires"]:
+                    try:
+                        expires = parsedate_to_datetime(morsel["expires"]).timestamp()
+                    except (TypeError, ValueError):
+                        pass
+                self._add(
+                    name,
+                    morsel.value,
+                    morsel["domain"] or host,
+                    expires,
+                    bool(morsel["secure"]),
+                    morsel["path"] or "/",
+                )
+
+    def _get_valid(self, domain: str) -> List[Dict[str, Any]]:
+        now = time.time()
+        cookies = self._cookies.get(domain, {})
+        for name in [name for name, c in cookies.items() if c["expires"] <= now]:
+            cookies.pop(name)
+            self._dirty = True
+        return list(cookies.values())
+
+    def get_cookies(self, host: str, secure: bool = True) -> List[Dict[str, Any]]:
+        """Return the valid cookies to be sent to `host` (only the insecure ones if `secure` is False)."""
+        host = host.split(":")[0].lower()
+        cookies = []
+        for domain in list(self._cookies):
+            if host == domain or host.endswith("." + domain):
+                cookies.extend(
+                    cookie
+                    for cookie in self._get_valid(domain)
+                    if secure or not cookie["secure"]
+                )
+        return cookies
+
+    def get_cookie_header(self, host: str, secure: bool = True) -> str:
+        """Return the value of the `Cookie` header for `host`, empty if there are no cookies."""
+        return "; ".join(
+            f"{cookie['name']}={cookie['value']}"
+            for cookie in self.get_cookies(host, secure)
+        )
+
+    def has_valid_session(self, host: str, names: Iterable[str] = ()) -> bool:
+        """Return True if there are valid cookies for `host`: all the ones in `names`, or any if `names` is empty."""
+        cookie_names = {cookie["name"] for cookie in self.get_cookies(host)}
+        names = set(names)
+        return names.issubset(cookie_names) if names else bool(cookie_names)
+
+    def invalidate(self, host: str):
+        """Forget the cookies of `host`, e.g. when the challenge shows up again."""
+        host = host.split(":")[0].lower()
+        for domain in list(self._cookies):
+            if host == domain or host.endswith("." + domain):
+                self._cookies.pop(domain)
+                self._dirty = True
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                self._cookies = json.load(f)
+        except ValueError:
+            # corrupted file, the challenges will just be solved again
+            self._cookies = {}
+        self._dirty = False
+
+    def save(self):
+        """Save the cookies to `path`, if they changed."""
+        if not self.path or not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._cookies, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def get_status(self) -> Dict[str, Any]:
+        """Names and expiration of the cookies of every domain (without their values)."""
+        return {
+            domain: {
+                cookie["name"]: cookie["expires"] for cookie in self._get_valid(domain)
+            }
+            for domain in list(self._cookies)
+        }
@@ -0,0 +1,133 @@
+import codecs
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+
+# tags which have no content and no end tag
+VOID_TAGS = (
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "source",
+    "track",
+    "wbr",
+)
+
+
+class StreamParser(object):
+    """Base class of the parsers used by `NetworkUtils.fetch_stream`: the body is passed to `feed` chunk by chunk
+    as soon as it's received, and the transfer is aborted as soon as `feed` returns True."""
+
+    def __init__(self):
+        self.bytes_received = 0
+
+    def feed(self, chunk: bytes) -> bool:
+        """Parse the next chunk of the body. Return True if the rest of the body is not needed."""
+        self.bytes_received += len(chunk)
+        return False
+
+    def close(self):
+        """Called when the whole body has been received (not if the transfer has been aborted)."""
+        pass
+
+
+class TagExtractor(StreamParser, HTMLParser):
+    """Incrementally extract the first tags matching some targets from an html page, stopping as soon as all of them have been found.\n
+    Example, to get the `og:title` meta tag and the magento script containing the sizes:\n
+    `extractor = TagExtractor()`\n
+    `extractor.add_target("name", "meta", {"property": "og:title"})`\n
+    `extractor.add_target("sizes", "script", {"type": "text/x-magento-init"}, contains="jsonConfig")`\n
+    `response = await self.fetch_stream(url, extractor)`\n
+    `name = extractor.results["name"]["attrs"]["content"]`\n
+    Every result is a dict with the `attrs` and the `text` of the tag, or None if it hasn't been found."""
+
+    def __init__(self, encoding: str = "utf-8"):
+        StreamParser.__init__(self)
+        HTMLParser.__init__(self, convert_charrefs=True)
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._targets = []  # type: List[Dict[str, Any]]
+        self.results = {}  # type: Dict[str, Optional[Dict[str, Any]]]
+        # target whose content is being collected, with the tag depth
+        self._current = None  # type: Optional[Dict[str, Any]]
+        self._depth = 0
+        self._text = []  # type: List[str]
+        self._attrs = {}  # type: Dict[str, str]
+
+    def add_target(
+        self,
+        name: str,
+        tag: str,
+        attrs: Optional[Dict[str, str]] = None,
+        contains: Optional[str] = None,
+    ):
+        """Look for the first `tag` having (at least) `attrs` and, if `contains` is set, whose text contains it.
+        The result will be in `self.results[name]`."""
+        self._targets.append(
+            {"name": name, "tag": tag, "attrs": attrs or {}, "contains": contains}
+        )
+        self.results[name] = None
+
+    def is_done(self) -> bool:
+        return all(result is not None for result in self.results.values())
+
+    def feed(self, chunk: bytes) -> bool:
+        StreamParser.feed(self, chunk)
+        HTMLParser.feed(self, self._decoder.decode(chunk))
+        return self.is_done()
+
+    def close(self):
+        HTMLParser.feed(self, self._decoder.decode(b"", final=True))
+        HTMLParser.close(self)
+
+    def handle_starttag(self, tag: str, attrs: List[Any]):
+        if self._current is not None:
+            if tag == self._current["tag"]:
+                self._depth += 1
+            return
+        attrs_dict = {key: value or "" for key, value in attrs}
+        for target in self._targets:
+            if (
+                self.results[target["name"]] is None
+                and target["tag"] == tag
+                and all(attrs_dict.get(k) == v for k, v in target["attrs"].items())
+            ):
+                if tag in VOID_TAGS:
+                    if target["contains"] is None:
+                        self.results[target["name"]] = {"attrs": attrs_dict, "text": ""}
+                    continue
+                self._current = target
+                self._depth = 1
+                self._text = []
+                self._attrs = attrs_dict
+                return
+
+    def handle_startendtag(self, tag: str, attrs: List[Any]):
+        # the content of <tag/> is always empty
+        if self._current is None:
+            self.handle_starttag(tag, attrs)
+            if self._current is not None:
+                self._depth = 0
+                self._end_current()
+
+    def handle_endtag(self, tag: str):
+        if self._current is not None and tag == self._current["tag"]:
+            self._depth -= 1
+            if not self._depth:
+                self._end_current()
+
+    def handle_data(self, data: str):
+        if self._current is not None:
+            self._text.append(data)
+
+    def _end_current(self):
+        target = self._current
+        self._current = None
+        text = "".join(self._text)
+        if target["contains"] is None or text.find(target["contains"]) != -1:
+            self.results[target["name"]] = {"attrs": self._attrs, "text": text}
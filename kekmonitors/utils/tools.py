@@ -195,6 +195,23 @@ def make_default_executable(_class, config: Config = None):
         help=f"Specify the max_last_seen value for shoes. (default: {config['Options']['max_last_seen']})",
         dest="max_last_seen",
     )
+    parser.add_argument(
+        "--record",
+        default=config["NetworkConfig"]["record_path"],
+        help="Record every request made with NetworkUtils to the specified archive, to be replayed later with --replay.",
+    )
+    parser.add_argument(
+        "--replay",
+        default=config["NetworkConfig"]["replay_path"],
+        help="Serve the requests made with NetworkUtils from the specified archive (made with --record) instead of the network.",
+    )
+    parser.add_argument(
+        "--replay-timing",
+        action=boolAction,
+        default=True if config["NetworkConfig"]["replay_timing"] == "True" else False,
+        help="When replaying, delay every response by the latency it was recorded with.",
+        dest="replay_timing",
+    )
     parser_args, unknown = parser.parse_known_args()
     if parser_args.register:
         _class(config)
@@ -210,6 +227,9 @@ def make_default_executable(_class, config: Config = None):
     config["Options"]["enable_config_watcher"] = str(parser_args.config_watcher)
     config["Options"]["enable_webhooks"] = str(parser_args.webhooks)
     config["Options"]["max_last_seen"] = str(parser_args.max_last_seen)
+    config["NetworkConfig"]["record_path"] = parser_args.record
+    config["NetworkConfig"]["replay_path"] = parser_args.replay
+    config["NetworkConfig"]["replay_timing"] = str(parser_args.replay_timing)
     kwargs = {}  # type: Dict[str, str]
     if len(unknown) % 2:
         print("Incorrect number of kwargs")
@@ -0,0 +1,79 @@
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Union
+
+SCHEDULED = "scheduled"
+WARMING = "warming"
+DONE = "done"
+CANCELLED = "cancelled"
+
+
+class Warmup(object):
+    """Describes a connection warm-up: `lead` seconds before `at` (unix timestamp) the connections to `urls` are opened,
+    then they are kept alive with a request every `interval` seconds until `window` seconds after `at`."""
+
+    def __init__(
+        self,
+        urls: List[str],
+        at: float,
+        lead: float = 30.0,
+        window: float = 300.0,
+        interval: float = 4.0,
+        connections: int = 1,
+    ):
+        if not urls:
+            raise ValueError("A warm-up needs at least one url")
+        if interval <= 0 or connections <= 0:
+            raise ValueError("interval and connections must be positive")
+        self.urls = urls
+        self.at = at
+        self.lead = lead
+        self.window = window
+        self.interval = interval
+        # connections to open for every url
+        self.connections = connections
+        self.state = SCHEDULED
+
+    @classmethod
+    def from_config(cls, warmup: Dict[str, Any]) -> "Warmup":
+        """Create a warm-up from a dict with the same keys as the constructor.
+        `at` can be a unix timestamp or a local time string formatted as `%Y-%m-%d %H:%M:%S`."""
+        urls = warmup["urls"]
+        if isinstance(urls, str):
+            urls = [urls]
+        return cls(
+            list(urls),
+            parse_time(warmup["at"]),
+            float(warmup.get("lead", 30)),
+            float(warmup.get("window", 300)),
+            float(warmup.get("interval", 4)),
+            int(warmup.get("connections", 1)),
+        )
+
+    def get_start(self) -> float:
+        return self.at - self.lead
+
+    def get_end(self) -> float:
+        return self.at + self.window
+
+    def is_expired(self) -> bool:
+        return time.time() > self.get_end()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "urls": self.urls,
+            "at": datetime.fromtimestamp(self.at).strftime("%Y-%m-%d %H:%M:%S"),
+            "lead": self.lead,
+            "window": self.window,
+            "interval": self.interval,
+            "connections": self.connections,
+            "state": self.state,
+        }
+
+
+def parse_time(t: Union[str, int, float]) -> float:
+    """Return the unix timestamp of `t`, which can be a timestamp itself or a local time formatted as `%Y-%m-%d %H:%M:%S`."""
+    try:
+        return float(t)
+    except ValueError:
+        return datetime.strptime(t, "%Y-%m-%d %H:%M:%S").timestamp()
@@ -1,153 +1,608 @@
+import asyncio
 import json
+import os
 import time
+import uuid
 from datetime import datetime
-from queue import Queue
-from threading import Event, Thread
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-import requests
-from discord import Embed
+import aiohttp
 
-from kekmonitors.config import Config, LogConfig
-from kekmonitors.utils.tools import get_logger
+from kekmonitors.comms.msg import Cmd
+from kekmonitors.config import COMMANDS, Config, LogConfig
+from kekmonitors.utils.discord_rate_limits import DiscordRateLimiter
+from kekmonitors.utils.embed import Embed
+from kekmonitors.utils.metrics import AlertMetrics
+from kekmonitors.utils.outbox import DeadLetters, Outbox
+from kekmonitors.utils.retry import RetryPolicy
+from kekmonitors.utils.tools import get_logger, make_request
 
+# max number of embeds forwarded to the notifier at once
+NOTIFIER_BATCH_SIZE = 50
+# discord's limits for a single message
+MAX_EMBEDS = 10
+MAX_EMBEDS_LENGTH = 6000
+# health of a webhook
+HEALTHY = "healthy"
+# failed since the last message delivered, but still retrying
+DEGRADED = "degraded"
+# a message has been given up on since the last one delivered
+FAILING = "failing"
+# keys of the embed set by the customizations of the webhook
+OVERLAY_KEYS = ("footer", "color", "timestamp")
 
-class WebhookSender(Thread):
-    """This handles sending embeds to one specific webhook. Obviously being a thread sub-class you should not add too many webhooks (in the order of the hundreds) for the same monitor.\n
+
+def get_embed_length(embed: Dict[str, Any]) -> int:
+    """Return the number of characters of `embed` counted by discord for the 6000 characters limit."""
+    length = len(embed.get("title", "")) + len(embed.get("description", ""))
+    for field in embed.get("fields", []):
+        length += len(field.get("name", "")) + len(field.get("value", ""))
+    length += len(embed.get("footer", {}).get("text", ""))
+    length += len(embed.get("author", {}).get("name", ""))
+    return length
+
+
+class RenderedEmbed(object):
+    """An embed rendered once and shared by all the webhooks it's sent to: `data` is its dict, without what's set by the
+    customizations of the webhooks (footer, color and timestamp), and `json` its serialization. They must not be modified."""
+
+    __slots__ = ("data", "json", "length")
+
+    def __init__(self, data: Dict[str, Any]):
+        if not isinstance(data, dict):
+            raise TypeError("The embed must be a dict")
+        self.data = {
+            key: value for key, value in data.items() if key not in OVERLAY_KEYS
+        }
+        self.json = json.dumps(self.data)
+        self.length = get_embed_length(self.data)
+
+    def with_overlay(self, overlay: str) -> str:
+        """Return the json of the embed with `overlay` (a json fragment of other keys) added."""
+        if not self.data:
+            return "{" + overlay + "}"
+        return self.json[:-1] + ", " + overlay + "}"
+
+
+class WebhookOverlay(object):
+    """Customizations of a webhook (from webhooks.json), compiled once and applied on top of the rendered embeds:
+    `provider`, `icon_url`, `color` and `timestamp_format` for the footer and the color, `avatar_image` for the message."""
+
+    def __init__(self, webhook_values: Dict[str, Any], config: LogConfig):
+        custom = webhook_values.get("custom", {})
+        self.provider = custom.get("provider", config["WebhookConfig"]["provider"])
+        self.timestamp_format = custom.get(
+            "timestamp_format", config["WebhookConfig"]["timestamp_format"]
+        )
+        icon_url = custom.get("icon_url", config["WebhookConfig"]["provider_icon"])
+        color = custom.get("color", int(config["WebhookConfig"]["embed_color"]))
+        avatar_url = custom.get("avatar_image")
+        # everything but the time is serialized only once
+        self._footer_end = (
+            f', "icon_url": {json.dumps(icon_url)}}}, "color": {json.dumps(color)}'
+        )
+        self._message_end = "]"
+        if avatar_url is not None:
+            self._message_end += f', "avatar_url": {json.dumps(avatar_url)}'
+        self._message_end += "}"
+
+    def render(self, embed: RenderedEmbed, now: datetime) -> Tuple[str, int]:
+        """Return the json of `embed` with the footer and color of the webhook and its length for discord's limits."""
+        footer_text = f"{self.provider} | {now.strftime(self.timestamp_format)}"
+        overlay = f'"footer": {{"text": {json.dumps(footer_text)}' + self._footer_end
+        return embed.with_overlay(overlay), embed.length + len(footer_text)
+
+    def get_message(self, embeds: List[str]) -> str:
+        """Return the json to be posted, given the json of the embeds."""
+        return '{"embeds": [' + ", ".join(embeds) + self._message_end
+
+
+class WebhookHealth(object):
+    """Delivery status of a webhook: messages delivered, retried and given up on, and the last error."""
+
+    def __init__(self):
+        self.delivered = 0
+        self.retries = 0
+        self.dead_letters = 0
+        # failed attempts since the last message delivered
+        self.consecutive_failures = 0
+        self.last_error = None  # type: Optional[str]
+        # unix times
+        self.last_delivered = None  # type: Optional[float]
+        self.last_failure = None  # type: Optional[float]
+        self._gave_up = False
+
+    @property
+    def state(self) -> str:
+        if self._gave_up:
+            return FAILING
+        return DEGRADED if self.consecutive_failures else HEALTHY
+
+    def record_delivered(self):
+        self.delivered += 1
+        self.consecutive_failures = 0
+        self.last_delivered = time.time()
+        self._gave_up = False
+
+    def record_failure(self, error: str, retry: bool):
+        self.consecutive_failures += 1
+        self.last_error = error
+        self.last_failure = time.time()
+        if retry:
+            self.retries += 1
+        else:
+            self.dead_letters += 1
+            self._gave_up = True
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "delivered": self.delivered,
+            "retries": self.retries,
+            "dead_letters": self.dead_letters,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "last_delivered": self.last_delivered,
+            "last_failure": self.last_failure,
+        }
+
+
+class WebhookSender(object):
+    """This handles sending embeds to one specific webhook, in order, as a task on the monitor's asyncio loop.
+    Senders share the http session of the `WebhookManager`, so thousands of webhooks cost no extra threads.\n
+    Embeds queued within `batch_window` seconds (or while waiting for the rate limits) are sent in the same message,
+    up to discord's limits of 10 embeds and 6000 characters.\n
+    Network errors and 5xx are retried up to `max_retries` times (in `[WebhookConfig]`) with exponential backoff,
+    then the message is written to the dead letters and the next one is sent, so a broken webhook can't block its queue.
+    Other errors (like a 404 for a deleted webhook) are not retried.\n
     You should not use this directly, but `WebhookManager` instead"""
 
-    def __init__(self, webhook: str, logconfig: LogConfig):
-        self.config = logconfig
+    def __init__(
+        self,
+        webhook: str,
+        session: aiohttp.ClientSession,
+        rate_limiter: DiscordRateLimiter,
+        config: LogConfig,
+        logger: Any,
+        outbox: Optional[Outbox] = None,
+        batch_window: float = 0,
+        alert_metrics: Optional[Dict[str, AlertMetrics]] = None,
+        dead_letters: Optional[DeadLetters] = None,
+    ):
+        self.config = config
         self.webhook = webhook
-        self.logger = get_logger(logconfig)
-        self.queue = Queue()  # type: Queue[Tuple[List[Any], List[Any], datetime]]
-        # contains the webhook config, embeds and time at which they were added
-        self.add_event = Event()
-        self.has_to_quit = False
-        super().__init__()
+        self.session = session
+        self.rate_limiter = rate_limiter
+        self.logger = logger
+        self.outbox = outbox
+        # latency of the alerts, by the monitor/scraper which found them
+        self.alert_metrics = alert_metrics
+        self.dead_letters = dead_letters or DeadLetters()
+        self.health = WebhookHealth()
+        self.max_retries = int(config["WebhookConfig"]["max_retries"])
+        self.retry_delay = float(config["WebhookConfig"]["retry_delay"])
+        self.retry_policy = RetryPolicy(
+            max_delay=float(config["WebhookConfig"]["retry_max_delay"])
+        )
+        # contains the webhook config, embeds, time at which they were added, their key in the outbox
+        # and the monitor/scraper which found them with the time at which they reached every stage
+        self.queue = asyncio.Queue()  # type: asyncio.Queue
+        self.batch_window = batch_window
+        # taken from the queue but left out of the previous message
+        self._next = None  # type: Optional[Tuple]
+        # compiled customizations of the last webhook values
+        self._overlay = None  # type: Optional[WebhookOverlay]
+        self._overlay_values = None  # type: Optional[Dict[str, Any]]
+        self._task = None  # type: Optional[asyncio.Task]
+        self._sending = False
+
+    def start(self):
+        self._task = asyncio.ensure_future(self.run())
 
-    def add_to_queue(self, webhook_values: Any, embed: Embed):
-        now = datetime.now()
-        self.queue.put((webhook_values, embed, now))
-        self.add_event.set()
+    def add_to_queue(
+        self,
+        webhook_values: Dict[str, Any],
+        embed: RenderedEmbed,
+        now: Optional[datetime] = None,
+        key: Optional[str] = None,
+        alert: Optional[Tuple[str, Dict[str, float]]] = None,
+    ):
+        self.queue.put_nowait(
+            (webhook_values, embed, now or datetime.now(), key, alert)
+        )
 
     def is_done(self) -> bool:
-        return not self.add_event.isSet()
+        return self.queue.empty() and self._next is None and not self._sending
 
-    def quit(self):
-        self.has_to_quit = True
-        self.add_event.set()
+    async def stop(self):
+        """Stop the sender, even if the queue has not been sent yet."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
 
-    def run(self):
-        while True:
-            self.add_event.wait()
-            if self.has_to_quit:
-                self.add_event.clear()
+    def get_overlay(self, webhook_values: Dict[str, Any]) -> WebhookOverlay:
+        """Return the overlay of `webhook_values`, compiled again only if they changed."""
+        if self._overlay is None or webhook_values != self._overlay_values:
+            self._overlay = WebhookOverlay(webhook_values, self.config)
+            self._overlay_values = webhook_values
+        return self._overlay
+
+    async def _get_batch(self) -> Tuple[str, List[Tuple], int]:
+        """Wait for the next embeds to be sent together: return the json to be posted, the items of the queue
+        included and how many items have been taken from it."""
+        if self._next is not None:
+            first = self._next
+            self._next = None
+        else:
+            first = await self.queue.get()
+        if self.batch_window > 0 and self.queue.empty():
+            await asyncio.sleep(self.batch_window)
+        webhook_values, embed, now = first[:3]
+        overlay = self.get_overlay(webhook_values)
+        embed_json, length = overlay.render(embed, now)
+        embeds = [embed_json]
+        items = [first]
+        while len(embeds) < MAX_EMBEDS and not self.queue.empty():
+            item = self.queue.get_nowait()
+            # the avatar is per message, so different customizations can't be merged
+            if self.get_overlay(item[0]) is not overlay:
+                self._next = item
                 break
-            while not self.queue.empty():
-                webhook_values, embed, now = self.queue.get()
-                if "custom" in webhook_values:
-                    provider = webhook_values["custom"].get(
-                        "provider", self.config["WebhookConfig"]["provider"]
-                    )
-                    timestamp_format = webhook_values["custom"].get(
-                        "timestamp_format",
-                        self.config["WebhookConfig"]["timestamp_format"],
-                    )
-                    ts = now.strftime(timestamp_format)
-                    icon_url = webhook_values["custom"].get(
-                        "icon_url", self.config["WebhookConfig"]["provider_icon"]
-                    )
-                    color = webhook_values["custom"].get(
-                        "color", int(self.config["WebhookConfig"]["embed_color"])
-                    )
+            embed_json, embed_length = overlay.render(item[1], item[2])
+            if length + embed_length > MAX_EMBEDS_LENGTH:
+                self._next = item
+                break
+            embeds.append(embed_json)
+            items.append(item)
+            length += embed_length
+        return overlay.get_message(embeds), items, len(embeds)
 
-                    embed.set_footer(text=" | ".join([provider, ts]), icon_url=icon_url)
-                    embed.color = color
-                else:
-                    ts = now.strftime(self.config["WebhookConfig"]["timestamp_format"])
+    async def run(self):
+        while True:
+            data, items, taken = await self._get_batch()
+            self._sending = True
+            try:
+                sent_at = await self.send(data)
+                acked_at = time.time()
+                for _, _, _, key, alert in items:
+                    # also if it has been given up on, since it's in the dead letters
+                    if self.outbox is not None and key is not None:
+                        self.outbox.done(key, self.webhook)
+                    if (
+                        self.alert_metrics is not None
+                        and alert is not None
+                        and sent_at is not None
+                    ):
+                        source, timings = alert
+                        if source not in self.alert_metrics:
+                            self.alert_metrics[source] = AlertMetrics()
+                        self.alert_metrics[source].record(
+                            {**timings, "send": sent_at, "ack": acked_at}
+                        )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.exception(f"Couldn't post to {self.webhook}:")
+            finally:
+                self._sending = False
+                for _ in range(taken):
+                    self.queue.task_done()
 
-                    embed.set_footer(
-                        text=f"{self.config['WebhookConfig']['provider']} | {ts}",
-                        icon_url=self.config["WebhookConfig"]["provider_icon"],
+    async def send(self, data: str) -> Optional[float]:
+        """Post `data`, retrying on 429, network errors and 5xx. Return the (unix) time of the post accepted by discord,
+        or None if it has been given up on and written to the dead letters."""
+        retries = 0
+        while True:
+            # waits for the rate limits instead of running into them
+            await self.rate_limiter.acquire(self.webhook)
+            sent_at = time.time()
+            status = None  # type: Optional[int]
+            try:
+                async with self.session.post(
+                    self.webhook,
+                    data=data,
+                    headers={"Content-Type": "application/json"},
+                ) as r:
+                    body = await r.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = f"{type(e).__name__}: {e}"
+            else:
+                status = r.status
+                self.logger.debug(f"Posted to {self.webhook} with code {status}")
+                if not self.rate_limiter.update(self.webhook, status, r.headers, body):
+                    self.logger.warning(
+                        f"Attention: {self.webhook} posted with {status} but it doesnt contain the rateLimit header; are you sure the webhook is correct???"
                     )
-                    embed.color = int(self.config["WebhookConfig"]["embed_color"])
+                if status == 429:
+                    self.logger.debug(f"Got 429 for {self.webhook}, retrying")
+                    continue
+                if status < 300:
+                    self.health.record_delivered()
+                    return sent_at
+                error = f"{status}: {body[:200].decode(errors='replace')}"
+            if (status is None or status >= 500) and retries < self.max_retries:
+                delay = self.retry_policy.get_delay(self.retry_delay, retries)
+                retries += 1
+                self.health.record_failure(error, retry=True)
+                self.logger.warning(
+                    f"Couldn't post to {self.webhook} ({error}), retrying in {delay:.1f} secs"
+                )
+                await asyncio.sleep(delay)
+                continue
+            self.health.record_failure(error, retry=False)
+            self.logger.error(
+                f"Couldn't post to {self.webhook} ({error}), moving it to the dead letters"
+            )
+            self.dead_letters.add(self.webhook, data, error)
+            return None
 
-                embed.timestamp = Embed.Empty
-                data = {"embeds": [embed.to_dict()]}
-
-                if "custom" in webhook_values:
-                    if "avatar_image" in webhook_values["custom"]:
-                        data["avatar_url"] = webhook_values["custom"]["avatar_image"]
-
-                data = json.dumps(data)
-
-                while True:
-                    r = requests.post(
-                        self.webhook,
-                        data=data,
-                        headers={"Content-Type": "application/json"},
-                        timeout=3,
-                    )
-                    self.logger.debug(
-                        f"Posted to {self.webhook} with code {r.status_code}"
-                    )
-                    if "x-rateLimit-remaining" in r.headers:
-                        remaining_requests = r.headers["x-rateLimit-remaining"]
-                        if remaining_requests == "0":
-                            delay = int(r.headers["x-rateLimit-reset-after"])
-                            self.logger.debug(
-                                f"No available requests reminaing for {self.webhook}, waiting {str(delay)} secs"
-                            )
-                            time.sleep(delay)
-                            continue
-                        if r.status_code == 429:
-                            delay = int(r.headers["x-rateLimit-reset-after"])
-                            self.logger.debug(
-                                f"Got 429 for {self.webhook}, waiting {str(delay)} secs"
-                            )
-                            time.sleep(delay)
-                            continue
-                    else:
-                        self.logger.warning(
-                            f"Attention: {self.webhook} posted with {r.status_code} but it doesnt contain the rateLimit header; are you sure the webhook is correct???"
-                        )
-                    break
-            self.add_event.clear()
+    def get_status(self) -> Dict[str, Any]:
+        status = self.health.get_status()
+        status["queued"] = self.queue.qsize() + (self._next is not None)
+        return status
 
 
 class WebhookManager:
-    def __init__(self, config: Config):
+    """Sends embeds to webhooks from the asyncio loop of the monitor/scraper: every webhook has its own queue,
+    processed by a `WebhookSender` task, and all of them share a pooled http session.\n
+    If `use_notifier` is True (default: `use_notifier` in `[WebhookConfig]`) and the MonitorManager is running, embeds are
+    handed to it instead, so that the webhooks of all the monitors and scrapers are sent from a single place,
+    sharing the same rate limits; if it can't be reached they're sent from here.\n
+    If `outbox` in `[WebhookConfig]` is True, embeds are written to an `Outbox` until they're sent (or handed to the
+    notifier), and the ones left from a previous run are sent by `start`."""
+
+    def __init__(self, config: Config, use_notifier: Optional[bool] = None):
         logconfig = LogConfig(config)
         self.config = logconfig
         logconfig["OtherConfig"]["socket_name"] += ".WebhookManager"
         self.logger = get_logger(logconfig)
         self.webhook_senders = {}  # type: Dict[str, WebhookSender]
-        self.add_event = Event()
+        self.max_connections = int(config["WebhookConfig"]["max_connections"])
+        # shared by all the senders, since webhooks can share buckets and the global limit
+        self.rate_limiter = DiscordRateLimiter(
+            float(config["WebhookConfig"]["global_rate_limit"])
+        )
+        # created on the first embed, since it needs the running loop
+        self._session = None  # type: Optional[aiohttp.ClientSession]
+        if use_notifier is None:
+            use_notifier = config["WebhookConfig"]["use_notifier"] == "True"
+        self.use_notifier = use_notifier
+        self.notifier_socket = f"{config['GlobalConfig']['socket_path']}/MonitorManager"
+        # embeds waiting to be forwarded to the notifier
+        self._notifier_queue = None  # type: Optional[asyncio.Queue]
+        self._notifier_task = None  # type: Optional[asyncio.Task]
+        # seconds to wait for the queued embeds on shutdown; what's left is sent on the next start, if there's an outbox
+        self.shutdown_timeout = float(config["WebhookConfig"]["shutdown_timeout"])
+        # seconds to wait for more embeds to be sent in the same message
+        self.batch_window = float(config["WebhookConfig"]["batch_window"])
+        self.outbox = None  # type: Optional[Outbox]
+        if config["WebhookConfig"]["outbox"] == "True":
+            outbox_path = config["WebhookConfig"]["outbox_path"] or os.path.sep.join(
+                (config["GlobalConfig"]["config_path"], "outbox")
+            )
+            self.outbox = Outbox(
+                os.path.sep.join(
+                    (outbox_path, f"{config['OtherConfig']['socket_name']}.jsonl")
+                )
+            )
+        self._started = False
+        # the monitor/scraper the alerts come from, unless forwarded
+        self.source = config["OtherConfig"]["socket_name"]
+        # latency of the alerts sent from here, by the monitor/scraper which found them
+        self.alert_metrics = {}  # type: Dict[str, AlertMetrics]
+        dead_letters_path = config["WebhookConfig"][
+            "dead_letters_path"
+        ] or os.path.sep.join((config["GlobalConfig"]["config_path"], "dead_letters"))
+        self.dead_letters = DeadLetters(
+            os.path.sep.join(
+                (dead_letters_path, f"{config['OtherConfig']['socket_name']}.jsonl")
+            )
+        )
         self.logger.debug("Started webhook manager")
 
-    def quit(self):
+    def get_status(self) -> Dict[str, Any]:
+        """Return the health of every webhook, the dead letters, the outbox and the rate limits."""
+        return {
+            "webhooks": {
+                webhook: sender.get_status()
+                for webhook, sender in self.webhook_senders.items()
+            },
+            "dead_letters": self.dead_letters.count,
+            "outbox": self.outbox.get_status() if self.outbox is not None else None,
+            "rate_limits": self.rate_limiter.get_status(),
+        }
+
+    def get_alert_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Return the latency of the alerts sent from here, by monitor/scraper."""
+        return {
+            source: metrics.get_status()
+            for source, metrics in self.alert_metrics.items()
+        }
+
+    def get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=10),
+            )
+        return self._session
+
+    async def post(self, webhook: str, data: Dict[str, Any]) -> Optional[int]:
+        """Post `data` to `webhook` right away, without queues, outbox or retries (e.g. for crash reports).
+        Uses its own session, so it's never recorded or replayed like the requests of `NetworkUtils`.
+        Return the status code, or None if the request failed."""
+        try:
+            async with self.get_session().post(webhook, json=data) as response:
+                return response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.logger.exception(f"Couldn't post to {webhook}:")
+            return None
+
+    def start(self):
+        """Load the outbox and send the embeds left from the previous run. Called by `add_to_queue` if needed."""
+        if self._started:
+            return
+        self._started = True
+        if self.outbox is None:
+            return
+        self.outbox.load()
+        if len(self.outbox):
+            self.logger.info(f"Sending {len(self.outbox)} embeds left in the outbox")
+        for key, notification in self.outbox:
+            self._dispatch(
+                key,
+                RenderedEmbed(notification["embed"]),
+                notification["webhooks"],
+                datetime.fromtimestamp(notification["time"]),
+            )
+
+    async def _drain(self):
+        if self._notifier_queue is not None:
+            await self._notifier_queue.join()
+        # the embeds which couldn't be forwarded have been added to the senders by now
+        await asyncio.gather(*[ws.queue.join() for ws in self.webhook_senders.values()])
+
+    async def quit(self, timeout: Optional[float] = None):
+        """Wait up to `timeout` seconds (default: `shutdown_timeout`) for the queued embeds to be sent, then stop the senders."""
         self.logger.debug("Starting shutdown...")
-        for w in self.webhook_senders:
-            ws = self.webhook_senders[w]
-            self.logger.debug(f"Waiting {ws.webhook}...")
-            while not ws.is_done():
-                time.sleep(0.5)
-            self.logger.debug(f"Stopping {ws.webhook}...")
-            ws.quit()
-
-        for w in self.webhook_senders:
-            ws = self.webhook_senders[w]
-            self.logger.debug(f"Cleaning up {ws.webhook}...")
-            ws.join()
+        if timeout is None:
+            timeout = self.shutdown_timeout
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            left = sum(ws.queue.qsize() for ws in self.webhook_senders.values())
+            if self.outbox is not None:
+                self.logger.warning(
+                    f"Shutdown timed out with {left} embeds still queued, they will be sent on the next start"
+                )
+            else:
+                self.logger.warning(
+                    f"Shutdown timed out, {left} embeds have not been sent"
+                )
+        if self._notifier_task is not None:
+            self._notifier_task.cancel()
+        await asyncio.gather(*[ws.stop() for ws in self.webhook_senders.values()])
+        if self._session is not None:
+            await self._session.close()
+        if self.outbox is not None:
+            self.outbox.close()
         self.logger.debug("Shut down...")
 
-    def add_to_queue(self, embed: Embed, webhooks: Dict[str, Dict[str, Any]]):
-        """Add the embed to the queue of webhooks to send. It will be processed as soon as possible."""
+    def add_to_queue(
+        self,
+        embed: Union[Embed, RenderedEmbed],
+        webhooks: Dict[str, Dict[str, Any]],
+        key: Optional[str] = None,
+        now: Optional[datetime] = None,
+        timings: Optional[Dict[str, float]] = None,
+        source: Optional[str] = None,
+    ):
+        """Add the embed to the queue of webhooks to send. It will be processed as soon as possible.\n
+        `key` identifies the embed: if an embed with the same key has already been added it's ignored.
+        `now` is the time shown in the footer (default: now).
+        `timings` are the (unix) times at which the alert reached the stages before this one (see `ALERT_STAGES`),
+        to track its latency as an alert of `source` (default: this monitor/scraper).
+        The embed is rendered here once for all the webhooks, so it can be modified afterwards."""
+        if not webhooks:
+            return
+        self.start()
+        now = now or datetime.now()
+        if not isinstance(embed, RenderedEmbed):
+            embed = RenderedEmbed(embed.to_dict())
+        if key is None:
+            key = uuid.uuid4().hex
+        if self.outbox is not None:
+            if not self.outbox.add(key, embed.data, webhooks, now.timestamp()):
+                self.logger.debug(f"Ignoring duplicate embed {key}")
+                return
+        alert = None
+        if timings is not None:
+            # forwarded alerts have been queued already
+            alert = (source or self.source, {"queue": time.time(), **timings})
+        self._dispatch(key, embed, webhooks, now, alert)
+
+    def _dispatch(
+        self,
+        key: str,
+        embed: RenderedEmbed,
+        webhooks: Dict[str, Dict[str, Any]],
+        now: datetime,
+        alert: Optional[Tuple[str, Dict[str, float]]] = None,
+    ):
+        if self.use_notifier and os.path.exists(self.notifier_socket):
+            if self._notifier_queue is None:
+                self._notifier_queue = asyncio.Queue()
+                self._notifier_task = asyncio.ensure_future(self._forward_loop())
+            self._notifier_queue.put_nowait((key, embed, webhooks, now, alert))
+        else:
+            self._add_to_senders(key, embed, webhooks, now, alert)
+
+    def _add_to_senders(
+        self,
+        key: str,
+        embed: RenderedEmbed,
+        webhooks: Dict[str, Dict[str, Any]],
+        now: datetime,
+        alert: Optional[Tuple[str, Dict[str, float]]] = None,
+    ):
         for webhook in webhooks:
-            if webhook in self.webhook_senders:
-                self.webhook_senders[webhook].add_to_queue(webhooks[webhook], embed)
-            else:
-                self.webhook_senders[webhook] = WebhookSender(webhook, self.config)
+            if webhook not in self.webhook_senders:
+                self.webhook_senders[webhook] = WebhookSender(
+                    webhook,
+                    self.get_session(),
+                    self.rate_limiter,
+                    self.config,
+                    self.logger,
+                    self.outbox,
+                    self.batch_window,
+                    self.alert_metrics,
+                    self.dead_letters,
+                )
                 self.webhook_senders[webhook].start()
-                self.webhook_senders[webhook].add_to_queue(webhooks[webhook], embed)
+            self.webhook_senders[webhook].add_to_queue(
+                webhooks[webhook], embed, now, key, alert
+            )
+
+    async def _forward_loop(self):
+        """Forward the queued embeds to the notifier, in batches, sending them from here if it can't be reached."""
+        while True:
+            batch = [await self._notifier_queue.get()]
+            while not self._notifier_queue.empty() and len(batch) < NOTIFIER_BATCH_SIZE:
+                batch.append(self._notifier_queue.get_nowait())
+            cmd = Cmd()
+            cmd.cmd = COMMANDS.MM_NOTIFY
+            notifications = []
+            for key, embed, webhooks, now, alert in batch:
+                notification = {
+                    "key": key,
+                    "embed": embed.data,
+                    "webhooks": webhooks,
+                    "time": now.timestamp(),
+                }
+                if alert is not None:
+                    notification["source"], notification["timings"] = alert
+                notifications.append(notification)
+            cmd.payload = notifications
+            try:
+                response = await make_request(self.notifier_socket, cmd)
+                forwarded = not response.error.value
+                if not forwarded:
+                    self.logger.warning(
+                        f"Couldn't forward {len(batch)} embeds to the notifier ({response.error.name}), sending them from here"
+                    )
+            except OSError:
+                self.logger.exception(
+                    f"Couldn't forward {len(batch)} embeds to the notifier, sending them from here:"
+                )
+                forwarded = False
+            for key, embed, webhooks, now, alert in batch:
+                if not forwarded:
+                    self._add_to_senders(key, embed, webhooks, now, alert)
+                elif self.outbox is not None:
+                    # the notifier has its own outbox
+                    for webhook in webhooks:
+                        self.outbox.done(key, webhook)
+                self._notifier_queue.task_done()
@@ -0,0 +1,144 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+
+import pytest
+
+pyppeteer = pytest.importorskip("pyppeteer")
+
+from kekmonitors.utils.browser_pool import BrowserPool
+from kekmonitors.utils.session_store import SessionStore
+
+
+class FakePage(object):
+    def __init__(self):
+        self.closed = False
+        self.urls = []
+        self.url = "about:blank"
+        self.cookies_set = []
+
+    def on(self, event, callback):
+        pass
+
+    async def setRequestInterception(self, value):
+        pass
+
+    async def goto(self, url):
+        self.urls.append(url)
+        self.url = url
+
+    async def cookies(self):
+        return [
+            {
+                "name": "challenge",
+                "value": "solved",
+                "domain": ".example.com",
+                "expires": -1,
+                "session": True,
+            }
+        ]
+
+    async def setCookie(self, *cookies):
+        self.cookies_set.extend(cookies)
+
+    async def setExtraHTTPHeaders(self, headers):
+        pass
+
+    async def setJavaScriptEnabled(self, enabled):
+        pass
+
+    def isClosed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser(object):
+    process = None
+
+    def __init__(self):
+        self.pages = []
+        self.closed = False
+
+    async def newPage(self):
+        page = FakePage()
+        self.pages.append(page)
+        return page
+
+    async def version(self):
+        return "fake"
+
+    async def close(self):
+        self.closed = True
+
+
+def test_browser_pool(monkeypatch):
+    async def launch(**kwargs):
+        return FakeBrowser()
+
+    monkeypatch.setattr(pyppeteer, "launch", launch)
+
+    async def run():
+        pool = BrowserPool(size=2, max_page_uses=3)
+        await pool.start()
+        async with pool.page() as page:
+            await page.goto("https://example.com")
+        # the page is reset and reused
+        assert page.urls == ["https://example.com", "about:blank"]
+        async with pool.page() as same_page:
+            assert same_page is page
+            async with pool.page() as other_page:
+                assert other_page is not page
+                # the pool is full
+                with pytest.raises(asyncio.TimeoutError):
+                    await asyncio.wait_for(pool.acquire(), 0.1)
+        assert pool.get_status()["idle"] == 2
+        # pages which raised are closed
+        with pytest.raises(ValueError):
+            async with pool.page() as page:
+                raise ValueError
+        assert page.closed
+        # and so are the ones used too many times
+        async with pool.page() as page:
+            pass
+        assert not page.closed
+        async with pool.page() as same_page:
+            assert same_page is page
+        assert page.closed
+        old_browser = pool.browser
+        await pool.restart()
+        assert old_browser.closed
+        assert pool.get_status()["idle"] == 0
+        await pool.close()
+
+    asyncio.run(run())
+
+
+def test_browser_pool_session(monkeypatch):
+    async def launch(**kwargs):
+        return FakeBrowser()
+
+    monkeypatch.setattr(pyppeteer, "launch", launch)
+
+    async def run():
+        store = SessionStore()
+        pool = BrowserPool(size=2, session_store=store)
+        await pool.start()
+        async with pool.page() as page:
+            assert page.cookies_set == []
+            await page.goto("https://www.example.com")
+            async with pool.page() as other_page:
+                pass
+        # the cookies of the released page are saved, and set on new pages
+        assert store.get_cookie_header("www.example.com") == "challenge=solved"
+        assert other_page.cookies_set == []
+        pool._idle = []
+        async with pool.page() as new_page:
+            assert [c["name"] for c in new_page.cookies_set] == ["challenge"]
+        await pool.close()
+
+    asyncio.new_event_loop().run_until_complete(run())
@@ -0,0 +1,72 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+
+from kekmonitors.utils.concurrency import AIMDLimiter
+
+
+def test_aimd_update():
+    limiter = AIMDLimiter(initial=4, min_limit=1, max_limit=5)
+    # about `limit` healthy responses are needed to increase the limit by 1
+    for _ in range(5):
+        limiter.update(200, 0.1)
+    assert int(limiter.limit) == 5
+    for _ in range(10):
+        limiter.update(200, 0.1)
+    assert limiter.limit == 5
+
+    limiter.update(429, 0.1)
+    assert limiter.limit == 2.5
+    # a burst of bad responses only counts once
+    limiter.update(429, 0.1)
+    assert limiter.limit == 2.5
+    limiter._last_decrease = 0
+    limiter.update(200, 10)
+    assert limiter.limit == 1.25
+    limiter._last_decrease = 0
+    limiter.update(599, 0.1)
+    assert limiter.limit == 1
+    assert [h["reason"] for h in limiter.history] == [
+        "increase",
+        "429",
+        "latency",
+        "599",
+    ]
+
+
+def test_aimd_acquire():
+    async def run():
+        limiter = AIMDLimiter(initial=2, max_limit=2)
+        max_in_flight = 0
+
+        async def request():
+            nonlocal max_in_flight
+            await limiter.acquire()
+            max_in_flight = max(max_in_flight, limiter.in_flight)
+            await asyncio.sleep(0.01)
+            limiter.release(200, 0.01)
+
+        await asyncio.gather(*[request() for _ in range(10)])
+        assert max_in_flight == 2
+        assert limiter.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_aimd_cancelled_waiter():
+    async def run():
+        limiter = AIMDLimiter(initial=1, max_limit=1)
+        await limiter.acquire()
+        first = asyncio.ensure_future(limiter.acquire())
+        second = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        # the first waiter is woken up, but cancelled before taking the slot
+        limiter.release(200, 0.01)
+        first.cancel()
+        await asyncio.wait_for(second, 1)
+        assert limiter.in_flight == 1
+
+    asyncio.run(run())
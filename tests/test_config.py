@@ -3,11 +3,12 @@ import sys
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import configparser
 import os
 
 import pytest
 
-from kekmonitors.config import Config, LogConfig
+from kekmonitors.config import COMMANDS, Config, LogConfig
 
 
 def _test_new_config(c):
@@ -68,3 +69,21 @@ def test_new_logconfig():
 
 def test_existing_logconfig():
     _test_existing_config_parser(LogConfig)
+
+
+def test_commands_values():
+    # commands are sent as their values: new ones must be added at the end
+    assert COMMANDS.PING.value == 1
+    assert COMMANDS.SET_SPECIFIC_CONFIG.value == 10
+    assert COMMANDS.MM_ADD_MONITOR.value == 18
+    assert COMMANDS.MM_GET_SCRAPER_SHOES.value == 49
+
+
+def test_opt_in_defaults():
+    # features which change what monitors send or write are disabled unless enabled explicitly
+    parser = configparser.RawConfigParser()
+    parser.read_string(Config().default_config_str)
+    assert parser["NetworkConfig"]["sessions"] == "False"
+    assert parser["NetworkConfig"]["header_profiles"] == "False"
+    assert parser["WebhookConfig"]["use_notifier"] == "False"
+    assert parser["WebhookConfig"]["outbox"] == "False"
@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import time
+
+from kekmonitors.utils.discord_rate_limits import DiscordRateLimiter
+
+
+def test_buckets():
+    limiter = DiscordRateLimiter()
+    headers = {
+        "x-ratelimit-bucket": "shared",
+        "x-ratelimit-limit": "5",
+        "x-ratelimit-remaining": "1",
+        "x-ratelimit-reset-after": "0.2",
+    }
+    assert limiter.update("a", 204, headers)
+    assert limiter.update("b", 204, headers)
+    assert not limiter.update("c", 204, {})
+    assert limiter.get_status()["webhooks"] == {"a": "shared", "b": "shared"}
+
+    async def run():
+        start = time.monotonic()
+        # one request left in the shared bucket: the second one waits for the reset
+        await limiter.acquire("a")
+        assert time.monotonic() - start < 0.05
+        await limiter.acquire("b")
+        assert time.monotonic() - start > 0.15
+        # other buckets are not affected
+        start = time.monotonic()
+        await limiter.acquire("c")
+        assert time.monotonic() - start < 0.05
+
+    asyncio.new_event_loop().run_until_complete(run())
+
+
+def test_429():
+    limiter = DiscordRateLimiter()
+
+    async def run():
+        # only Retry-After
+        assert limiter.update("a", 429, {"retry-after": "0.1"})
+        start = time.monotonic()
+        await limiter.acquire("a")
+        assert time.monotonic() - start > 0.08
+        await limiter.acquire("b")
+        # global, from the body
+        assert limiter.update("a", 429, {}, b'{"retry_after": 0.1, "global": true}')
+        start = time.monotonic()
+        await limiter.acquire("b")
+        assert time.monotonic() - start > 0.08
+        assert limiter.rate_limited == 2
+
+    asyncio.new_event_loop().run_until_complete(run())
@@ -0,0 +1,53 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import socket
+import time
+
+from kekmonitors.utils.dns_cache import DNSCache
+
+
+class FakeDNSCache(DNSCache):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queries = 0
+        self.fail = False
+
+    async def _query(self, host):
+        self.queries += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise socket.gaierror("failed")
+        self._entries[host] = (["10.0.0.1"], time.monotonic(), 0.4)
+        return ["10.0.0.1"]
+
+
+def test_dns_cache():
+    async def run():
+        cache = FakeDNSCache()
+        assert await cache.resolve("127.0.0.1") == ["127.0.0.1"]
+        # concurrent lookups share the same query
+        results = await asyncio.gather(
+            *[cache.resolve("example.com") for _ in range(5)]
+        )
+        assert results == [["10.0.0.1"]] * 5
+        assert cache.queries == 1
+        assert await cache.resolve("example.com") == ["10.0.0.1"]
+        assert cache.hits == 1
+        # close to the expiry the entry is refreshed in the background
+        await asyncio.sleep(0.34)
+        assert await cache.resolve("example.com") == ["10.0.0.1"]
+        await asyncio.sleep(0.02)
+        assert cache.queries == 2
+        assert cache.refreshes == 1
+        # expired entries are still used if the resolver fails
+        await asyncio.sleep(0.5)
+        cache.fail = True
+        assert await cache.resolve("example.com") == ["10.0.0.1"]
+        assert cache.hits == 2
+        assert cache.misses == 6
+
+    asyncio.run(run())
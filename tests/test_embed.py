@@ -0,0 +1,135 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from datetime import datetime, timezone
+
+from kekmonitors import discord_embeds, shoe_stuff
+from kekmonitors.shoe_stuff import Shoe
+from kekmonitors.utils.embed import Embed
+
+
+def test_embed():
+    embed = Embed(title="title", url="url", description="description", color=5)
+    embed.timestamp = datetime(2021, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    embed.set_thumbnail(url="thumbnail")
+    embed.add_field(name="name", value=3, inline=False)
+    embed.add_field(name="other", value="value")
+    embed.set_footer(text="footer", icon_url="icon")
+    embed.set_author(name="author")
+    # same as discord.py
+    assert embed.to_dict() == {
+        "type": "rich",
+        "title": "title",
+        "description": "description",
+        "url": "url",
+        "color": 5,
+        "timestamp": "2021-01-02T03:04:05+00:00",
+        "fields": [
+            {"name": "name", "value": "3", "inline": False},
+            {"name": "other", "value": "value", "inline": True},
+        ],
+        "footer": {"text": "footer", "icon_url": "icon"},
+        "thumbnail": {"url": "thumbnail"},
+        "author": {"name": "author"},
+    }
+    assert len(embed) == len("titledescriptionname3othervaluefooterauthor")
+    assert Embed.from_dict(embed.to_dict()).to_dict() == embed.to_dict()
+    assert Embed().to_dict() == {"type": "rich"}
+    embed.set_thumbnail(url=None)
+    assert "thumbnail" not in embed.to_dict()
+
+
+def test_discord_embeds():
+    shoe = Shoe()
+    shoe.name = "Shoe"
+    shoe.link = "https://www.example.com/shoe"
+    shoe.img_link = "https://www.example.com/shoe.jpg"
+    shoe.price = "100€"
+    shoe.reason = shoe_stuff.RESTOCK
+    shoe.sizes = {
+        "42": {"available": True, "atc": "https://www.example.com/atc/42"},
+        "43": {"available": False},
+    }
+    data = discord_embeds.get_default_embed(shoe).to_dict()
+    assert data["title"] == "Shoe"
+    assert data["thumbnail"] == {"url": shoe.img_link}
+    assert data["fields"][0] == {
+        "name": "Notification type",
+        "value": "Restock",
+        "inline": False,
+    }
+    assert (
+        data["fields"][-1]["value"] == "42 - [[ATC]](https://www.example.com/atc/42)\n"
+    )
+
+    data = discord_embeds.get_scraper_embed(shoe, "Example").to_dict()
+    assert data["title"] == "New item scraped on Example: Shoe"
+
+    data = discord_embeds.get_mm_crash_embed("Monitor", -9, 1234).to_dict()
+    assert "timestamp" not in data
+    assert data["fields"][1] == {"name": "PID: ", "value": "1234", "inline": True}
+
+
+def test_get_valid_values():
+    assert discord_embeds.get_valid_values([], 6) == []
+    assert discord_embeds.get_valid_values(["1", "2"], 6) == ["1\n2\n"]
+    # at most max_elements per field, without losing the last one
+    values = [str(i) for i in range(7)]
+    assert discord_embeds.get_valid_values(values, 6) == ["0\n1\n2\n3\n4\n5\n", "6\n"]
+    # within 1024 chars
+    values = ["a" * 300, "b" * 300, "c" * 300, "d" * 300]
+    assert discord_embeds.get_valid_values(values, 6) == [
+        "\n".join(values[:3]) + "\n",
+        values[3] + "\n",
+    ]
+    long = "a" * 1100
+    assert discord_embeds.get_valid_values(["1", long, "2"], 6) == [
+        "1\n",
+        long + "\n",
+        "2\n",
+    ]
+
+
+def test_get_size_line():
+    size = {
+        "available": True,
+        "stock": 3,
+        "atc": "atc",
+        "quick_tasks": {"qt1": "link1", "qt2": "link2"},
+        "other": [{"name": "other", "link": "link"}, {"name": "no link"}],
+    }
+    line = (
+        "42 (3) - [[ATC]](atc) - [qt1](link1) - [qt2](link2) - [other](link) - no link"
+    )
+    assert discord_embeds.get_size_line("42", size) == line
+    # cached by content
+    hits = discord_embeds._render_size_line.cache_info().hits
+    assert discord_embeds.get_size_line("42", dict(size)) == line
+    assert discord_embeds._render_size_line.cache_info().hits == hits + 1
+    size["stock"] = 2
+    assert discord_embeds.get_size_line("42", size).startswith("42 (2) - ")
+    assert discord_embeds.get_size_line("42", {"available": True}) == "42"
+
+
+def test_get_size_line_unhashable():
+    class Link(str):
+        # defining __eq__ makes it unhashable, like any value which can't be cached
+        def __eq__(self, other):
+            return str.__eq__(self, other)
+
+        __hash__ = None
+
+    link = Link("https://www.example.com/atc")
+    size_info = {
+        "available": True,
+        "atc": link,
+        "quick_tasks": {"QT": link},
+        "other": [{"name": "Other", "link": link}],
+    }
+    for _ in range(2):
+        assert discord_embeds.get_size_line("42", size_info) == (
+            "42 - [[ATC]](https://www.example.com/atc) - "
+            "[QT](https://www.example.com/atc) - [Other](https://www.example.com/atc)"
+        )
@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from kekmonitors.utils.header_profiles import (
+    DEFAULT_PROFILES,
+    HeaderProfile,
+    HeaderProfilePool,
+)
+
+
+def test_header_profile():
+    profile = HeaderProfile(
+        {"User-Agent": "test", "Pragma": "no-cache", "Cookie": "a=b"}, has_brotli=True
+    )
+    assert profile.headers == {
+        "user-agent": "test",
+        "accept-encoding": "gzip, deflate, br",
+    }
+    profile.get_headers()["user-agent"] = "changed"
+    assert profile.headers["user-agent"] == "test"
+    with pytest.raises(ValueError):
+        HeaderProfile({"accept": "*/*"})
+
+
+def test_header_profile_pool():
+    pool = HeaderProfilePool()
+    assert len(pool) == len(DEFAULT_PROFILES)
+    profile = pool.get_profile("1.2.3.4:8080")
+    # sticky: the same profile for the same proxy...
+    assert all(pool.get_profile("1.2.3.4:8080") is profile for _ in range(10))
+    # ...until it's flagged
+    pool.record(profile, 200, "1.2.3.4:8080")
+    assert pool.get_profile("1.2.3.4:8080") is profile
+    pool.record(profile, 403, "1.2.3.4:8080")
+    assert profile.failures == 1
+    assert "1.2.3.4:8080" not in pool.get_status()["bindings"]
+
+    # reloading the same profiles keeps the bindings
+    profile = pool.get_profile("host")
+    uses = profile.uses
+    pool.update(DEFAULT_PROFILES)
+    assert pool.get_profile("host", use=False) is profile
+    assert profile.uses == uses
+    pool.update(DEFAULT_PROFILES[:1])
+    assert pool.get_status()["bindings"] == {}
+
+    pool = HeaderProfilePool(rotation="round_robin")
+    assert [pool.get_profile("host") for _ in range(len(pool))] == pool.profiles
+
+    with pytest.raises(ValueError):
+        pool.update([])
+    with pytest.raises(ValueError):
+        HeaderProfilePool(rotation="unknown")
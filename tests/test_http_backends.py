@@ -0,0 +1,174 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import http.server
+import socket
+import threading
+from datetime import datetime
+
+import pytest
+from tornado.httpclient import HTTPClientError
+
+from kekmonitors.utils.dns_cache import DNSCache
+from kekmonitors.utils.http_backends import BACKENDS, get_backend
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        code = 404 if self.path == "/404" else 200
+        body = (self.headers.get("If-Modified-Since") or "body").encode()
+        if self.path == "/big":
+            body = b"<title>big</title>" + b"a" * 10 * 1024 * 1024
+        self.send_response(code)
+        self.send_header("content-length", str(len(body)))
+        self.send_header("x-test", "test")
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except ConnectionError:
+            # the client aborted the transfer
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+@pytest.mark.parametrize("name", list(BACKENDS))
+def test_backend(name, server_url):
+    async def run():
+        backend = get_backend(name)
+        try:
+            response = await backend.fetch(server_url)
+            assert response.code == 200
+            assert response.body == b"body"
+            assert response.headers["x-test"] == "test"
+
+            response = await backend.fetch(
+                server_url, if_modified_since=datetime(2021, 1, 1)
+            )
+            assert response.body == b"Fri, 01 Jan 2021 00:00:00 GMT"
+
+            response = await backend.fetch(server_url + "/404", raise_error=False)
+            assert response.code == 404
+            with pytest.raises(HTTPClientError):
+                await backend.fetch(server_url + "/404")
+
+            with pytest.raises(HTTPClientError) as e:
+                await backend.fetch("http://127.0.0.1:1", raise_error=False)
+            assert e.value.code == 599
+        finally:
+            await backend.close()
+
+    asyncio.run(run())
+
+
+class FakeDNSCache(DNSCache):
+    async def _query(self, host):
+        if host != "kekmonitors.test":
+            raise socket.gaierror(f"Unknown host {host}")
+        return ["127.0.0.1"]
+
+
+@pytest.mark.parametrize("name", list(BACKENDS))
+def test_backend_dns_cache(name, server_url):
+    async def run():
+        dns_cache = FakeDNSCache()
+        backend = get_backend(name, dns_cache=dns_cache)
+        try:
+            url = server_url.replace("127.0.0.1", "kekmonitors.test")
+            response = await backend.fetch(url)
+            assert response.code == 200
+            assert dns_cache.misses == 1
+        finally:
+            await backend.close()
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("name", list(BACKENDS))
+def test_backend_stream(name, server_url):
+    async def run():
+        backend = get_backend(name)
+        try:
+            chunks = []
+            response = await backend.stream(
+                server_url, lambda chunk: chunks.append(chunk)
+            )
+            assert response.code == 200
+            assert not response.aborted
+            assert response.headers["x-test"] == "test"
+            assert b"".join(chunks) == b"body"
+
+            received = []
+            response = await backend.stream(
+                server_url + "/big", lambda chunk: not received.append(len(chunk))
+            )
+            assert response.code == 200
+            assert response.aborted
+            assert response.headers["x-test"] == "test"
+            assert sum(received) < 1024 * 1024
+
+            received = []
+            response = await backend.stream(
+                server_url + "/404", lambda chunk: not received.append(len(chunk))
+            )
+            assert response.code == 404
+            assert not received
+        finally:
+            await backend.close()
+
+    asyncio.run(run())
+
+
+def test_curl_stream_http2():
+    # curl reports http/2 responses with a status line like `HTTP/2 404`
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen()
+
+    def serve():
+        for code in (b"200", b"404"):
+            connection, _ = sock.accept()
+            connection.recv(65536)
+            connection.sendall(
+                b"HTTP/2 " + code + b"\r\ncontent-length: 4\r\nx-test: test\r\n\r\nbody"
+            )
+            connection.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    url = f"http://127.0.0.1:{sock.getsockname()[1]}/"
+
+    async def run():
+        backend = get_backend("curl")
+        try:
+            chunks = []
+            response = await backend.stream(url, lambda chunk: chunks.append(chunk))
+            assert response.code == 200
+            assert not response.aborted
+            assert response.headers["x-test"] == "test"
+            assert b"".join(chunks) == b"body"
+
+            chunks = []
+            response = await backend.stream(url, lambda chunk: chunks.append(chunk))
+            assert response.code == 404
+            assert not chunks
+        finally:
+            await backend.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        sock.close()
@@ -0,0 +1,79 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from kekmonitors.utils.metrics import (
+    AlertMetrics,
+    Histogram,
+    HostMetrics,
+    merge_alert_metrics,
+    merge_metrics,
+)
+
+
+def test_histogram():
+    histogram = Histogram([0.1, 1, 10])
+    assert histogram.get_percentile(0.5) is None
+    for value in (0.05, 0.05, 0.5, 5, 50):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1, 1]
+    assert histogram.get_percentile(0.4) == 0.1
+    assert histogram.get_percentile(0.5) == 1
+    assert histogram.get_percentile(1) == 10
+
+
+def test_merge_metrics():
+    a = HostMetrics()
+    a.record_response(200, 100, 0.01, 0.2)
+    a.record_response(304, 0, 0.01, 0.05)
+    b = HostMetrics()
+    b.record_response(599, 0, 0.5, 20)
+    b.retries += 1
+    merged = merge_metrics(
+        [
+            {"example.com": a.get_status()},
+            {"example.com": b.get_status(), "other.com": HostMetrics().get_status()},
+        ]
+    )
+    host = merged["example.com"]
+    assert host["requests"] == 3
+    assert host["bytes_in"] == 100
+    assert host["codes"] == {"200": 1, "304": 1, "599": 1}
+    assert host["not_modified_ratio"] == 1 / 3
+    assert host["timeouts"] == 1
+    assert host["retries"] == 1
+    assert host["latency"]["count"] == 3
+    assert host["queue_time_p50"] == 0.01
+    assert merged["other.com"]["requests"] == 0
+    assert merged["other.com"]["latency_p50"] is None
+
+
+def test_alert_metrics():
+    metrics = AlertMetrics()
+    metrics.record(
+        {
+            "fetch": 100.0,
+            "parse": 100.004,
+            "diff": 100.02,
+            "queue": 100.03,
+            "send": 100.4,
+            "ack": 100.6,
+        }
+    )
+    # no response, e.g. a page loaded with the browser
+    metrics.record({"parse": 200.0, "diff": 200.001, "queue": 200.002, "ack": 201.0})
+    status = metrics.get_status()
+    assert status["alerts"] == 2
+    assert status["parse"]["count"] == 1
+    assert status["parse_p50"] == 0.005
+    assert status["send_p50"] == 0.5
+    # the ack without a send follows the queue
+    assert status["ack"]["count"] == 2
+    assert status["total"]["count"] == 2
+    assert status["total_p99"] == 1.0
+
+    merged = merge_alert_metrics([status, AlertMetrics().get_status()])
+    assert merged["alerts"] == 2
+    assert merged["total"]["counts"] == status["total"]["counts"]
+    assert merged["total_p99"] == 1.0
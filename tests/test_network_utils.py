@@ -0,0 +1,384 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import http.server
+import socket
+import threading
+import time
+from collections import deque
+from io import BytesIO
+
+import pytest
+from tornado.httpclient import HTTPRequest, HTTPResponse
+
+from kekmonitors.utils.header_profiles import HeaderProfilePool
+from kekmonitors.utils.network_utils import UNCHANGED, NetworkUtils, get_host
+from kekmonitors.utils.session_store import SessionStore
+from kekmonitors.utils.warmup import DONE, SCHEDULED, Warmup
+
+
+def get_response(url, code, body=b""):
+    return HTTPResponse(HTTPRequest(url), code, buffer=BytesIO(body))
+
+
+@pytest.fixture
+def network_utils():
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    return NetworkUtils("Test")
+
+
+def test_is_unchanged(network_utils):
+    url = "https://example.com"
+    assert not network_utils.is_unchanged(url, get_response(url, 200, b"body"))
+    assert network_utils.is_unchanged(url, get_response(url, 200, b"body"))
+    assert not network_utils.is_unchanged(url, get_response(url, 200, b"new body"))
+    assert network_utils.is_unchanged(url, get_response(url, 304))
+    assert not network_utils.is_unchanged(url, get_response(url, 500, b"new body"))
+    # other urls don't interfere
+    assert not network_utils.is_unchanged(
+        "https://example.com/other", get_response(url, 200, b"new body")
+    )
+
+
+def test_warmup(network_utils):
+    heads = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_HEAD(self):
+            heads.append(self.path)
+            self.send_response(200)
+            self.send_header("content-length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+
+    async def run():
+        assert not network_utils.schedule_warmup(Warmup([url], time.time() - 10, 0, 1))
+        warmup = Warmup([url], time.time() + 0.2, lead=0.1, window=0.3, interval=0.1)
+        assert network_utils.schedule_warmup(warmup)
+        assert warmup.state == SCHEDULED
+        await asyncio.sleep(0.05)
+        assert not heads
+        await asyncio.sleep(0.6)
+        assert warmup.state == DONE
+        assert 3 <= len(heads) <= 6
+        await network_utils.close_network()
+
+    try:
+        network_utils.asyncio_loop.run_until_complete(run())
+    finally:
+        server.shutdown()
+
+
+def test_session_cookies(network_utils):
+    cookies = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            cookies.append(self.headers.get("Cookie"))
+            self.send_response(200)
+            self.send_header("set-cookie", "challenge=solved; Max-Age=60")
+            self.send_header("content-length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+    # don't save the cookies in the real config folder
+    network_utils.session_store = SessionStore()
+
+    async def run():
+        await network_utils.fetch(url, use_cache=False)
+        await network_utils.fetch(url, use_cache=False)
+        await network_utils.fetch(url, use_cache=False, use_session=False)
+        await network_utils.fetch(url, use_cache=False, headers={"Cookie": "a=b"})
+        await network_utils.close_network()
+
+    try:
+        network_utils.asyncio_loop.run_until_complete(run())
+    finally:
+        server.shutdown()
+    assert cookies == [None, "challenge=solved", None, "a=b"]
+
+
+def test_rate_limits(network_utils):
+    network_utils.shared_rate_limits = False
+    network_utils.set_rate_limits(
+        {"example.com": 10, "other.com": {"rate": 1, "burst": 5}}
+    )
+    assert network_utils.get_rate_limiter("www.example.com:443").rate == 10
+    assert network_utils.get_rate_limiter("other.com").burst == 5
+    assert network_utils.get_rate_limiter("example.org") is None
+    # invalid limits are ignored
+    network_utils.set_rate_limits({"example.com": -1})
+    assert network_utils.get_rate_limiter("example.com").rate == 10
+    bucket = network_utils.get_rate_limiter("example.com")
+    network_utils.set_rate_limits({"example.com": 5})
+    assert network_utils.get_rate_limiter("example.com") is bucket
+    assert bucket.rate == 5
+    assert network_utils.get_rate_limiter("other.com") is None
+
+
+def test_header_profiles(network_utils):
+    user_agents = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            user_agents.append(self.headers.get("User-Agent"))
+            self.send_response(200)
+            self.send_header("content-length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+    # disabled by default
+    assert network_utils.header_profiles is None
+    assert network_utils.get_profile_headers(url) == {}
+    network_utils.header_profiles = HeaderProfilePool()
+    network_utils.set_header_profiles([{"User-Agent": "profile"}])
+
+    async def run():
+        await network_utils.fetch(url, use_cache=False)
+        # an explicit user-agent disables the profile
+        await network_utils.fetch(url, use_cache=False, headers={"user-agent": "own"})
+        await network_utils.close_network()
+
+    try:
+        network_utils.asyncio_loop.run_until_complete(run())
+    finally:
+        server.shutdown()
+    assert user_agents == ["profile", "own"]
+    assert network_utils.get_profile_headers(url)["user-agent"] == "profile"
+    # only the requests count as uses
+    assert network_utils.header_profiles.get_status()["profiles"][0]["uses"] == 1
+
+
+def start_hedging_server(delay, name="", requests=None):
+    """Start a server (usable also as a proxy) which waits `delay` seconds before answering the first request for every path
+    in `requests`, and answers the following ones immediately. Return the server and `requests`, the (name, path) of the requests."""
+    if requests is None:
+        requests = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            path = self.path.split("/", 3)[-1] if "://" in self.path else self.path
+            first = all(seen != path for _, seen in requests)
+            requests.append((name, path))
+            if first:
+                time.sleep(delay)
+            self.send_response(200)
+            self.send_header("content-length", str(len(name)))
+            self.end_headers()
+            self.wfile.write(name.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, requests
+
+
+def setup_hedging(network_utils, url, latency=0.02, samples=100):
+    network_utils.hedging_max_ratio = 1
+    network_utils.hedging_min_samples = 20
+    network_utils._latencies[get_host(url)] = deque([latency] * samples, maxlen=samples)
+
+
+def test_hedging_min_samples(network_utils):
+    server, requests = start_hedging_server(0.3)
+    url = f"http://127.0.0.1:{server.server_port}/min_samples"
+    setup_hedging(network_utils, url, samples=19)
+
+    async def run():
+        response = await network_utils.fetch(url, use_cache=False, hedge=True)
+        assert response.code == 200
+        await network_utils.close_network()
+
+    try:
+        network_utils.asyncio_loop.run_until_complete(run())
+    finally:
+        server.shutdown()
+    assert len(requests) == 1
+    assert network_utils.get_host_metrics(get_host(url)).hedges == 0
+
+
+def test_hedging(network_utils):
+    server, requests = start_hedging_server(1)
+    url = f"http://127.0.0.1:{server.server_port}/hedge"
+    setup_hedging(network_utils, url)
+
+    async def run():
+        start = time.monotonic()
+        response = await network_utils.fetch(url, use_cache=False, hedge=True)
+        assert response.code == 200
+        # the hedge has been answered first
+        assert time.monotonic() - start < 0.5
+        await asyncio.sleep(0.01)
+        # and the first request has been cancelled
+        current = asyncio.current_task()
+        assert all(task.done() for task in asyncio.all_tasks() if task is not current)
+        await network_utils.close_network()
+
+    try:
+        network_utils.asyncio_loop.run_until_complete(run())
+    finally:
+        server.shutdown()
+    assert len(requests) == 2
+    metrics = network_utils.get_host_metrics(get_host(url))
+    assert metrics.hedges == 1
+    # the cancelled request is not recorded
+    assert metrics.requests == 1
+
+
+def test_hedging_budget(network_utils):
+    server, requests = start_hedging_server(0.2)
+    url = f"http://127.0.0.1:{server.server_port}/budget"
+    setup_hedging(network_utils, url)
+    network_utils.hedging_max_ratio = 0.5
+
+    async def run():
+        for i in range(4):
+            await network_utils.fetch(f"{url}/{i}", use_cache=False, hedge=True)
+        await network_utils.close_network()
+
+    try:
+        network_utils.asyncio_loop.run_until_complete(run())
+    finally:
+        server.shutdown()
+    assert network_utils.get_host_metrics(get_host(url)).hedges == 2
+    assert len(requests) == 6
+
+
+def test_hedging_proxy(network_utils):
+    target, _ = start_hedging_server(0)
+    # shared, so that the hedge is fast even through another proxy
+    requests = []
+    proxies = [
+        start_hedging_server(1, name, requests)[0] for name in ("first", "second")
+    ]
+    url = f"http://127.0.0.1:{target.server_port}/proxy"
+    setup_hedging(network_utils, url)
+    network_utils.set_proxies([f"127.0.0.1:{proxy.server_port}" for proxy in proxies])
+
+    async def run():
+        response = await network_utils.fetch(url, use_cache=False, hedge=True)
+        assert response.code == 200
+        await network_utils.close_network()
+        return response.body.decode()
+
+    try:
+        winner = network_utils.asyncio_loop.run_until_complete(run())
+    finally:
+        target.shutdown()
+        for proxy in proxies:
+            proxy.shutdown()
+    # one request through each proxy, the hedge won
+    assert sorted(name for name, _ in requests) == ["first", "second"]
+    assert winner == requests[1][0]
+
+
+def test_hedging_rate_limited(network_utils):
+    server, requests = start_hedging_server(0)
+    url = f"http://127.0.0.1:{server.server_port}/rate_limited"
+    setup_hedging(network_utils, url, latency=0.01)
+    network_utils.shared_rate_limits = False
+    network_utils.set_rate_limits({"127.0.0.1": {"rate": 2, "burst": 1}})
+
+    async def run():
+        await asyncio.gather(
+            *[
+                network_utils.fetch(f"{url}/{i}", use_cache=False, hedge=True)
+                for i in range(6)
+            ]
+        )
+        await network_utils.close_network()
+
+    try:
+        network_utils.asyncio_loop.run_until_complete(run())
+    finally:
+        server.shutdown()
+    # waiting for the rate limiter doesn't count as latency
+    assert network_utils.get_host_metrics(get_host(url)).hedges == 0
+    assert len(requests) == 6
+
+
+def test_fetched_at(network_utils):
+    slow, _ = start_hedging_server(0.3)
+    fast, _ = start_hedging_server(0)
+
+    async def run():
+        start = time.time()
+        responses = await asyncio.gather(
+            network_utils.fetch(
+                f"http://127.0.0.1:{slow.server_port}/", use_cache=False
+            ),
+            network_utils.fetch(
+                f"http://127.0.0.1:{fast.server_port}/", use_cache=False
+            ),
+        )
+        await network_utils.close_network()
+        return start, responses
+
+    try:
+        start, (
+            slow_response,
+            fast_response,
+        ) = network_utils.asyncio_loop.run_until_complete(run())
+    finally:
+        slow.shutdown()
+        fast.shutdown()
+    # every response has its own time, even if fetched concurrently
+    assert start <= fast_response.fetched_at < start + 0.2
+    assert slow_response.fetched_at >= start + 0.3
+
+
+def test_skip_unchanged(network_utils):
+    server, _ = start_hedging_server(0)
+    url = f"http://127.0.0.1:{server.server_port}/"
+    # a port nothing is listening on
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    closed = f"http://127.0.0.1:{sock.getsockname()[1]}/"
+    sock.close()
+
+    async def run():
+        first = await network_utils.fetch(url, use_cache=False, skip_unchanged=True)
+        second = await network_utils.fetch(url, use_cache=False, skip_unchanged=True)
+        failed = await network_utils.fetch(
+            closed, use_cache=False, attempts=1, skip_unchanged=True
+        )
+        await network_utils.close_network()
+        return first, second, failed
+
+    try:
+        first, second, failed = network_utils.asyncio_loop.run_until_complete(run())
+    finally:
+        server.shutdown()
+    assert first.code == 200 and not first.unchanged
+    assert second is UNCHANGED
+    # a failure is still distinguishable from an unchanged page
+    assert failed is None
@@ -0,0 +1,55 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from kekmonitors.utils.outbox import Outbox
+
+
+def test_outbox(tmp_path):
+    path = str(tmp_path / "outbox" / "Test.jsonl")
+    outbox = Outbox(path)
+    outbox.load()
+    webhooks = {"a": {}, "b": {"custom": {"color": 1}}}
+    assert outbox.add("1", {"title": "1"}, webhooks, 1.0)
+    assert outbox.add("2", {"title": "2"}, {"a": {}}, 2.0)
+    # idempotent
+    assert not outbox.add("1", {"title": "1"}, webhooks, 1.0)
+    outbox.done("1", "a")
+    outbox.done("2", "a")
+    assert len(outbox) == 1
+    outbox.close()
+    # a crash while writing
+    with open(path, "a") as f:
+        f.write('{"op": "done", "key": "1", "webh')
+
+    outbox = Outbox(path)
+    outbox.load()
+    # only the webhooks it has not been sent to yet
+    assert list(outbox) == [
+        ("1", {"embed": {"title": "1"}, "webhooks": {"b": webhooks["b"]}, "time": 1.0})
+    ]
+    # already sent
+    assert not outbox.add("2", {"title": "2"}, {"a": {}}, 2.0)
+    outbox.done("1", "b")
+    assert len(outbox) == 0
+    assert outbox.get_status() == {"pending": 0, "pending_webhooks": 0}
+    outbox.close()
+
+
+def test_outbox_compaction(tmp_path):
+    path = str(tmp_path / "Test.jsonl")
+    outbox = Outbox(path, max_seen=5, compact_every=10)
+    for i in range(20):
+        outbox.add(str(i), {}, {"a": {}}, 0.0)
+        if i != 19:
+            outbox.done(str(i), "a")
+    outbox.close()
+    with open(path) as f:
+        lines = f.readlines()
+    # 39 lines without compaction
+    assert len(lines) < 20
+    outbox = Outbox(path)
+    outbox.load()
+    assert [key for key, _ in outbox] == ["19"]
+    assert "18" in outbox and "0" not in outbox
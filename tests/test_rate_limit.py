@@ -0,0 +1,78 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import time
+
+from kekmonitors.utils.rate_limit import SharedTokenBucket, TokenBucket
+
+
+def test_token_bucket():
+    async def run():
+        bucket = TokenBucket(20, burst=2)
+        start = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        # 2 right away, then one every 50ms
+        elapsed = time.monotonic() - start
+        assert 0.18 < elapsed < 0.35
+        assert bucket.acquired == 6
+        granted, wait = bucket.grant(5)
+        assert granted == 0 and 0 < wait <= 0.05
+        bucket.set_rate(1000, 5)
+        await asyncio.sleep(0.01)
+        assert bucket.grant(10)[0] == 5
+
+    asyncio.new_event_loop().run_until_complete(run())
+
+
+def test_shared_token_bucket():
+    owner = TokenBucket(20, burst=1)
+    leases = []
+
+    async def lease(tokens):
+        leases.append(tokens)
+        return owner.grant(tokens)
+
+    failed_leases = []
+
+    async def no_owner(tokens):
+        failed_leases.append(tokens)
+        return None
+
+    async def run():
+        # two processes sharing the same owner get 20 tokens per second between them
+        first = SharedTokenBucket(1000, 1, lease)
+        second = SharedTokenBucket(1000, 1, lease)
+        start = time.monotonic()
+        await asyncio.gather(
+            *[bucket.acquire() for bucket in (first, second) for _ in range(3)]
+        )
+        elapsed = time.monotonic() - start
+        assert 0.2 < elapsed < 0.4
+        assert first.shared
+        # without the owner the local bucket is used
+        alone = SharedTokenBucket(20, 1, no_owner)
+        start = time.monotonic()
+        for _ in range(3):
+            await alone.acquire()
+        assert 0.08 < time.monotonic() - start < 0.2
+        assert not alone.shared
+        # the owner isn't asked again until fallback_time has passed
+        assert len(failed_leases) == 1
+        alone._fallback_until = 0
+        await alone.acquire()
+        assert len(failed_leases) == 2
+
+        # tokens are leased in batches
+        leases.clear()
+        owner.set_rate(1000, burst=10)
+        await asyncio.sleep(0.02)
+        batched = SharedTokenBucket(1000, 10, lease)
+        for _ in range(10):
+            await batched.acquire()
+        assert leases == [10]
+
+    asyncio.new_event_loop().run_until_complete(run())
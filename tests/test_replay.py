@@ -0,0 +1,69 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import gzip
+from io import BytesIO
+
+import pytest
+from tornado.httpclient import HTTPClientError, HTTPRequest, HTTPResponse
+
+from kekmonitors.utils.http_backends import HTTPBackend
+from kekmonitors.utils.replay import RecordingBackend, ReplayBackend
+from kekmonitors.utils.stream_parser import TagExtractor
+
+
+class FakeBackend(HTTPBackend):
+    def __init__(self):
+        super().__init__()
+        self.requests = 0
+
+    async def fetch(self, url, raise_error=True, **kwargs):
+        self.requests += 1
+        if url.endswith("/down"):
+            raise HTTPClientError(599, "Timeout")
+        body = f"<title>{self.requests}</title>".encode()
+        response = HTTPResponse(HTTPRequest(url), 200, buffer=BytesIO(body))
+        response.headers["x-test"] = "test"
+        return response
+
+
+def test_record_replay(tmp_path):
+    path = str(tmp_path / "archive.jsonl.gz")
+
+    async def run():
+        recorder = RecordingBackend(FakeBackend(), path)
+        for _ in range(2):
+            await recorder.fetch("https://example.com/")
+        with pytest.raises(HTTPClientError):
+            await recorder.fetch("https://example.com/down")
+        # readable before closing, e.g. if the process crashes
+        assert len(ReplayBackend(path)) == 3
+        await recorder.close()
+
+        replay = ReplayBackend(path)
+        assert len(replay) == 3
+        bodies = [(await replay.fetch("https://example.com/")).body for _ in range(3)]
+        assert bodies == [b"<title>1</title>", b"<title>2</title>", b"<title>1</title>"]
+        response = await replay.fetch("https://example.com/")
+        assert response.code == 200
+        assert response.headers["x-test"] == "test"
+        for url in ("https://example.com/down", "https://example.com/other"):
+            with pytest.raises(HTTPClientError):
+                await replay.fetch(url)
+
+        extractor = TagExtractor()
+        extractor.add_target("title", "title")
+        response = await replay.stream("https://example.com/", extractor.feed)
+        assert response.aborted
+        assert extractor.results["title"]["text"] == "1"
+
+    asyncio.run(run())
+    # a truncated archive is still readable
+    with gzip.open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(gzip.compress(data)[:-20])
+    assert len(ReplayBackend(path)) >= 1
@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+
+from kekmonitors.utils.retry import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, RetryPolicy
+
+
+def test_retry_policy_delay():
+    policy = RetryPolicy(max_delay=10, multiplier=2, jitter=0)
+    assert policy.get_delay(1, 0) == 1
+    assert policy.get_delay(1, 2) == 4
+    assert policy.get_delay(1, 10) == 10
+
+    policy = RetryPolicy(max_delay=10, multiplier=2, jitter=0.5)
+    for _ in range(100):
+        assert 2 <= policy.get_delay(1, 2) <= 4
+
+
+def test_retry_policy_budget():
+    policy = RetryPolicy(budget_ratio=0.5, budget_max=2)
+    assert policy.can_retry()
+    assert policy.can_retry()
+    assert not policy.can_retry()
+    policy.on_request()
+    assert not policy.can_retry()
+    policy.on_request()
+    assert policy.can_retry()
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(threshold=2, timeout=0.05)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+    time.sleep(0.05)
+    # only one probe is allowed when half open
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    time.sleep(0.05)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
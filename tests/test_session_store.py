@@ -0,0 +1,70 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+
+from kekmonitors.utils.session_store import SessionStore
+
+
+def test_session_store(tmp_path):
+    path = str(tmp_path / "sessions" / "Test.json")
+    store = SessionStore(path, session_ttl=60)
+    # format of pyppeteer's page.cookies()
+    store.set_browser_cookies(
+        [
+            {
+                "name": "challenge",
+                "value": "solved",
+                "domain": ".example.com",
+                "path": "/",
+                "expires": time.time() + 100,
+                "secure": True,
+                "session": False,
+            },
+            {
+                "name": "sid",
+                "value": "1",
+                "domain": "www.example.com",
+                "path": "/",
+                "expires": -1,
+                "secure": False,
+                "session": True,
+            },
+        ]
+    )
+    assert store.has_valid_session("www.example.com", ["challenge", "sid"])
+    assert store.has_valid_session("example.com", ["challenge"])
+    assert not store.has_valid_session("example.com", ["sid"])
+    assert not store.has_valid_session("other.com")
+    assert store.get_cookie_header("www.example.com:443") == "challenge=solved; sid=1"
+    assert store.get_cookie_header("www.example.com", secure=False) == "sid=1"
+    # session cookies expire after session_ttl
+    assert 50 < store.get_status()["www.example.com"]["sid"] - time.time() <= 60
+
+    store.update_from_headers(
+        "www.example.com",
+        [
+            "sid=2; Max-Age=10; Path=/",
+            "challenge=expired; Domain=.example.com; Expires=Thu, 01 Jan 1970 00:00:00 GMT",
+            "invalid cookie\x00",
+        ],
+    )
+    assert not store.has_valid_session("www.example.com", ["challenge"])
+    assert store.get_cookie_header("www.example.com") == "sid=2"
+
+    store.save()
+    loaded = SessionStore(path)
+    assert loaded.get_cookie_header("www.example.com") == "sid=2"
+    loaded.invalidate("www.example.com")
+    assert not loaded.has_valid_session("www.example.com")
+
+
+def test_session_store_expiration():
+    store = SessionStore(session_ttl=0.05)
+    store.update_from_headers("example.com", ["sid=1"])
+    assert store.has_valid_session("example.com")
+    time.sleep(0.1)
+    assert not store.has_valid_session("example.com")
+    assert store.get_browser_cookies() == []
@@ -0,0 +1,50 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from kekmonitors.utils.stream_parser import TagExtractor
+
+PAGE = """<html><head>
+<meta property="og:type" content="product">
+<meta property="og:title" content="Nike Air Max 95 &amp; more"/>
+<script type="text/x-magento-init">{"other": true}</script>
+</head><body>
+<div class="price"><span>12</span><div>0</div> &euro;</div>
+<script type="text/x-magento-init">{"jsonConfig": {"sizes": ["42", "43"]}}</script>
+<p>àèìòù</p>
+</body></html>""".encode()
+
+
+def get_extractor() -> TagExtractor:
+    extractor = TagExtractor()
+    extractor.add_target("name", "meta", {"property": "og:title"})
+    extractor.add_target("price", "div", {"class": "price"})
+    extractor.add_target(
+        "sizes", "script", {"type": "text/x-magento-init"}, contains="jsonConfig"
+    )
+    return extractor
+
+
+def test_tag_extractor():
+    # feed it one byte at a time, splitting tags and multibyte characters
+    extractor = get_extractor()
+    done_at = None
+    for i in range(len(PAGE)):
+        if extractor.feed(PAGE[i : i + 1]):
+            done_at = i
+            break
+    assert done_at is not None and done_at < PAGE.find("<p>".encode())
+    assert extractor.results["name"]["attrs"]["content"] == "Nike Air Max 95 & more"
+    assert extractor.results["price"]["text"] == "120 €"
+    assert extractor.results["sizes"]["text"].find("42") != -1
+    assert extractor.bytes_received == done_at + 1
+
+
+def test_tag_extractor_missing():
+    extractor = get_extractor()
+    extractor.add_target("missing", "img")
+    assert not extractor.feed(PAGE)
+    extractor.close()
+    assert extractor.results["missing"] is None
+    assert extractor.results["name"] is not None
@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+from datetime import datetime
+
+import pytest
+
+from kekmonitors.utils.warmup import Warmup, parse_time
+
+
+def test_parse_time():
+    assert parse_time(1600000000) == 1600000000.0
+    assert parse_time("1600000000.5") == 1600000000.5
+    assert (
+        parse_time("2020-09-13 14:26:40")
+        == datetime(2020, 9, 13, 14, 26, 40).timestamp()
+    )
+    with pytest.raises(ValueError):
+        parse_time("tomorrow")
+
+
+def test_from_config():
+    warmup = Warmup.from_config(
+        {"urls": "https://example.com", "at": time.time() + 60, "window": 10}
+    )
+    assert warmup.urls == ["https://example.com"]
+    assert warmup.get_end() - warmup.get_start() == 40
+    assert not warmup.is_expired()
+    with pytest.raises(KeyError):
+        Warmup.from_config({"urls": ["https://example.com"]})
+    with pytest.raises(ValueError):
+        Warmup.from_config({"urls": [], "at": time.time()})
@@ -0,0 +1,329 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import http.server
+import json
+import socket
+import threading
+import time
+from datetime import datetime
+
+from kekmonitors.comms.msg import Cmd, badResponse, okResponse
+from kekmonitors.config import COMMANDS, ERRORS, Config
+from kekmonitors.utils.embed import Embed
+from kekmonitors.webhook_manager import RenderedEmbed, WebhookManager, WebhookOverlay
+
+
+def start_server(posts, codes):
+    """Local server acting like a discord webhook: it answers with the codes in `codes`, then with 204."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["content-length"]))
+            code = codes.pop(0) if codes else 204
+            if code != 429:
+                posts.append((self.path, json.loads(body)))
+            self.send_response(code)
+            self.send_header("x-ratelimit-remaining", "0" if code == 429 else "4")
+            self.send_header("x-ratelimit-reset-after", "0.05")
+            self.send_header("content-length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_webhook_overlay():
+    config = Config()
+    embed = Embed(title="title", description="description", color=5)
+    embed.add_field(name="name", value="value")
+    rendered = RenderedEmbed(embed.to_dict())
+    # footer and color are set by the webhooks
+    assert "color" not in rendered.data
+    now = datetime(2021, 1, 2, 3, 4, 5)
+    default = WebhookOverlay({}, config)
+    custom = WebhookOverlay(
+        {
+            "custom": {
+                "provider": "Custom",
+                "icon_url": "icon",
+                "color": 1,
+                "timestamp_format": "%Y",
+                "avatar_image": "avatar",
+            }
+        },
+        config,
+    )
+    embed_json, length = custom.render(rendered, now)
+    data = json.loads(custom.get_message([embed_json, embed_json]))
+    assert data["avatar_url"] == "avatar"
+    assert len(data["embeds"]) == 2
+    assert data["embeds"][0] == {
+        **embed.to_dict(),
+        "footer": {"text": "Custom | 2021", "icon_url": "icon"},
+        "color": 1,
+    }
+    assert length == len("titledescriptionnamevalueCustom | 2021")
+    embed_json, _ = default.render(rendered, now)
+    data = json.loads(default.get_message([embed_json]))
+    assert "avatar_url" not in data
+    assert data["embeds"][0]["color"] == int(config["WebhookConfig"]["embed_color"])
+    assert data["embeds"][0]["footer"]["text"].startswith(
+        config["WebhookConfig"]["provider"] + " | "
+    )
+    # the rendered embed is shared, so it's never modified
+    assert "footer" not in rendered.data
+    embed_json, _ = default.render(RenderedEmbed({}), now)
+    assert set(json.loads(embed_json)) == {"footer", "color"}
+
+
+def test_webhook_manager(tmp_path):
+    posts = []
+    server = start_server(posts, [429])
+    url = f"http://127.0.0.1:{server.server_port}"
+    config = Config()
+    config["OtherConfig"]["socket_name"] = "Test"
+    config["WebhookConfig"]["global_rate_limit"] = "1000"
+    config["WebhookConfig"]["use_notifier"] = "False"
+    config["WebhookConfig"]["outbox_path"] = str(tmp_path)
+    webhooks = {
+        f"{url}/default": {},
+        f"{url}/custom": {
+            "custom": {"provider": "Custom", "color": 1, "avatar_image": "avatar"}
+        },
+    }
+
+    async def run():
+        manager = WebhookManager(config)
+        for i in range(25):
+            embed = Embed(title=f"embed {i}")
+            timings = {"fetch": time.time(), "parse": time.time(), "diff": time.time()}
+            manager.add_to_queue(embed, webhooks, timings=timings)
+        for i in range(3):
+            embed = Embed(title="long", description="a" * 2500)
+            manager.add_to_queue(embed, {f"{url}/long": {}})
+        threads = threading.active_count()
+        many = {f"{url}/many/{i}": {} for i in range(200)}
+        manager.add_to_queue(Embed(title="many"), many)
+        # senders are tasks, not threads
+        assert threading.active_count() == threads
+        await manager.quit()
+        return manager
+
+    try:
+        manager = asyncio.new_event_loop().run_until_complete(run())
+    finally:
+        server.shutdown()
+    # one for every webhook it has been sent to
+    alert_metrics = manager.get_alert_metrics()
+    assert list(alert_metrics) == ["Test"]
+    assert alert_metrics["Test"]["alerts"] == 50
+    assert alert_metrics["Test"]["total"]["count"] == 50
+    assert len(posts) == 6 + 2 + 200
+    for path in ("/default", "/custom"):
+        messages = [data["embeds"] for p, data in posts if p == path]
+        # up to 10 embeds per message
+        assert [len(embeds) for embeds in messages] == [10, 10, 5]
+        titles = [embed["title"] for embeds in messages for embed in embeds]
+        # in order, and the 429 has been retried
+        assert titles == [f"embed {i}" for i in range(25)]
+    # up to 6000 characters per message
+    assert [len(data["embeds"]) for p, data in posts if p == "/long"] == [2, 1]
+    custom = [data for p, data in posts if p == "/custom"][0]
+    assert custom["avatar_url"] == "avatar"
+    assert custom["embeds"][0]["color"] == 1
+    assert custom["embeds"][0]["footer"]["text"].startswith("Custom | ")
+    default = [data for p, data in posts if p == "/default"][0]
+    assert default["embeds"][0]["color"] == int(config["WebhookConfig"]["embed_color"])
+
+
+def test_webhook_manager_notifier(tmp_path):
+    posts = []
+    server = start_server(posts, [])
+    url = f"http://127.0.0.1:{server.server_port}"
+    config = Config()
+    config["OtherConfig"]["socket_name"] = "Test"
+    config["GlobalConfig"]["socket_path"] = str(tmp_path)
+    config["WebhookConfig"]["use_notifier"] = "True"
+    config["WebhookConfig"]["outbox_path"] = str(tmp_path)
+    config["WebhookConfig"]["outbox"] = "True"
+    webhooks = {f"{url}/webhook": {}}
+    notified = []
+
+    async def on_connection(reader, writer):
+        cmd = Cmd(await reader.read())
+        assert cmd.cmd == COMMANDS.MM_NOTIFY
+        # the notifier accepts the first batch, then fails
+        if not notified:
+            notified.extend(cmd.payload)
+            response = okResponse()
+        else:
+            response = badResponse()
+            response.error = ERRORS.BAD_PAYLOAD
+        writer.write(response.get_bytes())
+        writer.write_eof()
+        writer.close()
+
+    manager = WebhookManager(config)
+
+    async def run():
+        notifier = await asyncio.start_unix_server(
+            on_connection, str(tmp_path / "MonitorManager")
+        )
+        manager.add_to_queue(
+            Embed(title="forwarded 0"), webhooks, timings={"parse": 1.0, "diff": 2.0}
+        )
+        manager.add_to_queue(Embed(title="forwarded 1"), webhooks)
+        await asyncio.sleep(0.1)
+        manager.add_to_queue(Embed(title="fallback"), webhooks)
+        await manager.quit()
+        notifier.close()
+
+    try:
+        asyncio.new_event_loop().run_until_complete(run())
+    finally:
+        server.shutdown()
+    # forwarded in a single batch
+    assert [n["embed"]["title"] for n in notified] == ["forwarded 0", "forwarded 1"]
+    assert notified[0]["webhooks"] == webhooks
+    assert [data["embeds"][0]["title"] for _, data in posts] == ["fallback"]
+    assert "key" in notified[0] and "time" in notified[0]
+    assert notified[0]["source"] == "Test"
+    assert set(notified[0]["timings"]) == {"parse", "diff", "queue"}
+    assert "timings" not in notified[1]
+    # forwarded and sent embeds are done
+    assert len(manager.outbox) == 0
+
+
+def test_webhook_manager_outbox(tmp_path):
+    posts = []
+    # discord is rate limiting the webhook for the whole first run
+    codes = [429] * 1000
+    server = start_server(posts, codes)
+    url = f"http://127.0.0.1:{server.server_port}"
+    config = Config()
+    config["OtherConfig"]["socket_name"] = "Test"
+    config["WebhookConfig"]["use_notifier"] = "False"
+    config["WebhookConfig"]["outbox_path"] = str(tmp_path)
+    config["WebhookConfig"]["outbox"] = "True"
+    webhooks = {f"{url}/webhook": {}}
+
+    async def first_run():
+        manager = WebhookManager(config)
+        manager.add_to_queue(Embed(title="embed 0"), webhooks, key="0")
+        manager.add_to_queue(Embed(title="embed 1"), webhooks, key="1")
+        # duplicate
+        manager.add_to_queue(Embed(title="embed 0"), webhooks, key="0")
+        start = time.monotonic()
+        await manager.quit(timeout=0.3)
+        # doesn't wait forever
+        assert time.monotonic() - start < 1
+
+    async def second_run():
+        manager = WebhookManager(config)
+        manager.start()
+        await manager.quit()
+        return manager
+
+    try:
+        asyncio.new_event_loop().run_until_complete(first_run())
+        assert posts == []
+        codes.clear()
+        manager = asyncio.new_event_loop().run_until_complete(second_run())
+    finally:
+        server.shutdown()
+    titles = [embed["title"] for _, data in posts for embed in data["embeds"]]
+    assert titles == ["embed 0", "embed 1"]
+    assert len(manager.outbox) == 0
+    assert "0" in manager.outbox
+
+
+def test_webhook_manager_retries(tmp_path):
+    flaky_posts = []
+    # 5xx are retried
+    flaky = start_server(flaky_posts, [500, 503])
+    broken_posts = []
+    # other errors are not
+    broken = start_server(broken_posts, [404])
+    config = Config()
+    config["OtherConfig"]["socket_name"] = "Test"
+    config["WebhookConfig"]["use_notifier"] = "False"
+    config["WebhookConfig"]["outbox_path"] = str(tmp_path / "outbox")
+    config["WebhookConfig"]["outbox"] = "True"
+    config["WebhookConfig"]["dead_letters_path"] = str(tmp_path / "dead_letters")
+    config["WebhookConfig"]["batch_window"] = "0"
+    config["WebhookConfig"]["max_retries"] = "2"
+    config["WebhookConfig"]["retry_delay"] = "0.01"
+    flaky_url = f"http://127.0.0.1:{flaky.server_port}/flaky"
+    broken_url = f"http://127.0.0.1:{broken.server_port}/broken"
+    # nothing listening
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        unreachable_url = f"http://127.0.0.1:{sock.getsockname()[1]}/unreachable"
+
+    async def run():
+        manager = WebhookManager(config)
+        manager.add_to_queue(Embed(title="first"), {flaky_url: {}, broken_url: {}})
+        manager.add_to_queue(Embed(title="second"), {unreachable_url: {}})
+        await manager.quit()
+        return manager
+
+    try:
+        manager = asyncio.new_event_loop().run_until_complete(run())
+    finally:
+        flaky.shutdown()
+        broken.shutdown()
+    # two failures and the one delivered
+    assert [data["embeds"][0]["title"] for _, data in flaky_posts] == ["first"] * 3
+    status = manager.get_status()
+    assert status["webhooks"][flaky_url]["state"] == "healthy"
+    assert status["webhooks"][flaky_url]["retries"] == 2
+    assert status["webhooks"][flaky_url]["delivered"] == 1
+    assert status["webhooks"][broken_url]["state"] == "failing"
+    assert status["webhooks"][broken_url]["retries"] == 0
+    assert status["webhooks"][broken_url]["last_error"].startswith("404")
+    assert status["webhooks"][unreachable_url]["state"] == "failing"
+    assert status["webhooks"][unreachable_url]["retries"] == 2
+    assert status["dead_letters"] == 2
+    with open(tmp_path / "dead_letters" / "Test.jsonl") as f:
+        dead_letters = [json.loads(line) for line in f]
+    assert [d["webhook"] for d in dead_letters] == [broken_url, unreachable_url]
+    assert dead_letters[1]["message"]["embeds"][0]["title"] == "second"
+    # nothing left to send
+    assert status["outbox"]["pending"] == 0
+
+
+def test_webhook_manager_post(tmp_path):
+    posts = []
+    server = start_server(posts, [])
+    url = f"http://127.0.0.1:{server.server_port}"
+    config = Config()
+    config["OtherConfig"]["socket_name"] = "Test"
+    config["WebhookConfig"]["outbox_path"] = str(tmp_path)
+    # a port nothing is listening on
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    closed = f"http://127.0.0.1:{sock.getsockname()[1]}/crash"
+    sock.close()
+
+    async def run():
+        manager = WebhookManager(config, use_notifier=False)
+        assert await manager.post(f"{url}/crash", {"content": "crashed"}) == 204
+        # failures are logged, not raised
+        assert await manager.post(closed, {"content": "crashed"}) is None
+        await manager.quit()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+    assert posts == [("/crash", {"content": "crashed"})]